@@ -0,0 +1,373 @@
+r"""
+Benchmarks of the hot paths of pants laminations and train tracks.
+
+Run the benchmarks from the root of the repository and store the timings::
+
+    python -m benchmarks.bench run --save baseline
+    python -m benchmarks.bench run --quick -k twist
+
+Compare two runs. The exit status is 1 if some benchmark is slower than in
+the baseline by more than the threshold (a fraction of the baseline
+time)::
+
+    python -m benchmarks.bench compare baseline current --threshold 0.1
+
+Runs are stored as JSON files in ``benchmarks/baselines``. The arguments
+of ``compare`` are names of stored runs or paths of JSON files.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+
+from macaw.examples import finite_order_primitives
+from macaw.generating_sets import humphries_curves, map_from_list, \
+    _humphries_generators
+from macaw.pants_decomposition import PantsDecomposition
+from macaw.pants_lamination import PantsLamination
+from macaw.pants_mapping_class import PantsMappingClass
+
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'baselines')
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GENERA = (2, 3, 5, 10)
+WORD_LENGTHS = (10, 100, 1000)
+TWIST_POWERS = (10, 100, 1000)
+
+# The parameters of a quick run.
+QUICK_GENERA = (2,)
+QUICK_WORD_LENGTHS = (10,)
+QUICK_TWIST_POWERS = (10,)
+
+# Registered benchmarks as tuples (name, function, parameter grids).
+_BENCHMARKS = []
+
+
+def benchmark(*grids):
+    """Register a benchmark.
+
+    The decorated function is called with one value from each grid and
+    does the setup. It returns a function without arguments, which is the
+    part that is timed. A grid is the name of a module level tuple of
+    parameters (e.g. ``'GENERA'``), so that quick runs can replace it.
+    """
+    def register(function):
+        _BENCHMARKS.append((function.__name__, function, grids))
+        return function
+    return register
+
+
+def _random_word(genus, length, seed):
+    """Return a random word in the Humphries curves and their inverses."""
+    rng = random.Random(seed)
+    n = 2*genus + 2
+    return [rng.choice([-1, 1]) * rng.randint(1, n) for i in range(length)]
+
+
+def _random_lamination(p, seed, max_values=100):
+    """Return a random lamination, the same for the same seed."""
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        return PantsLamination.random(p, max_values)
+    finally:
+        random.setstate(state)
+
+
+def _fresh(f):
+    """Return a copy of a mapping class without its cached data."""
+    return PantsMappingClass(f._pants_decomposition, f._pants_twists,
+                             f._action_on_homology)
+
+
+def _penner_word(genus):
+    """Return the word of the product of the A twists and the inverse B
+    twists, which is pseudo-Anosov."""
+    word = []
+    for i in range(genus):
+        word += [2*i+1, -(2*i+2)]
+    return word + [-(2*genus+2)]
+
+
+@benchmark()
+def import_macaw():
+    # a new interpreter, so that the modules are really imported
+    command = [sys.executable, '-c', 'import macaw']
+    return lambda: subprocess.check_call(command, cwd=ROOT_DIR)
+
+
+@benchmark('GENERA')
+def humphries_generators(genus):
+    return lambda: _humphries_generators(genus)
+
+
+@benchmark('GENERA')
+def lamination_creation(genus):
+    p = PantsDecomposition.humphries(genus)
+    coordinates = list(_random_lamination(p, genus).to_vector())
+    return lambda: PantsLamination(p, coordinates)
+
+
+@benchmark('GENERA')
+def lamination_from_bytes(genus):
+    p = PantsDecomposition.humphries(genus)
+    data = _random_lamination(p, genus).to_bytes()
+    return lambda: PantsLamination.from_bytes(data)
+
+
+@benchmark('GENERA', 'TWIST_POWERS')
+def twist_power(genus, power):
+    p = PantsDecomposition.humphries(genus)
+    f = humphries_curves(genus)[2]**power
+    lam = _random_lamination(p, genus)
+    return lambda: _fresh(f) * lam
+
+
+@benchmark('GENERA')
+def first_elementary_move(genus):
+    p = PantsDecomposition.humphries(genus)
+    lam = _random_lamination(p, genus)
+    # Curve 1 bounds a torus, so the move about it is a first move.
+    return lambda: lam.get_elementary_move(1)
+
+
+@benchmark('GENERA')
+def second_elementary_move(genus):
+    p = PantsDecomposition.humphries(genus)
+    lam = _random_lamination(p, genus)
+    return lambda: lam.get_elementary_move(2)
+
+
+@benchmark('GENERA', 'WORD_LENGTHS')
+def apply_word(genus, length):
+    p = PantsDecomposition.humphries(genus)
+    f = map_from_list(genus, _random_word(genus, length, length))
+    lam = _random_lamination(p, genus)
+    return lambda: _fresh(f) * lam
+
+
+@benchmark('GENERA', 'WORD_LENGTHS')
+def is_identity(genus, length):
+    # a word and its inverse, so that every curve has to be checked
+    word = _random_word(genus, length // 2, length)
+    f = map_from_list(genus, word + [-i for i in reversed(word)])
+    return lambda: _fresh(f).is_identity()
+
+
+@benchmark('PERIODIC_GENERA')
+def finite_order_primitives_order(genus):
+    maps = [f for order, f in finite_order_primitives(genus)]
+    return lambda: [_fresh(f).order() for f in maps]
+
+
+@benchmark('PSEUDO_ANOSOV_GENERA')
+def stretch_factor(genus):
+    f = map_from_list(genus, _penner_word(genus))
+    return lambda: _fresh(f).stretch_factor()
+
+
+@benchmark('REDUCTION_GENERA')
+def get_reduced(genus):
+    # get_reduced() only terminates for laminations that reduce to a pants
+    # curve. The image of a twisted transversal of curve 1 under the first
+    # elementary move about curve 1 is taken back by the move and then
+    # untwisted.
+    p = PantsDecomposition.humphries(genus)
+    lam = PantsLamination.from_transversal(p, 1)
+    lam.apply_twist(1, 10)
+    lam.apply_elementary_move(1)
+    return lambda: lam.get_reduced([])
+
+
+# finite_order_primitives() only covers genus 2 and 3, the stretch factor
+# and get_reduced() are too slow in higher genus.
+PERIODIC_GENERA = (2, 3)
+PSEUDO_ANOSOV_GENERA = (2, 3)
+REDUCTION_GENERA = (2, 3, 5)
+
+
+def _time(function, min_time=0.2, repeat=5):
+    """Time a function.
+
+    The function is called in loops long enough for at least ``min_time``
+    seconds, ``repeat`` times. Returns a dictionary of the minimal and
+    median time per call and the number of calls per loop.
+    """
+    number = 1
+    while True:
+        start = time.time()
+        for i in range(number):
+            function()
+        elapsed = time.time() - start
+        if elapsed >= min_time or number >= 10**6:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    times = [elapsed / number]
+    for i in range(repeat - 1):
+        start = time.time()
+        for j in range(number):
+            function()
+        times.append((time.time() - start) / number)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2],
+            'number': number, 'repeat': repeat}
+
+
+def _parameter_grid(grids, quick):
+    """Return the list of parameter tuples of a benchmark."""
+    module = sys.modules[__name__]
+    values = []
+    for grid in grids:
+        if quick and hasattr(module, 'QUICK_' + grid):
+            grid = 'QUICK_' + grid
+        values.append(getattr(module, grid))
+    combinations = [()]
+    for vals in values:
+        combinations = [c + (v,) for c in combinations for v in vals]
+    if quick:
+        combinations = combinations[:1]
+    return combinations
+
+
+def run(pattern=None, quick=False, min_time=0.2, repeat=5, out=sys.stdout):
+    """Run the benchmarks whose names match a regular expression.
+
+    OUTPUT:
+
+    A dictionary with the timings under ``'results'``, keyed by names like
+    ``'apply_word[genus=2,length=10]'``, and the error messages of the
+    benchmarks that raised an exception under ``'errors'``.
+    """
+    results = {}
+    errors = {}
+    for name, function, grids in _BENCHMARKS:
+        arg_names = function.__code__.co_varnames[:len(grids)]
+        for params in _parameter_grid(grids, quick):
+            key = '%s[%s]' % (name, ','.join('%s=%s' % (arg, value)
+                                             for arg, value in
+                                             zip(arg_names, params)))
+            if pattern is not None and not re.search(pattern, key):
+                continue
+            try:
+                timing = _time(function(*params), min_time, repeat)
+            except Exception as e:
+                # one failing benchmark should not lose the whole run
+                errors[key] = '%s: %s' % (type(e).__name__, e)
+                print('%-55s FAILED (%s)' % (key, errors[key]), file=out)
+                out.flush()
+                continue
+            results[key] = timing
+            print('%-55s %12.6f s' % (key, timing['min']), file=out)
+            out.flush()
+    return {'python': platform.python_version(),
+            'machine': platform.machine(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results,
+            'errors': errors}
+
+
+def compare(baseline, current, threshold=0.1, out=sys.stdout):
+    """Compare two runs and print the ratios of the minimal times.
+
+    OUTPUT:
+
+    The list of names of the benchmarks slower in ``current`` than in
+    ``baseline`` by more than ``threshold`` times the baseline time.
+
+    EXAMPLES::
+
+        >>> from benchmarks.bench import compare
+        >>> import io
+        >>> old = {'results': {'a': {'min': 1.0}, 'b': {'min': 2.0}}}
+        >>> new = {'results': {'a': {'min': 1.05}, 'b': {'min': 3.0},
+        ...                    'c': {'min': 1.0}}}
+        >>> compare(old, new, 0.1, out=io.StringIO())
+        ['b']
+
+    """
+    regressions = []
+    for key in sorted(set(baseline['results']) & set(current['results'])):
+        old = baseline['results'][key]['min']
+        new = current['results'][key]['min']
+        ratio = new / old if old > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = 'REGRESSION'
+        elif ratio < 1 - threshold:
+            flag = 'improvement'
+        print(u'%-55s %12.6f %12.6f %7.2fx %s' % (key, old, new, ratio, flag),
+              file=out)
+    return regressions
+
+
+def _baseline_path(name):
+    if os.path.exists(name) or name.endswith('.json'):
+        return name
+    return os.path.join(BASELINE_DIR, name + '.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help="run the benchmarks")
+    run_parser.add_argument('-k', dest='pattern', default=None,
+                            help="only run the benchmarks matching a "
+                            "regular expression")
+    run_parser.add_argument('--quick', action='store_true',
+                            help="only run the smallest parameters")
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help="the minimal time of a loop in seconds")
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--save', metavar='NAME', default=None,
+                            help="store the run in benchmarks/baselines")
+
+    compare_parser = subparsers.add_parser(
+        'compare', help="compare two stored runs")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        data = run(args.pattern, args.quick, args.min_time, args.repeat)
+        if args.save is not None:
+            path = _baseline_path(args.save)
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+        if data['errors']:
+            print('%d benchmark(s) failed' % len(data['errors']))
+            return 1
+        return 0
+    if args.command == 'compare':
+        with open(_baseline_path(args.baseline)) as f:
+            baseline = json.load(f)
+        with open(_baseline_path(args.current)) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print('%d regression(s) above %d%%' %
+                  (len(regressions), round(100 * args.threshold)))
+            return 1
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
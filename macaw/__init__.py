@@ -1,2 +1,73 @@
-from train_tracks.all import *
-from .all import *
+r"""
+
+Macaw: mapping classes, laminations and train tracks on surfaces.
+
+The public names are imported on first access, so ``import macaw`` does
+not import numpy or networkx. Use ``from macaw.all import *`` to import
+everything eagerly.
+
+EXAMPLES::
+
+    >>> import macaw
+    >>> macaw.PantsDecomposition
+    <class 'macaw.pants_decomposition.PantsDecomposition'>
+
+"""
+
+# *****************************************************************************
+#       Copyright (C) 2017 Balazs Strenner <strennerb@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#                  http://www.gnu.org/licenses/
+# *****************************************************************************
+
+import sys
+from importlib import import_module
+from types import ModuleType
+
+# The module defining each public name.
+_LAZY_NAMES = {
+    'Surface': 'macaw.surface',
+    'PantsDecomposition': 'macaw.pants_decomposition',
+    'PantsLamination': 'macaw.pants_lamination',
+    'PantsMappingClass': 'macaw.pants_mapping_class',
+    'PantsTwist': 'macaw.pants_mapping_class',
+    'hyperelliptic_involution': 'macaw.examples',
+    'humphries_generators': 'macaw.generating_sets',
+    'TrainTrack': 'macaw.train_tracks.train_track',
+}
+
+
+class _LazyModule(ModuleType):
+    """The ``macaw`` package, importing the public names on first access.
+
+    The package replaces itself in ``sys.modules`` by an instance of this
+    class, which works on Python 2 as well (where modules cannot define
+    ``__getattr__``).
+    """
+    __all__ = sorted(_LAZY_NAMES)
+
+    def __getattr__(self, name):
+        try:
+            module_name = _LAZY_NAMES[name]
+        except KeyError:
+            raise AttributeError("module 'macaw' has no attribute '%s'"
+                                 % name)
+        value = getattr(import_module(module_name), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_NAMES))
+
+
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update((key, value) for key, value in globals().items()
+                        if key.startswith('__') and key != '__doc__')
+# Keep the original module alive: Python 2 clears the globals of a module
+# when it is garbage collected, and the methods above still refer to them.
+_module._original_module = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -0,0 +1,290 @@
+r"""
+
+Batch evaluation of mapping classes given by words in the Humphries
+generators.
+
+The input is a stream of JSON lines, one record per line. A record is an
+object with the keys
+
+- ``genus`` -- the genus of the closed surface
+
+- ``word`` -- a list of indices of Humphries curves, as in
+  :func:`~macaw.generating_sets.map_from_list`
+
+- ``id`` -- (optional) an arbitrary tag copied to the result
+
+- ``tasks`` -- (optional) the list of tasks to evaluate. If not given, the
+  tasks given on the command line are evaluated.
+
+For each record, a JSON line is written with the keys ``line`` (the line
+number of the record in the input), ``id`` (if it was given), one key per
+task with the result of the task, and ``errors`` (if some of the tasks
+failed) mapping the failed tasks to the error messages.
+
+The records are evaluated by a pool of worker processes, with a bounded
+number of records in flight, so arbitrarily long inputs are processed in
+constant memory. The results are written in input order, or in the order
+of completion with ``--unordered`` (the ``line`` key tags the results).
+
+With ``--cache``, the results of ``order``, ``stretch_factor`` and
+``homology_charpoly`` are looked up in and stored to a persistent
+:class:`~macaw.result_cache.ResultCache`, shared by the worker processes.
+
+EXAMPLES:
+
+From the command line::
+
+    $ echo '{"genus": 2, "word": [1, 2, 3, 4], "id": "a"}' | \
+          python -m macaw.batch --tasks order,is_identity
+    {"id": "a", "is_identity": false, "line": 1, "order": 10}
+
+From Python::
+
+    >>> from macaw.batch import evaluate_record
+    >>> result = evaluate_record((1, '{"genus": 2, "word": [1, -1]}'),
+    ...                          ['is_identity', 'order'])
+    >>> sorted(result.items())
+    [('is_identity', True), ('line', 1), ('order', 1)]
+
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from .generating_sets import map_from_list
+from .pants_mapping_class import PantsMappingClass
+from .result_cache import ResultCache, RESULT_CACHE_FILE
+
+
+def _is_identity(f):
+    return bool(f.is_identity())
+
+
+def _order(f):
+    return int(f.order())
+
+
+def _stretch_factor(f):
+    return float(f.stretch_factor())
+
+
+def _action_on_homology(f):
+    return [[int(x) for x in row] for row in f.action_on_homology().tolist()]
+
+
+def _homology_charpoly(f):
+    return [int(x) for x in f.homology_charpoly()]
+
+
+# The tasks that can be evaluated, converting the results to JSON values.
+TASKS = {
+    'is_identity': _is_identity,
+    'order': _order,
+    'stretch_factor': _stretch_factor,
+    'action_on_homology': _action_on_homology,
+    'homology_charpoly': _homology_charpoly,
+}
+
+DEFAULT_TASKS = ['is_identity', 'order']
+
+
+def evaluate_record(numbered_line, tasks=DEFAULT_TASKS):
+    """Evaluate the tasks on an input record.
+
+    This is a module level function so that it can be sent to the worker
+    processes.
+
+    INPUT:
+
+    - ``numbered_line`` -- a pair ``(line_number, line)`` where ``line`` is
+      the JSON encoded record
+
+    - ``tasks`` -- (default: DEFAULT_TASKS) the tasks to evaluate if the
+      record does not specify them
+
+    OUTPUT:
+
+    The result record as a dictionary. Errors in the record or in a task
+    are reported in the result instead of being raised.
+
+    """
+    line_number, line = numbered_line
+    result = {'line': line_number}
+    errors = {}
+    try:
+        record = json.loads(line)
+        if 'id' in record:
+            result['id'] = record['id']
+        tasks = record.get('tasks', tasks)
+        for task in tasks:
+            if task not in TASKS:
+                raise ValueError("Unknown task: %s" % task)
+        f = map_from_list(int(record['genus']), record['word'])
+    except Exception as e:
+        result['errors'] = {'record': '%s: %s' % (type(e).__name__, e)}
+        return result
+
+    for task in tasks:
+        try:
+            result[task] = TASKS[task](f)
+        except Exception as e:
+            errors[task] = '%s: %s' % (type(e).__name__, e)
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+class _EvaluateRecord(object):
+    """A picklable callable evaluating records with fixed default tasks."""
+    def __init__(self, tasks):
+        self._tasks = tasks
+
+    def __call__(self, numbered_line):
+        return evaluate_record(numbered_line, self._tasks)
+
+
+def _set_result_cache(cache_file):
+    """Initialize a worker process."""
+    if cache_file is not None:
+        PantsMappingClass.result_cache = ResultCache(cache_file)
+
+
+def evaluate_stream(lines, tasks=DEFAULT_TASKS, processes=None,
+                    max_in_flight=None, ordered=True, cache_file=None):
+    """Evaluate a stream of JSON lines.
+
+    INPUT:
+
+    - ``lines`` -- an iterable of JSON encoded records. Blank lines are
+      skipped.
+
+    - ``tasks`` -- (default: DEFAULT_TASKS) the tasks to evaluate for the
+      records not specifying them
+
+    - ``processes`` -- (default: None) the number of worker processes. If
+      None, the number of CPUs is used. If 1, no processes are started.
+
+    - ``max_in_flight`` -- (default: None) the maximal number of records
+      read but not yet yielded. If None, it is 16 times the number of
+      processes.
+
+    - ``ordered`` -- (default: True) if True, the results are yielded in
+      input order, otherwise in the order of completion
+
+    - ``cache_file`` -- (default: None) if not None, the file of a
+      ResultCache used by the worker processes. With one process, it is
+      set as ``PantsMappingClass.result_cache`` while the records are
+      evaluated, and the previous cache is restored afterwards.
+
+    OUTPUT:
+
+    A generator of the result records (see evaluate_record()).
+
+    EXAMPLES::
+
+        >>> from macaw.batch import evaluate_stream
+        >>> lines = ['{"genus": 2, "word": [1, 2, 3, 4]}', '',
+        ...          '{"genus": 2, "word": [1, 2, 3, 4, 4]}']
+        >>> for result in evaluate_stream(lines, ['order'], processes=1):
+        ...     print(sorted(result.items()))
+        [('line', 1), ('order', 10)]
+        [('line', 3), ('order', 8)]
+
+    """
+    numbered_lines = ((i + 1, line) for i, line in enumerate(lines)
+                      if line.strip())
+    evaluate = _EvaluateRecord(list(tasks))
+    if processes == 1:
+        if cache_file is None:
+            for numbered_line in numbered_lines:
+                yield evaluate(numbered_line)
+            return
+        previous_cache = PantsMappingClass.result_cache
+        cache = ResultCache(cache_file)
+        PantsMappingClass.result_cache = cache
+        try:
+            for numbered_line in numbered_lines:
+                yield evaluate(numbered_line)
+        finally:
+            PantsMappingClass.result_cache = previous_cache
+            cache.close()
+        return
+
+    from multiprocessing import Pool, cpu_count
+    if processes is None:
+        processes = cpu_count()
+    if max_in_flight is None:
+        max_in_flight = 16 * processes
+
+    # The pool reads the input in a separate thread. The semaphore blocks
+    # that thread until the results of earlier records are consumed.
+    slots = threading.Semaphore(max_in_flight)
+
+    def throttled():
+        for numbered_line in numbered_lines:
+            slots.acquire()
+            yield numbered_line
+
+    pool = Pool(processes, _set_result_cache, (cache_file,))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(evaluate, throttled()):
+            slots.release()
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m macaw.batch',
+        description="Evaluate mapping classes given by JSON lines of words "
+        "in the Humphries generators.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="the input file (default: standard input)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="the output file (default: standard output)")
+    parser.add_argument('-t', '--tasks', default=','.join(DEFAULT_TASKS),
+                        help="comma separated list of tasks among %s "
+                        "(default: %%(default)s)" % ', '.join(sorted(TASKS)))
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help="the number of worker processes "
+                        "(default: the number of CPUs)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="the maximal number of records being evaluated "
+                        "or waiting to be written")
+    parser.add_argument('--unordered', action='store_true',
+                        help="write the results in the order of completion")
+    parser.add_argument('--cache', action='store_true',
+                        help="use a persistent cache of results")
+    parser.add_argument('--cache-file', default=RESULT_CACHE_FILE,
+                        help="the file of the cache (default: %(default)s)")
+    args = parser.parse_args(argv)
+    cache_file = args.cache_file if args.cache else None
+
+    tasks = [task for task in args.tasks.split(',') if task]
+    for task in tasks:
+        if task not in TASKS:
+            parser.error("unknown task: %s" % task)
+
+    infile = sys.stdin if args.input == '-' else open(args.input)
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for result in evaluate_stream(infile, tasks, args.processes,
+                                      args.max_in_flight,
+                                      not args.unordered, cache_file):
+            outfile.write(json.dumps(result, sort_keys=True) + '\n')
+            outfile.flush()
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+if __name__ == '__main__':
+    main()
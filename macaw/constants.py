@@ -27,6 +27,11 @@ END = 1
 BRANCH = 0
 CUSP = 1
 INTERVAL = 1
+CLICK = 2
 
 FORWARD = 0
 BACKWARD = 1
+
+PERIODIC = "periodic"
+REDUCIBLE = "reducible"
+PSEUDO_ANOSOV = "pseudo-Anosov"
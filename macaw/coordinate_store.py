@@ -0,0 +1,360 @@
+r"""
+A disk-backed store of Dehn-Thurston coordinate vectors.
+
+The coordinates are stored in a directory as a fixed-width int64 matrix in
+a ``numpy.memmap``, one row per lamination, so collections larger than the
+memory can be built and scanned. Coordinates too large for an int64 are
+marked in the matrix and stored exactly in an overflow side table. Rows
+can be looked up by their coordinates through an on-disk open addressing
+hash table of their fingerprints.
+
+The directory contains the files
+
+- ``meta.json`` -- the width, the number of rows and the capacities
+
+- ``coordinates.int64`` -- the matrix of coordinates
+
+- ``index.int64`` -- the hash table, as pairs ``(fingerprint, row + 1)``
+  (0 marks an empty slot)
+
+- ``overflow.json`` -- the coordinates that do not fit in an int64
+
+EXAMPLES::
+
+    >>> import shutil, tempfile
+    >>> from macaw.coordinate_store import CoordinateStore
+    >>> path = tempfile.mkdtemp()
+    >>> store = CoordinateStore(path, width=4)
+    >>> store.append([1, 2, 3, -4])
+    0
+    >>> store.extend([[5, 6, 7, 8], [2**70, 0, 1, -2**70]])
+    >>> len(store), store[2][0] == 2**70
+    (3, True)
+    >>> store.find([5, 6, 7, 8]), store.find([5, 6, 7, 9])
+    (1, None)
+    >>> store.load(0, 2).tolist()
+    [[1, 2, 3, -4], [5, 6, 7, 8]]
+    >>> store.close()
+
+The store can be reopened::
+
+    >>> store = CoordinateStore(path)
+    >>> len(store), store.width()
+    (3, 4)
+    >>> [2**70, 0, 1, -2**70] in store
+    True
+    >>> store.close()
+    >>> shutil.rmtree(path)
+
+"""
+
+
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+# The version of the layout of the files.
+STORE_VERSION = 1
+
+# Marks the entries of the coordinate matrix stored in the overflow table.
+OVERFLOW = -2**63
+_INT64_MAX = 2**63 - 1
+
+_META_FILE = 'meta.json'
+_COORDINATES_FILE = 'coordinates.int64'
+_INDEX_FILE = 'index.int64'
+_OVERFLOW_FILE = 'overflow.json'
+
+_MIN_CAPACITY = 1024
+
+
+def fingerprint(coordinates):
+    """Return a 64-bit fingerprint of a coordinate vector.
+
+    The fingerprint depends only on the values of the coordinates, not on
+    their types, and it is the same across sessions.
+
+    EXAMPLES::
+
+        >>> from macaw.coordinate_store import fingerprint
+        >>> import numpy as np
+        >>> fingerprint([1, -2, 3]) == fingerprint(np.array([1, -2, 3]))
+        True
+        >>> fingerprint([1, -2, 3]) == fingerprint([1, 2, 3])
+        False
+
+    """
+    text = ','.join(str(int(x)) for x in coordinates)
+    return struct.unpack('<q', hashlib.sha1(text.encode()).digest()[:8])[0]
+
+
+class CoordinateStore(object):
+    """A disk-backed store of coordinate vectors of a fixed width.
+
+    INPUT:
+
+    - ``path`` -- the directory of the store. It is created if it does not
+      exist.
+
+    - ``width`` -- (default: None) the number of coordinates of a vector.
+      It has to be given when a new store is created, and it has to match
+      the width of an existing store.
+
+    - ``readonly`` -- (default: False) if True, the files are opened
+      read-only and the store cannot be modified
+
+    The rows appended are written to the memory-mapped files right away,
+    but the number of rows and the overflow table are only saved by
+    :meth:`flush` and :meth:`close`, and when the hash table is enlarged.
+
+    """
+    def __init__(self, path, width=None, readonly=False):
+        self._path = path
+        self._readonly = readonly
+        meta_file = os.path.join(path, _META_FILE)
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta['version'] != STORE_VERSION:
+                raise ValueError("Unsupported store version: %d." %
+                                 meta['version'])
+            if width is not None and width != meta['width']:
+                raise ValueError("The width of the store is %d, not %d." %
+                                 (meta['width'], width))
+            self._width = meta['width']
+            self._size = meta['size']
+            self._capacity = meta['capacity']
+            self._num_slots = meta['num_slots']
+            with open(os.path.join(path, _OVERFLOW_FILE)) as f:
+                self._overflow = dict(((row, col), int(value))
+                                      for row, col, value in json.load(f))
+            mode = 'r' if readonly else 'r+'
+        else:
+            if readonly:
+                raise ValueError("There is no store at %s." % path)
+            if width is None:
+                raise ValueError("The width has to be specified for a new "
+                                 "store.")
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self._width = width
+            self._size = 0
+            self._capacity = _MIN_CAPACITY
+            self._num_slots = 2 * _MIN_CAPACITY
+            self._overflow = {}
+            mode = 'w+'
+        self._coordinates = np.memmap(
+            os.path.join(path, _COORDINATES_FILE), dtype=np.int64,
+            mode=mode, shape=(self._capacity, max(self._width, 1)))
+        index_file = os.path.join(path, _INDEX_FILE)
+        # An interrupted rehash (see _grow_index()) leaves an index file
+        # whose size does not match the metadata. The index is then rebuilt
+        # from the rows.
+        rebuild = mode != 'w+' and \
+            os.path.getsize(index_file) != 16 * self._num_slots
+        if rebuild and readonly:
+            self._index = np.zeros((self._num_slots, 2), dtype=np.int64)
+        else:
+            if rebuild:
+                self._num_slots = os.path.getsize(index_file) // 16
+            self._index = np.memmap(index_file, dtype=np.int64, mode=mode,
+                                    shape=(self._num_slots, 2))
+        # the rows with entries in the overflow table
+        self._overflow_rows = set(row for row, col in self._overflow)
+        if rebuild:
+            self._index[:] = 0
+            for row in range(self._size):
+                self._insert_into_index(fingerprint(self[row]), row)
+        if mode == 'w+' or rebuild and not readonly:
+            self.flush()
+
+    def width(self):
+        return self._width
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, row):
+        """Return the coordinates in a row as a list of integers."""
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("Row index out of range.")
+        values = [int(x) for x in self._coordinates[row, :self._width]]
+        if row in self._overflow_rows:
+            for col in range(self._width):
+                if values[col] == OVERFLOW:
+                    values[col] = self._overflow[(row, col)]
+        return values
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self[row]
+
+    def __contains__(self, coordinates):
+        return self.find(coordinates) is not None
+
+    # -----------------------------------------------------
+    # APPENDING
+    # -----------------------------------------------------
+
+    def _check_writable(self):
+        if self._readonly:
+            raise ValueError("The store is read-only.")
+
+    def _grow(self, name, filename, shape):
+        """Reopen a memory-mapped file with a larger first dimension."""
+        getattr(self, name).flush()
+        setattr(self, name, None)
+        with open(os.path.join(self._path, filename), 'r+b') as f:
+            f.truncate(8 * shape[0] * shape[1])
+        setattr(self, name, np.memmap(os.path.join(self._path, filename),
+                                      dtype=np.int64, mode='r+',
+                                      shape=shape))
+
+    def _insert_into_index(self, fp, row):
+        mask = self._num_slots - 1
+        slot = fp & mask
+        while self._index[slot, 1] != 0:
+            slot = (slot + 1) & mask
+        self._index[slot, 0] = fp
+        self._index[slot, 1] = row + 1
+
+    def _grow_index(self):
+        """Double the number of slots of the hash table and rehash."""
+        old = np.array(self._index)
+        self._num_slots *= 2
+        self._grow('_index', _INDEX_FILE, (self._num_slots, 2))
+        self._index[:] = 0
+        for fp, row in old[old[:, 1] != 0]:
+            self._insert_into_index(int(fp), int(row) - 1)
+        # The metadata has to record the new number of slots right away,
+        # the index cannot be read with the old one.
+        self.flush()
+
+    def append(self, coordinates):
+        """Append a coordinate vector.
+
+        INPUT:
+
+        - ``coordinates`` -- a sequence of integers of the width of the
+          store, or a PantsLamination
+
+        OUTPUT:
+
+        The index of the new row.
+
+        """
+        self._check_writable()
+        if hasattr(coordinates, 'to_vector'):
+            coordinates = coordinates.to_vector()
+        coordinates = [int(x) for x in coordinates]
+        if len(coordinates) != self._width:
+            raise ValueError("The store has width %d, the vector has length "
+                             "%d." % (self._width, len(coordinates)))
+        row = self._size
+        if row == self._capacity:
+            self._capacity *= 2
+            self._grow('_coordinates', _COORDINATES_FILE,
+                       (self._capacity, max(self._width, 1)))
+        if 2 * (row + 1) > self._num_slots:
+            self._grow_index()
+
+        values = coordinates
+        if any(x > _INT64_MAX or x <= OVERFLOW for x in coordinates):
+            values = list(coordinates)
+            for col, x in enumerate(coordinates):
+                if x > _INT64_MAX or x <= OVERFLOW:
+                    self._overflow[(row, col)] = x
+                    values[col] = OVERFLOW
+            self._overflow_rows.add(row)
+        self._coordinates[row, :self._width] = values
+        self._insert_into_index(fingerprint(coordinates), row)
+        self._size += 1
+        return row
+
+    def extend(self, vectors):
+        """Append coordinate vectors (or PantsLaminations) from an iterable.
+        """
+        for coordinates in vectors:
+            self.append(coordinates)
+
+    # -----------------------------------------------------
+    # LOOKUP AND LOADING
+    # -----------------------------------------------------
+
+    def find(self, coordinates):
+        """Return the index of the first row with the given coordinates, or
+        None if there is no such row."""
+        if hasattr(coordinates, 'to_vector'):
+            coordinates = coordinates.to_vector()
+        coordinates = [int(x) for x in coordinates]
+        fp = fingerprint(coordinates)
+        mask = self._num_slots - 1
+        slot = fp & mask
+        best = None
+        while self._index[slot, 1] != 0:
+            if self._index[slot, 0] == fp:
+                row = int(self._index[slot, 1]) - 1
+                if row < self._size and (best is None or row < best) and \
+                   self[row] == coordinates:
+                    best = row
+            slot = (slot + 1) & mask
+        return best
+
+    def load(self, start=0, stop=None):
+        """Load a range of rows into memory as a 2-dimensional array.
+
+        The dtype of the array is int64, or object if some of the
+        coordinates in the range are stored in the overflow table.
+        """
+        if stop is None or stop > self._size:
+            stop = self._size
+        start = max(0, min(start, stop))
+        array = np.array(self._coordinates[start:stop, :self._width])
+        rows = [row for row in self._overflow_rows if start <= row < stop]
+        if rows:
+            array = array.astype(object)
+            for row in rows:
+                array[row - start] = self[row]
+        return array
+
+    def chunks(self, chunk_size=65536):
+        """Iterate over the store in arrays of at most ``chunk_size`` rows.
+
+        OUTPUT:
+
+        A generator of pairs ``(start, array)``, where ``start`` is the index
+        of the first row of the array.
+        """
+        for start in range(0, self._size, chunk_size):
+            yield start, self.load(start, start + chunk_size)
+
+    # -----------------------------------------------------
+    # SAVING
+    # -----------------------------------------------------
+
+    def flush(self):
+        """Write the data to disk."""
+        if self._readonly:
+            return
+        self._coordinates.flush()
+        self._index.flush()
+        with open(os.path.join(self._path, _OVERFLOW_FILE), 'w') as f:
+            json.dump([[row, col, str(value)] for (row, col), value in
+                       sorted(self._overflow.items())], f)
+        # the metadata is written last, so an interrupted flush leaves the
+        # rows of the previous flush readable
+        with open(os.path.join(self._path, _META_FILE), 'w') as f:
+            json.dump({'version': STORE_VERSION,
+                       'width': self._width,
+                       'size': self._size,
+                       'capacity': self._capacity,
+                       'num_slots': self._num_slots}, f, sort_keys=True)
+
+    def close(self):
+        self.flush()
+        self._coordinates = None
+        self._index = None
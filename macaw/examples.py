@@ -23,7 +23,18 @@ EXAMPLES::
 # *****************************************************************************
 
 
-from .generating_sets import humphries_generators
+import json
+import os
+
+from .generating_sets import humphries_generators, map_from_list
+from .linear_algebra import characteristic_polynomial, \
+    cyclotomic_factorization, matrix_power
+
+
+# A location for the table computed by compute_charpolies(), to be passed
+# as its ``cache_file``.
+CHARPOLY_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache',
+                                   'macaw', 'charpolies.json')
 
 
 def hyperelliptic_involution(genus):
@@ -76,21 +87,8 @@ def finite_order_primitives(genus):
     """
     # In the paper, words are read from left to right. In our program, words are read from right to left, so we reverse the orders. (pp. 389-390) 
 
-    def map_from_list(genus, index_list):
-        """Return a product of Humphries generators from a list of indices of the Humphries curves.
-        """
-        A, B, c = humphries_generators(genus, right_most_included=True)
-        curves = [A[0]]
-        for i in range(len(B)):
-            curves.append(B[i])
-            curves.append(A[i+1])
-        curves.append(c)
-
-        f = curves[index_list[0]-1]
-        for i in index_list[1:]:
-            f = f * curves[i-1]
-        return f
-
+    if genus not in [2, 3]:
+        raise ValueError("Please specify 2 or 3 for the genus.")
     if genus == 2:
         return [(10, map_from_list(2, [1, 2, 3, 4])),
                 (8, map_from_list(2, [1, 2, 3, 4, 4])),
@@ -108,29 +106,98 @@ def finite_order_primitives(genus):
                 (8, map_from_list(3, [8, 3, 4, 5, 2, 3, 4, 5, 6])),
                 (9, map_from_list(3, [8, 1, 2, 3, 4, 5, 6])),
                 (7, map_from_list(3, [8, 4, 5, 1, 2, 3, 4, 5, 6]))]
-    else:
-        raise ValueError("Please specify 2 or 3 for the genus.")
 
 
-def compute_charpolies():
+def _charpoly_entry(task):
+    """Compute an entry of the table of compute_charpolies().
+
+    This is a module level function so that it can be sent to the worker
+    processes.
+    """
+    genus, order, divisor, matrix = task
+    poly = characteristic_polynomial(matrix_power(matrix, divisor))
+    return genus, (order // divisor, cyclotomic_factorization(poly), order)
+
+
+def compute_charpolies(genera=(2, 3), processes=None, cache_file=None):
     """Compute the characteristic polynomials of homology actions of finite
     order mapping classes.
+
+    For every primitive finite order mapping class ``f`` of order ``n`` in
+    :func:`finite_order_primitives` and every proper divisor ``d`` of ``n``,
+    the characteristic polynomial of the action of ``f^d`` is computed.
+    The powers are computed from the action of ``f`` by repeated squaring
+    and the divisors are distributed among worker processes.
+
+    INPUT:
+
+    - ``genera`` -- (default: (2, 3)) the genera of the table
+
+    - ``processes`` -- (default: None) the number of worker processes. If
+      None, the number of CPUs is used. If 1, no processes are started.
+
+    - ``cache_file`` -- (default: None) the JSON file the table is written
+      to, e.g. CHARPOLY_CACHE_FILE. If the file exists and contains the
+      requested genera, the table is read from it instead. If None, the
+      table is not cached.
+
+    OUTPUT:
+
+    A dictionary whose keys are the genera. The values are the sorted lists
+    of tuples ``(order, factorization, primitive_order)`` where ``order`` is
+    the order of ``f^d``, ``primitive_order`` is the order of ``f`` and
+    ``factorization`` is the characteristic polynomial as a list of pairs
+    ``(k, e)`` standing for the ``k``-th cyclotomic polynomial raised to
+    the power ``e``.
+
+    EXAMPLES::
+
+        >>> from macaw.examples import compute_charpolies
+        >>> data = compute_charpolies([2], processes=1)
+        >>> data[2][:3]
+        [(2, [(1, 2), (2, 2)], 6), (2, [(2, 4)], 6), (2, [(2, 4)], 8)]
+        >>> len(data[2])
+        12
+
     """
-    from sage.all import Integer
-    data = {}
-    for genus in finite_order_primitives.keys():
-        data[genus] = []
-        count = 0
-        for order, f in finite_order_primitives[genus]:
-            count += 1
-            order = Integer(order)
-            for divisor in order.divisors():
-                if divisor == order:
-                    continue
-                g = f ** divisor
-                action = g.action_on_homology()
-                char_poly = action.charpoly()
-                data[genus].append((order//divisor, char_poly.factor(),
-                                    order))
+    genera = sorted(set(genera))
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if all(str(genus) in cached for genus in genera):
+            return {genus: [(order, [tuple(x) for x in factors], prim)
+                            for order, factors, prim in cached[str(genus)]]
+                    for genus in genera}
+
+    tasks = []
+    for genus in genera:
+        for order, f in finite_order_primitives(genus):
+            matrix = f.action_on_homology().tolist()
+            for divisor in range(1, order):
+                if order % divisor == 0:
+                    tasks.append((genus, order, divisor, matrix))
+
+    if processes == 1:
+        results = map(_charpoly_entry, tasks)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            results = pool.map(_charpoly_entry, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    data = {genus: [] for genus in genera}
+    for genus, entry in results:
+        data[genus].append(entry)
+    for genus in genera:
         data[genus].sort()
+
+    if cache_file is not None:
+        directory = os.path.dirname(cache_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(cache_file, 'w') as f:
+            json.dump({str(genus): data[genus] for genus in genera}, f)
     return data
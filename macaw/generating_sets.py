@@ -19,16 +19,15 @@ AUTHORS:
 #                  http://www.gnu.org/licenses/
 # *****************************************************************************
 
-import numpy as np
-import numpy.matlib
+from .homology import HomologyAction
 from .pants_decomposition import PantsDecomposition
+from .pants_lamination import PantsLamination
 from .pants_mapping_class import PantsMappingClass, PantsTwist
 
 
-def elementary_matrix(size, row, col, entry):
-    mat = numpy.matlib.identity(size, dtype=object)
-    mat[row, col] = entry
-    return mat
+# The generators (with the right-most curve included) for each genus.
+_humphries_generators_cache = {}
+
 
 def humphries_generators(genus, right_most_included=False):
     """Construct the Humphries generators on a closed orientable surface.
@@ -51,10 +50,36 @@ def humphries_generators(genus, right_most_included=False):
     element of the tuple, `T_c` is not a list, but a single Dehn twist about
     the last Humphries curve (which intersects only the second curve of `B`.
 
-    The symplectic action of the generators are also computed. The basis of
-    homology is the curves in `A` and the curves in `B`.
+    The symplectic action of the generators are also computed, as products
+    of elementary matrices (see :class:`~macaw.homology.HomologyAction`). The
+    basis of homology is the curves in `A` and the curves in `B`.
+
+    The generators are constructed once for each genus and shared by later
+    calls, so that the cached data of the mapping classes (e.g. their
+    actions on homology) is reused.
+
+    EXAMPLES::
+
+        >>> from macaw.generating_sets import humphries_generators
+        >>> A, B, c = humphries_generators(2)
+        >>> len(A), len(B)
+        (2, 2)
+        >>> A1, B1, c1 = humphries_generators(2, right_most_included=True)
+        >>> len(A1), A1[0] is A[0], c1 is c
+        (3, True, True)
 
     """
+    if genus not in _humphries_generators_cache:
+        _humphries_generators_cache[genus] = _humphries_generators(genus)
+    A, B, c = _humphries_generators_cache[genus]
+    if not right_most_included:
+        A = A[:genus]
+    return (list(A), list(B), c)
+
+
+def _humphries_generators(genus):
+    """Construct the Humphries generators with the right-most curve
+    included."""
     g = genus
     p = PantsDecomposition.humphries(g)
     dim = p.homology_dimension()
@@ -71,46 +96,253 @@ def humphries_generators(genus, right_most_included=False):
 
     # The first curve is curve 0 in the homology basis and it intersects only
     # the curve g in the homology basis.
-    mat = elementary_matrix(dim, 0, g, 1)
-    A = [PantsMappingClass(p, [PantsTwist([], 1)], mat)]
+    action = HomologyAction(dim, [(0, g, 1)])
+    A = [PantsMappingClass(p, [PantsTwist([], 1)], action)]
     for i in range(g-1):
         # Every other curve in A intersects a curve of B on the left and right.
-        mat1 = elementary_matrix(dim, i+1, g+i, -1)
-        mat2 = elementary_matrix(dim, i+1, g+i+1, 1)
+        action = HomologyAction(dim, [(i+1, g+i, -1), (i+1, g+i+1, 1)])
         A.append(PantsMappingClass(p, [PantsTwist([3*i+2], 3*i+2)],
-                                   mat1*mat2))
+                                   action))
 
     # Every curve of B except the last one intersects a curve of A on the left
     # and a curve of A on the right.
-    mat1 = elementary_matrix(dim, g, 0, -1)
-    mat2 = elementary_matrix(dim, g, 1, 1)
-    B = [PantsMappingClass(p, [PantsTwist([1], 1)], mat1*mat2)]
+    action = HomologyAction(dim, [(g, 0, -1), (g, 1, 1)])
+    B = [PantsMappingClass(p, [PantsTwist([1], 1)], action)]
 
     for i in range(g-2):
-        mat1 = elementary_matrix(dim, g+i+1, i+1, -1)
-        mat2 = elementary_matrix(dim, g+i+1, i+2, 1)
+        action = HomologyAction(dim, [(g+i+1, i+1, -1), (g+i+1, i+2, 1)])
         B.append(PantsMappingClass(p, [PantsTwist([3*i+3, 3*i+4], 3*i+4)],
-                                   mat1*mat2))
+                                   action))
 
     # The last curve of B intersects only the last curve of A, numbered g-1.
-    mat = elementary_matrix(dim, 2*g-1, g-1, -1)
-    B.append(PantsMappingClass(p, [PantsTwist([3*g-3], 3*g-3)], mat))
+    action = HomologyAction(dim, [(2*g-1, g-1, -1)])
+    B.append(PantsMappingClass(p, [PantsTwist([3*g-3], 3*g-3)], action))
 
     # The curve c intersects only curve 1 of B. The curve c itself is
     # homologous to A[0]+A[1].
-    mat1 = elementary_matrix(dim, 0, g+1, 1)
-    mat2 = elementary_matrix(dim, 1, g+1, 1)
-    c = PantsMappingClass(p, [PantsTwist([], 3)], mat1*mat2)
-
-    if right_most_included:
-        # The right-most curve only intersects (from the right) the last homology
-        # basis element going around a hole. When oriented from left to right, the
-        # curve is homologous to minus the sum of the A-curves. Since the
-        # intersection is from the right, that cancels out this minus sign and the
-        # matrix has positive entries.
-        mat = np.identity(2*g, dtype=object)
-        for i in range(g):
-            mat[i, 2*g-1] = 1
-        A.append(PantsMappingClass(p, [PantsTwist([], 3*g-3)], mat))
+    action = HomologyAction(dim, [(0, g+1, 1), (1, g+1, 1)])
+    c = PantsMappingClass(p, [PantsTwist([], 3)], action)
+
+    # The right-most curve only intersects (from the right) the last homology
+    # basis element going around a hole. When oriented from left to right, the
+    # curve is homologous to minus the sum of the A-curves. Since the
+    # intersection is from the right, that cancels out this minus sign and the
+    # matrix has positive entries.
+    action = HomologyAction(dim, [(i, 2*g-1, 1) for i in range(g)])
+    A.append(PantsMappingClass(p, [PantsTwist([], 3*g-3)], action))
 
     return (A, B, c)
+
+
+def humphries_curves(genus):
+    """Return the twists about the Humphries curves in the order of the
+    chain.
+
+    OUTPUT:
+
+    The list ``[A[0], B[0], A[1], B[1], ..., B[g-1], A[g], c]`` of the
+    generators returned by ``humphries_generators(genus,
+    right_most_included=True)``. This is the numbering of the curves used
+    by Hirose (see :func:`~macaw.examples.finite_order_primitives`).
+
+    """
+    A, B, c = humphries_generators(genus, right_most_included=True)
+    curves = [A[0]]
+    for i in range(len(B)):
+        curves.append(B[i])
+        curves.append(A[i+1])
+    curves.append(c)
+    return curves
+
+
+def map_from_list(genus, index_list):
+    """Return a product of twists about the Humphries curves.
+
+    INPUT:
+
+    - ``genus`` -- the genus of the closed surface
+
+    - ``index_list`` -- a list of indices of curves in humphries_curves(),
+      starting from 1. A negative index stands for the inverse twist. The
+      product of the empty list is the identity.
+
+    EXAMPLES::
+
+        >>> from macaw.generating_sets import map_from_list
+        >>> f = map_from_list(2, [1, 2, 3, 4])
+        >>> f.order()
+        10
+        >>> (f * map_from_list(2, [-4, -3, -2, -1])).is_identity()
+        True
+        >>> map_from_list(2, []).is_identity()
+        True
+
+    """
+    curves = humphries_curves(genus)
+    f = None
+    for i in index_list:
+        if i == 0 or abs(i) > len(curves):
+            raise ValueError("The index of a Humphries curve in genus %d "
+                             "should be between 1 and %d." %
+                             (genus, len(curves)))
+        twist = curves[i-1] if i > 0 else curves[-i-1].inverse()
+        f = twist if f is None else f * twist
+    if f is None:
+        f = curves[0]**0
+    return f
+
+
+def humphries_relations(genus):
+    """Return the commutation and braid relations between the Humphries
+    generators.
+
+    The generators are denoted by ``'a0'``, ..., ``'b0'``, ..., ``'c'`` as
+    in :func:`humphries_generators`, and their inverses by the capitalized
+    names. The curves ``a0, b0, a1, b1, ...`` form a chain and ``c``
+    intersects only ``b1``. Twists about disjoint curves commute and twists
+    about curves intersecting once satisfy the braid relation.
+
+    OUTPUT:
+
+    A list of pairs of words, each word given by a list of letters. The
+    twists are applied from right to left.
+
+    EXAMPLES::
+
+        >>> from macaw.generating_sets import humphries_relations
+        >>> relations = humphries_relations(2)
+        >>> len(relations)
+        10
+        >>> relations[0]
+        (['a0', 'b0', 'a0'], ['b0', 'a0', 'b0'])
+        >>> relations[1]
+        (['a0', 'a1'], ['a1', 'a0'])
+
+    """
+    chain = []
+    for i in range(genus):
+        chain += ['a%d' % i, 'b%d' % i]
+    intersecting = set(zip(chain, chain[1:]))
+    intersecting.add(('b1', 'c'))
+    letters = chain + ['c']
+    relations = []
+    for i in range(len(letters)):
+        for j in range(i+1, len(letters)):
+            x, y = letters[i], letters[j]
+            if (x, y) in intersecting:
+                relations.append(([x, y, x], [y, x, y]))
+            else:
+                relations.append(([x, y], [y, x]))
+    return relations
+
+
+class SubwordEvaluator(object):
+    """Apply words in the Humphries generators to a fixed set of test
+    laminations, remembering the image of every suffix of every word.
+
+    The images of the pants curves and of their transversals determine a
+    mapping class, so two words are considered equal if they have the same
+    images. A word is applied from right to left, so two words ending with
+    the same suffix share the images of the suffix, and each distinct suffix
+    is evaluated only once per test lamination.
+
+    EXAMPLES::
+
+        >>> from macaw.generating_sets import SubwordEvaluator
+        >>> ev = SubwordEvaluator(2)
+        >>> ev.equal(['a0', 'a1'], ['a1', 'a0'])
+        True
+        >>> ev.equal(['a0', 'b0'], ['b0', 'a0'])
+        False
+        >>> ev.equal(['b0', 'B0'], [])
+        True
+        >>> ev.num_letter_applications()
+        54
+
+    """
+    def __init__(self, genus):
+        A, B, c = humphries_generators(genus)
+        p = A[0]._pants_decomposition
+        generators = {'c': c}
+        for i in range(genus):
+            generators['a%d' % i] = A[i]
+            generators['b%d' % i] = B[i]
+        # The mapping classes of the letters, without the action on homology.
+        self._letters = {}
+        for name, f in generators.items():
+            twists = f._pants_twists
+            self._letters[name] = PantsMappingClass(p, twists)
+            self._letters[name.upper()] = PantsMappingClass(
+                p, [t.inverse() for t in reversed(twists)])
+
+        self._laminations = []
+        for curve in p.inner_pants_curves():
+            self._laminations.append(
+                PantsLamination.from_pants_curve(p, curve))
+            self._laminations.append(
+                PantsLamination.from_transversal(p, curve))
+        # The images of the test laminations under the suffixes evaluated so
+        # far.
+        self._images = {(): [lam.to_vector() for lam in self._laminations]}
+        self._suffix_laminations = {(): self._laminations}
+        self._num_letter_applications = 0
+
+    def images(self, word):
+        """Return the coordinates of the images of the test laminations."""
+        word = tuple(word)
+        k = 0
+        while word[k:] not in self._images:
+            k += 1
+        # word[k:] is the longest evaluated suffix
+        laminations = self._suffix_laminations[word[k:]]
+        for i in range(k-1, -1, -1):
+            f = self._letters[word[i]]
+            laminations = [f * lam for lam in laminations]
+            self._num_letter_applications += len(laminations)
+            self._suffix_laminations[word[i:]] = laminations
+            self._images[word[i:]] = [lam.to_vector() for lam in laminations]
+        return self._images[word]
+
+    def equal(self, word1, word2):
+        """Decide if two words represent the same mapping class."""
+        return all((x == y).all() for x, y in zip(self.images(word1),
+                                                  self.images(word2)))
+
+    def num_letter_applications(self):
+        """Return the number of times a letter was applied to a test
+        lamination."""
+        return self._num_letter_applications
+
+
+def verify_relations(relations, genus):
+    """Check relations between the Humphries generators.
+
+    The two sides of each relation are applied to test laminations by a
+    SubwordEvaluator, so common suffixes of the words are evaluated only
+    once.
+
+    INPUT:
+
+    - ``relations`` -- a list of pairs of words in the letters of
+      :func:`humphries_relations`
+
+    - ``genus`` -- the genus of the closed surface
+
+    OUTPUT:
+
+    The list of relations that do not hold.
+
+    EXAMPLES::
+
+        >>> from macaw.generating_sets import humphries_relations, \\
+        ...     verify_relations
+        >>> verify_relations(humphries_relations(2), 2)
+        []
+        >>> verify_relations([(['a0', 'c'], ['c', 'a0']),
+        ...                   (['b1', 'c'], ['c', 'b1'])], 2)
+        [(['b1', 'c'], ['c', 'b1'])]
+
+    """
+    evaluator = SubwordEvaluator(genus)
+    return [(lhs, rhs) for lhs, rhs in relations
+            if not evaluator.equal(lhs, rhs)]
@@ -0,0 +1,884 @@
+r"""
+Actions of mapping classes on homology.
+
+The action of a Dehn twist on homology is a transvection, which is a
+product of few elementary matrices in a suitable basis. The action of a
+product of twists is stored as the list of these elementary updates, and
+the matrix is only computed when it is needed.
+
+The action of an arbitrary twist is computed from the homology classes of
+curves. The class of a curve is found by following the curve on its
+Dehn-Thurston train track and computing algebraic intersection numbers with
+a homology basis (see :meth:`PantsDecomposition.homology_basis`) on a fixed
+reference train track.
+
+"""
+
+
+from fractions import Fraction, gcd
+import numpy as np
+from .pants_lamination import PantsLamination
+from .constants import LEFT, RIGHT
+from .serialization import write_uint, write_int, read_uint, read_int
+
+# Entries are computed in int64 while their absolute values are guaranteed
+# to stay below this bound.
+INT64_BOUND = 2**62
+
+# The types of the factors of a HomologyAction in its binary encoding.
+_ELEMENTARY = 0
+_TRANSVECTION = 1
+_MATRIX = 2
+
+# The default moduli of the reductions of homology actions. They are the
+# largest primes below 2**26, so products of matrices of dimension up to
+# 2**10 can be computed in int64 without overflow.
+DEFAULT_PRIMES = (67108859, 67108837)
+
+
+def _check_modulus(modulus, dimension):
+    if modulus < 2:
+        raise ValueError("The modulus has to be at least 2.")
+    if dimension * (modulus - 1)**2 >= 2**63:
+        raise ValueError("The modulus is too large for int64 arithmetic.")
+
+
+def _inverse_integer_matrix(mat):
+    """Return the inverse of an integer matrix with determinant +-1.
+
+    EXAMPLES::
+
+        >>> from macaw.homology import _inverse_integer_matrix
+        >>> _inverse_integer_matrix([[2, 1], [1, 1]]).tolist()
+        [[1, -1], [-1, 2]]
+
+    """
+    n = len(mat)
+    a = [[Fraction(int(mat[i][j])) for j in range(n)] +
+         [Fraction(int(i == j)) for j in range(n)] for i in range(n)]
+    for col in range(n):
+        pivot = next(i for i in range(col, n) if a[i][col] != 0)
+        a[col], a[pivot] = a[pivot], a[col]
+        c = a[col][col]
+        a[col] = [x / c for x in a[col]]
+        for i in range(n):
+            if i != col and a[i][col] != 0:
+                c = a[i][col]
+                a[i] = [x - c * y for x, y in zip(a[i], a[col])]
+    inverse = np.zeros((n, n), dtype=object)
+    for i in range(n):
+        for j in range(n):
+            if a[i][n+j].denominator != 1:
+                raise ValueError("The matrix is not invertible over the "
+                                 "integers.")
+            inverse[i, j] = int(a[i][n+j])
+    return inverse
+
+
+class _Transvection(object):
+    """The factor ``x -> x + power * (functional . x) * vector``.
+
+    The vector and the functional are stored as tuples of ``(index,
+    entry)`` pairs of their nonzero entries. The functional vanishes on the
+    vector, so the powers of the factor are obtained by scaling.
+    """
+    __slots__ = ['vector', 'functional', 'power']
+
+    def __init__(self, vector, functional, power=1):
+        self.vector = tuple(vector)
+        self.functional = tuple(functional)
+        self.power = power
+
+    def inverse(self):
+        return _Transvection(self.vector, self.functional, -self.power)
+
+
+class HomologyAction(object):
+    """The action of a mapping class on the first homology, stored as a
+    product of elementary matrices and explicit matrices.
+
+    The factors are multiplied from left to right. An elementary factor
+    ``(row, col, entry)`` with ``row != col`` is the identity matrix plus
+    ``entry`` at position ``(row, col)``. The actions of twists computed by
+    :class:`PantsHomology` are transvections. Products, inverses and powers only
+    manipulate the list of factors. The matrix is computed on demand by
+    :meth:`matrix`, in int64 arithmetic as long as the entries are
+    guaranteed not to overflow.
+
+    INPUT:
+
+    - ``dimension`` -- the dimension of the homology
+
+    - ``factors`` -- a list of elementary factors and square matrices
+
+    EXAMPLES::
+
+        >>> from macaw.homology import HomologyAction
+        >>> a = HomologyAction(2, [(0, 1, 1)])
+        >>> b = HomologyAction(2, [(1, 0, -1)])
+        >>> (a * b).matrix().tolist()
+        [[0, 1], [-1, 1]]
+        >>> ((a * b)**6).is_identity()
+        True
+        >>> (a**(-3)).matrix().tolist()
+        [[1, -3], [0, 1]]
+        >>> (a * b).apply([1, 0])
+        [0, -1]
+
+    """
+    def __init__(self, dimension, factors=None):
+        self._dimension = dimension
+        self._factors = [] if factors is None else list(factors)
+        for f in self._factors:
+            if isinstance(f, tuple) and f[0] == f[1]:
+                raise ValueError("Elementary factors have to be off the "
+                                 "diagonal.")
+        self._matrix = None
+        self._matrices_mod = {}
+
+    @classmethod
+    def identity(cls, dimension):
+        return cls(dimension)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Create the action from a square integer matrix."""
+        mat = np.array(matrix, dtype=object)
+        return cls(mat.shape[0], [mat])
+
+    def dimension(self):
+        return self._dimension
+
+    def num_factors(self):
+        """Return the number of factors in the product."""
+        return len(self._factors)
+
+    def __mul__(self, other):
+        if self._dimension != other._dimension:
+            raise ValueError("The dimensions of the actions are different.")
+        return HomologyAction(self._dimension,
+                              self._factors + other._factors)
+
+    def inverse(self):
+        factors = []
+        for f in reversed(self._factors):
+            if isinstance(f, tuple):
+                factors.append((f[0], f[1], -f[2]))
+            elif isinstance(f, _Transvection):
+                factors.append(f.inverse())
+            else:
+                factors.append(_inverse_integer_matrix(f))
+        return HomologyAction(self._dimension, factors)
+
+    def __pow__(self, k):
+        if k < 0:
+            return self.inverse() ** (-k)
+        return HomologyAction(self._dimension, self._factors * k)
+
+    def apply(self, vector):
+        """Return the image of a homology class given by its coordinates.
+
+        The elementary factors are applied directly to the vector, so the
+        matrix is not computed.
+        """
+        v = [int(x) for x in vector]
+        for f in reversed(self._factors):
+            if isinstance(f, tuple):
+                row, col, entry = f
+                v[row] += entry * v[col]
+            elif isinstance(f, _Transvection):
+                a = f.power * sum(x * v[i] for i, x in f.functional)
+                for i, x in f.vector:
+                    v[i] += a * x
+            else:
+                v = [sum(int(f[i, j]) * v[j] for j in range(len(v)))
+                     for i in range(len(v))]
+        return v
+
+    def entry_bound(self):
+        """Return an upper bound for the absolute values of the entries of
+        the matrix, computed without the matrix."""
+        n = self._dimension
+        bound = 1
+        for f in self._factors:
+            if isinstance(f, tuple):
+                bound *= 1 + abs(f[2])
+            elif isinstance(f, _Transvection):
+                bound *= 1 + abs(f.power) * \
+                    sum(abs(x) for i, x in f.vector) * \
+                    sum(abs(x) for i, x in f.functional)
+            else:
+                bound *= max(n * max(abs(int(x)) for x in f.flat), 1)
+        return bound
+
+    def matrix(self):
+        """Return the matrix of the action as a numpy array.
+
+        The dtype is int64 unless the entries may be too large, in which
+        case it is object.
+        """
+        if self._matrix is not None:
+            return self._matrix
+        n = self._dimension
+        dtype = np.int64 if self.entry_bound() < INT64_BOUND else object
+        mat = np.identity(n, dtype=np.int64).astype(dtype)
+        for f in self._factors:
+            if isinstance(f, tuple):
+                row, col, entry = f
+                # right multiplication by the elementary matrix adds a
+                # multiple of column ``row`` to column ``col``
+                mat[:, col] += entry * mat[:, row]
+            elif isinstance(f, _Transvection):
+                # M(I + k v w^T) = M + k (Mv) w^T
+                image = sum(x * mat[:, i] for i, x in f.vector)
+                for i, x in f.functional:
+                    mat[:, i] += f.power * x * image
+            else:
+                mat = mat.dot(f.astype(dtype))
+        self._matrix = mat
+        return mat
+
+    def matrix_mod(self, modulus):
+        """Return the matrix of the action modulo an integer.
+
+        The matrix is computed in int64 arithmetic, reducing after every
+        factor, so this is fast even when the entries of :meth:`matrix` are
+        large.
+
+        EXAMPLES::
+
+            >>> from macaw.homology import HomologyAction
+            >>> a = HomologyAction(2, [(0, 1, 1), (1, 0, 1)])
+            >>> (a**8).matrix().tolist()
+            [[1597, 987], [987, 610]]
+            >>> (a**8).matrix_mod(7).tolist()
+            [[1, 0], [0, 1]]
+            >>> (a**8).matrix_mod(11).tolist()
+            [[2, 8], [8, 5]]
+
+        """
+        if modulus in self._matrices_mod:
+            return self._matrices_mod[modulus]
+        n = self._dimension
+        _check_modulus(modulus, n)
+        mat = np.identity(n, dtype=np.int64)
+        for f in self._factors:
+            if isinstance(f, tuple):
+                row, col, entry = f
+                mat[:, col] = (mat[:, col] + (entry % modulus) *
+                               mat[:, row]) % modulus
+            elif isinstance(f, _Transvection):
+                image = np.zeros(n, dtype=np.int64)
+                for i, x in f.vector:
+                    image = (image + (x % modulus) * mat[:, i]) % modulus
+                for i, x in f.functional:
+                    mat[:, i] = (mat[:, i] + (f.power * x % modulus) *
+                                 image) % modulus
+            else:
+                factor = np.array([[int(x) % modulus for x in row]
+                                   for row in f], dtype=np.int64)
+                mat = mat.dot(factor) % modulus
+        self._matrices_mod[modulus] = mat
+        return mat
+
+    def reduce(self, moduli=DEFAULT_PRIMES):
+        """Return the reduction of the action modulo some integers as a
+        ModularHomologyAction."""
+        return ModularHomologyAction([(m, self.matrix_mod(m))
+                                      for m in moduli])
+
+    def is_identity(self):
+        """Decide if the action is trivial.
+
+        The reductions modulo DEFAULT_PRIMES are checked first. If they
+        are trivial and the entries are smaller than half the product of
+        the primes, the action is trivial by the Chinese remainder
+        theorem. Otherwise the exact matrix is computed.
+        """
+        if not self.reduce().is_identity():
+            return False
+        product = 1
+        for m in DEFAULT_PRIMES:
+            product *= m
+        if 2 * (self.entry_bound() + 1) < product:
+            return True
+        return np.array_equal(self.matrix(),
+                              np.identity(self._dimension, dtype=np.int64))
+
+    def _write(self, buf):
+        """Append the dimension and the factors to a bytearray.
+
+        EXAMPLES::
+
+            >>> from macaw.homology import HomologyAction
+            >>> a = HomologyAction(2, [(0, 1, 1), (1, 0, -1)])
+            >>> a = a * HomologyAction.from_matrix([[0, 1], [-1, 0]])
+            >>> buf = bytearray()
+            >>> a._write(buf)
+            >>> b, pos = HomologyAction._read(buf, 0)
+            >>> pos == len(buf)
+            True
+            >>> b.matrix().tolist() == a.matrix().tolist()
+            True
+
+        """
+        write_uint(buf, self._dimension)
+        write_uint(buf, len(self._factors))
+        for f in self._factors:
+            if isinstance(f, tuple):
+                buf.append(_ELEMENTARY)
+                write_uint(buf, f[0])
+                write_uint(buf, f[1])
+                write_int(buf, f[2])
+            elif isinstance(f, _Transvection):
+                buf.append(_TRANSVECTION)
+                for pairs in [f.vector, f.functional]:
+                    write_uint(buf, len(pairs))
+                    for i, x in pairs:
+                        write_uint(buf, i)
+                        write_int(buf, x)
+                write_int(buf, f.power)
+            else:
+                buf.append(_MATRIX)
+                for x in f.flat:
+                    write_int(buf, x)
+
+    @classmethod
+    def _read(cls, data, pos):
+        """Create an action from the data written by _write().
+
+        OUTPUT:
+
+        The action and the position after its data.
+        """
+        n, pos = read_uint(data, pos)
+        num_factors, pos = read_uint(data, pos)
+        factors = []
+        for k in range(num_factors):
+            kind = data[pos]
+            pos += 1
+            if kind == _ELEMENTARY:
+                row, pos = read_uint(data, pos)
+                col, pos = read_uint(data, pos)
+                entry, pos = read_int(data, pos)
+                factors.append((row, col, entry))
+            elif kind == _TRANSVECTION:
+                vectors = []
+                for step in range(2):
+                    length, pos = read_uint(data, pos)
+                    pairs = []
+                    for j in range(length):
+                        i, pos = read_uint(data, pos)
+                        x, pos = read_int(data, pos)
+                        pairs.append((i, x))
+                    vectors.append(pairs)
+                power, pos = read_int(data, pos)
+                factors.append(_Transvection(vectors[0], vectors[1], power))
+            elif kind == _MATRIX:
+                entries = []
+                for j in range(n*n):
+                    x, pos = read_int(data, pos)
+                    entries.append(x)
+                factors.append(np.array(entries, dtype=object).reshape(n, n))
+            else:
+                raise ValueError("Unknown factor type: %d." % kind)
+        return cls(n, factors), pos
+
+
+class ModularHomologyAction(object):
+    """The action on homology reduced modulo one or more integers.
+
+    The matrices are int64 numpy arrays with entries in ``[0, m)``.
+    Products, powers (by repeated squaring) and identity tests are much
+    faster than for the exact matrices. If the action of a mapping class
+    is not trivial modulo some integer, the mapping class is not in the
+    Torelli group, so this is a cheap necessary condition before exact
+    checks.
+
+    INPUT:
+
+    - ``matrices`` -- a list of pairs ``(modulus, matrix)``
+
+    EXAMPLES::
+
+        >>> from macaw.homology import HomologyAction
+        >>> a = HomologyAction(2, [(0, 1, 1), (1, 0, -1)]).reduce([5, 7])
+        >>> (a**6).is_identity()
+        True
+        >>> (a**3).is_identity()
+        False
+        >>> (a*a*a).matrices()[0][1].tolist()
+        [[4, 0], [0, 4]]
+
+    """
+    def __init__(self, matrices):
+        self._matrices = [(m, np.array(mat, dtype=np.int64) % m)
+                          for m, mat in matrices]
+        for m, mat in self._matrices:
+            _check_modulus(m, mat.shape[0])
+
+    def matrices(self):
+        return list(self._matrices)
+
+    def moduli(self):
+        return [m for m, mat in self._matrices]
+
+    def __mul__(self, other):
+        if self.moduli() != other.moduli():
+            raise ValueError("The actions are reduced modulo different "
+                             "integers.")
+        return ModularHomologyAction(
+            [(m, mat.dot(other_mat) % m) for (m, mat), (m2, other_mat)
+             in zip(self._matrices, other._matrices)])
+
+    def __pow__(self, k):
+        if k < 0:
+            raise ValueError("Negative powers are not supported.")
+        result = []
+        for m, mat in self._matrices:
+            power = np.identity(mat.shape[0], dtype=np.int64)
+            square = mat
+            exponent = k
+            while exponent > 0:
+                if exponent % 2 == 1:
+                    power = power.dot(square) % m
+                square = square.dot(square) % m
+                exponent //= 2
+            result.append((m, power))
+        return ModularHomologyAction(result)
+
+    def is_identity(self):
+        """Decide if the action is trivial modulo all of the moduli."""
+        return all(np.array_equal(mat, np.identity(mat.shape[0],
+                                                   dtype=np.int64))
+                   for m, mat in self._matrices)
+
+
+class _RibbonTrack(object):
+    """The combinatorics of a Dehn-Thurston train track as a graph embedded
+    in the surface.
+
+    The switches are the vertices of the graph. The half-edges at a switch
+    are the outgoing branches (the positive label of a branch is its start,
+    the negative label is its end), ordered cyclically by the gluing list.
+    Every branch other than a pants branch is an arc in a pair of pants,
+    labelled by the pants and the indices of the boundaries of its start
+    and end.
+
+    The train track has to be constructed from Dehn-Thurston coordinates,
+    so that the pants branch at switch ``i`` is branch ``i``.
+    """
+    def __init__(self, train_track, pants_decomposition):
+        tt = train_track
+        self._tt = tt
+        self._p = pants_decomposition
+        self.num_switches = tt.num_switches()
+
+        # outgoing branches on each side of each switch
+        self._lists = {}
+        # the cyclic order of the half-edges at each switch
+        self._rotation = {}
+        for sw in range(1, self.num_switches+1):
+            self._lists[sw] = list(tt.outgoing_branches(sw))
+            self._lists[-sw] = list(tt.outgoing_branches(-sw))
+            self._rotation[sw] = list(reversed(self._lists[sw])) + \
+                list(reversed(self._lists[-sw]))
+        self._position = {}
+        for sw, half_edges in self._rotation.items():
+            for i, h in enumerate(half_edges):
+                self._position[h] = (sw, i)
+        self._side_position = {}
+        for sw, half_edges in self._lists.items():
+            for i, h in enumerate(half_edges):
+                self._side_position[h] = (sw, i)
+
+        self.arcs = {}
+        for b in tt.branches():
+            if b > 0 and not self.is_pants_branch(b):
+                start = self._arc_end(b)
+                end = self._arc_end(-b)
+                assert start[0] == end[0]
+                self.arcs[b] = (start[0], start[1], end[1])
+
+    def is_pants_branch(self, branch):
+        return abs(branch) <= self.num_switches
+
+    def is_self_connecting(self, branch):
+        """Decide if a branch is an arc connecting a boundary of a pair of
+        pants to itself."""
+        if self.is_pants_branch(branch):
+            return False
+        pant, start, end = self.arcs[abs(branch)]
+        return start == end
+
+    def _arc_end(self, half_edge):
+        """Return the pants and the boundary index where an arc ends.
+
+        The arcs of the pants on the left of the pants curve are on the left
+        of the pants branch on the positive side of the switch, or on the
+        right on the negative side.
+        """
+        sw, i = self._side_position[half_edge]
+        half_edges = self._lists[sw]
+        pants_branch_idx = [k for k in range(len(half_edges))
+                            if abs(half_edges[k]) == abs(sw)][0]
+        on_left = i < pants_branch_idx
+        side = LEFT if (sw > 0) == on_left else RIGHT
+        return self._p.adjacent_pants(abs(sw))[side][0]
+
+    def faces(self):
+        """Return the boundaries of the complementary regions as lists of
+        half-edges traversed."""
+        seen = set()
+        faces = []
+        for start in sorted(self._position):
+            if start in seen:
+                continue
+            face = []
+            h = start
+            while h not in seen:
+                seen.add(h)
+                face.append(h)
+                sw, i = self._position[-h]
+                half_edges = self._rotation[sw]
+                h = half_edges[(i+1) % len(half_edges)]
+            faces.append(face)
+        return faces
+
+    def cocycle(self, path):
+        """Return the cocycle of algebraic intersections with a closed path.
+
+        The path (a list of half-edges traversed) is pushed off to its left.
+        The push-off crosses the branches starting to the left of the path
+        at the switches of the path. The intersection number of a 1-cycle
+        with the path is the sum of the products of its coefficients and
+        the values of the cocycle on the branches.
+        """
+        cocycle = {}
+        for k in range(len(path)):
+            incoming = -path[k]
+            outgoing = path[(k+1) % len(path)]
+            sw, i = self._position[outgoing]
+            end = self._position[incoming][1]
+            half_edges = self._rotation[sw]
+            j = (i + 1) % len(half_edges)
+            while j != end:
+                h = half_edges[j]
+                cocycle[abs(h)] = cocycle.get(abs(h), 0) + (-1 if h > 0 else 1)
+                j = (j + 1) % len(half_edges)
+        return cocycle
+
+    def trace_curve(self):
+        """Follow the curve carried by the train track.
+
+        OUTPUT:
+
+        The 1-cycle of the curve, as a dictionary from branches to their
+        coefficients. The orientation is determined by the branch with the
+        smallest number and positive measure.
+
+        A ValueError is raised if the measure is not a single curve.
+        """
+        tt = self._tt
+
+        def measure(h):
+            return tt.branch_measure(abs(h))
+
+        total = sum(measure(b) for b in tt.branches() if b > 0)
+        start = (min(b for b in tt.branches() if b > 0 and measure(b) > 0), 0)
+        h, j = start
+        cycle = {}
+        length = 0
+        while True:
+            cycle[abs(h)] = cycle.get(abs(h), 0) + (1 if h > 0 else -1)
+            length += 1
+            # The j-th strand from the left of h is the (m-1-j)-th from the
+            # left looking from the other end of h. Continuing on the other
+            # side of the switch reverses left and right again.
+            sw, i = self._side_position[-h]
+            half_edges = self._lists[sw]
+            idx = sum(measure(x) for x in half_edges[:i]) + measure(h) - 1 - j
+            other_side = self._lists[-sw]
+            idx = sum(measure(x) for x in other_side) - 1 - idx
+            for x in other_side:
+                if idx < measure(x):
+                    h, j = x, idx
+                    break
+                idx -= measure(x)
+            if (h, j) == start:
+                break
+        if length != total:
+            raise ValueError("The lamination is not a single curve.")
+        return cycle
+
+
+def _add_to_chain(chain, other, coefficient=1):
+    for b, x in other.items():
+        chain[b] = chain.get(b, 0) + coefficient * x
+
+
+def _apply_twist(lam, moves, pants_curve, power):
+    """Apply a twist given by its elementary moves to a copy of a
+    lamination."""
+    lam = lam.copy()
+    for curve in moves:
+        lam.apply_elementary_move(curve)
+    lam.apply_twist(pants_curve, power)
+    for curve in reversed(moves):
+        lam.apply_elementary_move(curve, inverse=True)
+    return lam
+
+
+class PantsHomology(object):
+    """The first homology of a closed surface given by a pants
+    decomposition.
+
+    The basis is the one given by
+    :meth:`~macaw.pants_decomposition.PantsDecomposition.homology_basis`.
+    The pants curves and the cycles of the basis are realized on a
+    reference Dehn-Thurston train track where every pair of pants contains
+    three arcs connecting its boundaries. The complementary regions of
+    Dehn-Thurston train tracks are disks, so the classes of curves are
+    determined by their algebraic intersections with the basis.
+
+    Use :func:`pants_homology` to get the (cached) instance for a pants
+    decomposition.
+
+    EXAMPLES::
+
+        >>> from macaw import PantsDecomposition
+        >>> from macaw.homology import PantsHomology
+        >>> p = PantsDecomposition.humphries(2)
+        >>> h = PantsHomology(p)
+        >>> h.intersection_matrix()
+        [[0, 0, -1, 0], [0, 0, 0, -1], [1, 0, 0, 0], [0, 1, 0, 0]]
+
+    The curves 1 and 3 are in the basis, the separating curve 2 is
+    nullhomologous::
+
+        >>> from macaw.pants_lamination import PantsLamination
+        >>> [h.curve_class(PantsLamination.from_pants_curve(p, c))
+        ...  for c in [1, 2, 3]]
+        [[1, 0, 0, 0], [0, 0, 0, 0], [0, 1, 0, 0]]
+
+    """
+    def __init__(self, pants_decomposition):
+        p = pants_decomposition
+        if p.num_punctures() > 0:
+            raise NotImplementedError("The action on homology is only "
+                                      "implemented for closed surfaces.")
+        self._p = p
+        n = p.num_inner_pants_curves()
+        self._ipc = p.inner_pants_curves()
+        reference = PantsLamination(p, [2, 1]*n)
+        self._reference = _RibbonTrack(reference._tt, p)
+        self._arcs = {}
+        for b, (pant, start, end) in self._reference.arcs.items():
+            self._arcs[(pant, start, end)] = b
+            self._arcs[(pant, end, start)] = -b
+
+        self._basis_curves, self._basis_cycles = p.homology_basis()
+        paths = [[c] for c in self._basis_curves]
+        for cycle in self._basis_cycles:
+            path = []
+            for k in range(len(cycle)):
+                pant, start = p.adjacent_pants(cycle[k-1])[RIGHT][0]
+                pant2, end = p.adjacent_pants(cycle[k])[LEFT][0]
+                assert pant == pant2
+                path.append(self._arcs[(pant, start, end)])
+            paths.append(path)
+        self._cocycles = [self._reference.cocycle(path) for path in paths]
+        self._intersection_matrix = [
+            [self._pair(self._path_to_chain(path), cocycle)
+             for cocycle in self._cocycles] for path in paths]
+        self._inverse_intersection_matrix = \
+            _inverse_integer_matrix(self._intersection_matrix)
+        # the data of the transvections, keyed by the curve keys of twists
+        self._twist_cache = {}
+
+    def dimension(self):
+        return len(self._cocycles)
+
+    def intersection_matrix(self):
+        """Return the matrix of algebraic intersection numbers of the basis
+        elements."""
+        return [list(row) for row in self._intersection_matrix]
+
+    @staticmethod
+    def _path_to_chain(path):
+        chain = {}
+        for h in path:
+            _add_to_chain(chain, {abs(h): 1 if h > 0 else -1})
+        return chain
+
+    @staticmethod
+    def _pair(chain, cocycle):
+        return sum(x * cocycle.get(b, 0) for b, x in chain.items())
+
+    def intersection(self, x, y):
+        """Return the algebraic intersection number of two homology classes
+        given by their coordinates."""
+        omega = self._intersection_matrix
+        return sum(x[i] * omega[i][j] * y[j]
+                   for i in range(len(x)) if x[i] != 0
+                   for j in range(len(y)) if y[j] != 0)
+
+    def curve_class(self, lamination):
+        """Return the coordinates of the homology class of a curve.
+
+        The orientation of the curve is arbitrary, so the class is only
+        determined up to sign.
+
+        INPUT:
+
+        - ``lamination`` -- a PantsLamination which is a single curve
+
+        """
+        coordinates = [int(x) for x in lamination.to_vector()]
+        tt = PantsLamination(self._p, coordinates)._tt
+        track = _RibbonTrack(tt, self._p)
+        cycle = track.trace_curve()
+
+        # The arcs connecting different boundaries of a pair of pants are the
+        # same as on the reference train track. The self-connecting arcs are
+        # replaced by the rest of the boundary of a complementary region.
+        self_connecting = {}
+        if any(track.is_self_connecting(b) for b in cycle):
+            for face in track.faces():
+                for b in set(abs(h) for h in face):
+                    coefficient = face.count(b) - face.count(-b)
+                    if b in self_connecting or abs(coefficient) != 1 or \
+                       not track.is_self_connecting(b):
+                        continue
+                    rest = {}
+                    for h in face:
+                        if abs(h) != b:
+                            _add_to_chain(rest, {abs(h): 1 if h > 0 else -1},
+                                          -coefficient)
+                    self_connecting[b] = rest
+
+        chain = {}
+        for b, x in cycle.items():
+            if x == 0:
+                continue
+            if b in self_connecting:
+                _add_to_chain(chain, self._translate(track,
+                                                     self_connecting[b]), x)
+            else:
+                _add_to_chain(chain, self._translate(track, {b: 1}), x)
+
+        intersections = [self._pair(chain, cocycle)
+                         for cocycle in self._cocycles]
+        inverse = self._inverse_intersection_matrix
+        d = self.dimension()
+        return [int(sum(intersections[i] * inverse[i][j] for i in range(d)))
+                for j in range(d)]
+
+    def _translate(self, track, chain):
+        """Replace the branches of a chain on a train track by the branches
+        of the reference train track."""
+        result = {}
+        for b, x in chain.items():
+            if track.is_pants_branch(b):
+                _add_to_chain(result, {b: x})
+            else:
+                h = self._arcs[track.arcs[b]]
+                _add_to_chain(result, {abs(h): x if h > 0 else -x})
+        return result
+
+    def _test_curves(self):
+        """Return the pants curves and curves corresponding to the cycles
+        of the homology basis, whose classes span the homology."""
+        p = self._p
+        curves = [PantsLamination.from_pants_curve(p, c) for c in self._ipc]
+        for cycle in self._basis_cycles:
+            coordinates = [0] * (2*len(self._ipc))
+            for c in cycle:
+                coordinates[2*p.index_of_inner_pants_curve(c)] = 1
+            curves.append(PantsLamination(p, coordinates))
+        return curves
+
+    def _twist_data(self, moves, pants_curve):
+        """Return the class ``C`` of the twisting curve (up to sign) and the
+        sign ``s`` such that the twist acts by ``x -> x + s*i(x, C)*C``.
+
+        A twist about a curve ``C`` maps a curve of class ``x`` to a curve
+        of class ``x + s*i(x, C)*C``, and its inverse to a curve of class
+        ``x - s*i(x, C)*C``. These classes are computed for test curves
+        until one of them intersects ``C``. If none of them do, ``C`` is
+        nullhomologous and None is returned.
+        """
+        for lam in self._test_curves():
+            x = self.curve_class(lam)
+            y1 = self.curve_class(_apply_twist(lam, moves, pants_curve, 1))
+            y2 = self.curve_class(_apply_twist(lam, moves, pants_curve, -1))
+            # fixing the orientations of the images
+            diff = None
+            for s1 in [1, -1]:
+                for s2 in [1, -1]:
+                    if all(s1*a + s2*b == 2*c for a, b, c in zip(y1, y2, x)):
+                        diff = [s1*a - c for a, c in zip(y1, x)]
+            if diff is None:
+                raise ValueError("Inconsistent images under the twist.")
+            if not any(diff):
+                continue
+            divisor = reduce(gcd, [abs(a) for a in diff])
+            vector = [a // divisor for a in diff]
+            # diff = s*i(x, C)*C and divisor = |i(x, C)|
+            sign = divisor // self.intersection(x, vector)
+            return vector, sign
+        return None
+
+    def twist_action(self, pants_twist):
+        """Return the action of a PantsTwist on homology.
+
+        The transvection of the twisting curve is cached for the curve key
+        of the twist, so the twists about the same curve share the
+        computation.
+
+        EXAMPLES::
+
+            >>> from macaw import PantsDecomposition
+            >>> from macaw.homology import pants_homology
+            >>> from macaw.pants_mapping_class import PantsTwist
+            >>> p = PantsDecomposition.humphries(2)
+            >>> h = pants_homology(p)
+            >>> h.twist_action(PantsTwist([1], 1)).matrix().tolist()
+            [[1, 0, 0, 0], [0, 1, 0, 0], [1, 0, 1, 0], [0, 0, 0, 1]]
+            >>> h.twist_action(PantsTwist([2], 2, -2)).matrix().tolist()
+            [[1, 0, 2, 2], [0, 1, 2, 2], [0, 0, 1, 0], [0, 0, 0, 1]]
+
+        """
+        key = pants_twist.curve_key()
+        if key not in self._twist_cache:
+            self._twist_cache[key] = self._twist_data(*key)
+        data = self._twist_cache[key]
+        d = self.dimension()
+        if data is None:
+            return HomologyAction.identity(d)
+        vector, sign = data
+        omega = self._intersection_matrix
+        functional = [sign * sum(omega[j][i] * vector[i] for i in range(d))
+                      for j in range(d)]
+        factor = _Transvection([(i, a) for i, a in enumerate(vector)
+                                if a != 0],
+                               [(i, a) for i, a in enumerate(functional)
+                                if a != 0],
+                               pants_twist.power)
+        return HomologyAction(d, [factor])
+
+
+# PantsHomology instances, keyed by the gluing lists.
+_pants_homology_cache = {}
+
+
+def pants_homology(pants_decomposition):
+    """Return the PantsHomology of a pants decomposition.
+
+    The instances are cached, so the homology basis and the actions of the
+    twists are only computed once for each pants decomposition.
+    """
+    key = tuple(tuple(pant) for pant in pants_decomposition._gluing_list)
+    if key not in _pants_homology_cache:
+        _pants_homology_cache[key] = PantsHomology(pants_decomposition)
+    return _pants_homology_cache[key]
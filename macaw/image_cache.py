@@ -0,0 +1,165 @@
+r"""
+A cache of the images of laminations under words of twists.
+
+Words of twists act on laminations from right to left, so the words sharing
+a suffix map a lamination to the same intermediate lamination before the
+rest of the word is applied. The suffixes are stored in a trie and the
+images are cached for pairs of trie nodes and laminations.
+
+"""
+
+
+import sys
+from collections import OrderedDict
+
+
+class _TrieNode(object):
+    """A node of the trie of suffixes, representing the word read from the
+    root to the node in reverse order."""
+    def __init__(self, parent=None, letter=None):
+        self.parent = parent
+        self.letter = letter
+        self.children = {}
+        # the number of cached images at this node
+        self.num_entries = 0
+
+
+class ImageCache(object):
+    """A bounded cache of images of laminations under suffixes of words.
+
+    The least recently used images are discarded when the estimated memory
+    used by the cached coordinates exceeds ``max_memory`` bytes. Nodes of
+    the trie without cached images and without children are removed with
+    the images.
+
+    INPUT:
+
+    - ``max_memory`` -- the maximal memory used by the cached coordinates,
+      in bytes
+
+    EXAMPLES::
+
+        >>> from macaw.image_cache import ImageCache
+        >>> cache = ImageCache(max_memory=1000)
+        >>> cache.insert('p', ['x', 'y'], (1, 2), (5, 6))
+        >>> cache.insert('p', ['x'], (1, 2), (3, 4))
+        >>> cache.lookup('p', ['z', 'x', 'y'], (1, 2))
+        (2, (5, 6))
+        >>> cache.lookup('p', ['y'], (1, 2))
+        (0, None)
+        >>> cache.statistics()['hits'], cache.statistics()['misses']
+        (1, 1)
+
+    """
+    def __init__(self, max_memory=10**7):
+        self._max_memory = max_memory
+        self._roots = {}
+        self._entries = OrderedDict()
+        self._memory = 0
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _entry_size(coordinates):
+        """Estimate the memory used by an entry."""
+        return sys.getsizeof(coordinates) + \
+            sum(sys.getsizeof(x) for x in coordinates)
+
+    def lookup(self, domain, word, coordinates):
+        """Find the longest suffix of a word with a cached image.
+
+        INPUT:
+
+        - ``domain`` -- a hashable object identifying the pants
+          decomposition
+
+        - ``word`` -- a list of hashable letters, applied from right to left
+
+        - ``coordinates`` -- a tuple of the coordinates of the lamination
+
+        OUTPUT:
+
+        A tuple ``(length, image)``: the length of the longest suffix of
+        ``word`` whose image of the lamination is cached and the coordinates
+        of the image. If there is no such suffix, ``(0, None)`` is returned.
+
+        """
+        node = self._roots.get(domain)
+        best = (0, None)
+        depth = 0
+        for letter in reversed(word):
+            if node is None:
+                break
+            node = node.children.get(letter)
+            depth += 1
+            if node is not None and node.num_entries > 0:
+                key = (id(node), coordinates)
+                if key in self._entries:
+                    best = (depth, key)
+        if best[1] is None:
+            self._misses += 1
+            return 0, None
+        self._hits += 1
+        # marking the entry as recently used
+        image = self._entries.pop(best[1])
+        self._entries[best[1]] = image
+        return best[0], image[1]
+
+    def insert(self, domain, word, coordinates, image):
+        """Cache the image of a lamination under a word.
+
+        The arguments are as in :meth:`lookup`; ``image`` is the tuple of
+        coordinates of the image.
+        """
+        if domain not in self._roots:
+            self._roots[domain] = _TrieNode()
+        node = self._roots[domain]
+        for letter in reversed(word):
+            if letter not in node.children:
+                node.children[letter] = _TrieNode(node, letter)
+            node = node.children[letter]
+        key = (id(node), coordinates)
+        if key in self._entries:
+            return
+        # The node is stored with the entry to keep it alive while the
+        # entry exists, so that its id is not reused.
+        size = self._entry_size(image)
+        self._entries[key] = (node, image, size)
+        node.num_entries += 1
+        self._memory += size
+        while self._memory > self._max_memory and len(self._entries) > 1:
+            self._evict()
+
+    def _evict(self):
+        """Discard the least recently used entry."""
+        key, (node, image, size) = self._entries.popitem(last=False)
+        self._memory -= size
+        node.num_entries -= 1
+        while node.parent is not None and node.num_entries == 0 and \
+                len(node.children) == 0:
+            del node.parent.children[node.letter]
+            node = node.parent
+
+    def statistics(self):
+        """Return the number of hits and misses of :meth:`lookup`, the hit
+        rate, the number of cached images and their estimated memory.
+
+        EXAMPLES::
+
+            >>> from macaw.image_cache import ImageCache
+            >>> cache = ImageCache(max_memory=1000)
+            >>> cache.insert('p', ['x'], (1, 2), (3, 4))
+            >>> cache.lookup('p', ['x'], (1, 2))
+            (1, (3, 4))
+            >>> stats = cache.statistics()
+            >>> stats['hit_rate'], stats['entries']
+            (1.0, 1)
+
+        """
+        num_lookups = self._hits + self._misses
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / num_lookups
+                if num_lookups > 0 else 0.0,
+                'entries': len(self._entries),
+                'memory': self._memory}
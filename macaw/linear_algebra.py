@@ -0,0 +1,351 @@
+r"""
+Exact linear algebra over the integers.
+
+The computations use Python integers, so the results are exact even when
+the entries of the matrices are too large for floating point numbers.
+
+"""
+
+
+import numpy as np
+
+
+def characteristic_polynomial(matrix):
+    """Return the characteristic polynomial of a square integer matrix.
+
+    The polynomial is computed by Berkowitz's algorithm which does not use
+    division, so every intermediate result is an integer.
+
+    INPUT:
+
+    - ``matrix`` -- a square matrix given as a list of rows or a numpy array
+
+    OUTPUT:
+
+    The list of coefficients of ``det(x*I - matrix)``, starting with the
+    leading coefficient 1.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import characteristic_polynomial
+        >>> characteristic_polynomial([[2, 1], [1, 1]])
+        [1, -3, 1]
+        >>> characteristic_polynomial([[1, 2, 0], [0, 1, 3], [4, 0, 1]])
+        [1, -3, 3, -25]
+        >>> characteristic_polynomial([])
+        [1]
+
+    """
+    a = [[int(x) for x in row] for row in matrix]
+    n = len(a)
+    poly = [1]
+    for r in range(n):
+        # The Toeplitz column for the leading (r+1)x(r+1) submatrix.
+        col = [a[i][r] for i in range(r)]
+        row = a[r][:r]
+        toeplitz = [1, -a[r][r]]
+        for k in range(r):
+            toeplitz.append(-sum(row[i] * col[i] for i in range(r)))
+            col = [sum(a[i][j] * col[j] for j in range(r)) for i in range(r)]
+        poly = [sum(toeplitz[i - j] * poly[j]
+                    for j in range(min(i + 1, len(poly))))
+                for i in range(r + 2)]
+    return poly
+
+
+def matrix_power(matrix, k):
+    """Return a nonnegative power of a square integer matrix.
+
+    The power is computed by repeated squaring with Python integers.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import matrix_power
+        >>> matrix_power([[1, 1], [1, 0]], 10)
+        [[89, 55], [55, 34]]
+        >>> matrix_power([[1, 1], [1, 0]], 0)
+        [[1, 0], [0, 1]]
+
+    """
+    if k < 0:
+        raise ValueError("Negative powers are not supported.")
+    square = np.array([[int(x) for x in row] for row in matrix],
+                      dtype=object)
+    n = len(square)
+    power = np.identity(n, dtype=np.int64).astype(object)
+    while k > 0:
+        if k % 2 == 1:
+            power = power.dot(square)
+        square = square.dot(square)
+        k //= 2
+    return [[int(x) for x in row] for row in power]
+
+
+def _poly_divmod(num, den):
+    """Divide two polynomials with rational coefficients."""
+    from fractions import Fraction
+    num = [Fraction(x) for x in num]
+    quotient = []
+    while len(num) >= len(den):
+        c = num[0] / den[0]
+        quotient.append(c)
+        for i in range(len(den)):
+            num[i] -= c * den[i]
+        num.pop(0)
+    while len(num) > 0 and num[0] == 0:
+        num.pop(0)
+    return quotient, num
+
+
+def _primitive_part(poly):
+    """Scale a rational polynomial to a primitive integer polynomial with
+    positive leading coefficient."""
+    from fractions import Fraction, gcd
+    poly = [Fraction(x) for x in poly]
+    denom = 1
+    for x in poly:
+        denom = denom * x.denominator // gcd(denom, x.denominator)
+    ints = [int(x * denom) for x in poly]
+    g = 0
+    for x in ints:
+        g = gcd(g, x)
+    g = abs(g)
+    if ints[0] < 0:
+        g = -g
+    return [x // g for x in ints]
+
+
+def squarefree_part(poly):
+    """Return the product of the distinct irreducible factors of an integer
+    polynomial, as a primitive integer polynomial.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import squarefree_part
+        >>> squarefree_part([1, -4, 5, -2])  # (x-1)^2 (x-2)
+        [1, -3, 2]
+        >>> squarefree_part([1, -3, 1])
+        [1, -3, 1]
+
+    """
+    n = len(poly) - 1
+    derivative = [(n - i) * poly[i] for i in range(n)]
+    a, b = list(poly), derivative
+    while len(b) > 0:
+        a, b = b, _poly_divmod(a, b)[1]
+    if len(a) == 1:
+        return _primitive_part(poly)
+    return _primitive_part(_poly_divmod(poly, a)[0])
+
+
+def cyclotomic_polynomial(n):
+    """Return the coefficients of the ``n``-th cyclotomic polynomial.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import cyclotomic_polynomial
+        >>> cyclotomic_polynomial(1)
+        [1, -1]
+        >>> cyclotomic_polynomial(6)
+        [1, -1, 1]
+        >>> cyclotomic_polynomial(12)
+        [1, 0, -1, 0, 1]
+
+    """
+    poly = [1] + [0] * (n - 1) + [-1]
+    for d in range(1, n):
+        if n % d == 0:
+            poly = _poly_divmod(poly, cyclotomic_polynomial(d))[0]
+    return [int(x) for x in poly]
+
+
+def cyclotomic_factorization(poly):
+    """Factor a product of cyclotomic polynomials.
+
+    OUTPUT:
+
+    The sorted list of pairs ``(n, e)`` such that ``poly`` is the product
+    of the ``n``-th cyclotomic polynomials raised to the power ``e``.
+    A ValueError is raised if ``poly`` is not such a product.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import cyclotomic_factorization
+        >>> cyclotomic_factorization([1, -2, 2, -2, 1])  # (x^2+1) (x-1)^2
+        [(1, 2), (4, 1)]
+        >>> cyclotomic_factorization([1, -3, 1])
+        Traceback (most recent call last):
+        ...
+        ValueError: The polynomial is not a product of cyclotomic polynomials.
+
+    """
+    poly = [int(x) for x in poly]
+    degree = len(poly) - 1
+    factors = []
+    # Euler's phi function satisfies phi(n) >= sqrt(n/2).
+    for n in range(1, 2 * degree**2 + 1):
+        if len(poly) == 1:
+            break
+        phi = cyclotomic_polynomial(n)
+        if len(phi) > len(poly):
+            continue
+        e = 0
+        while len(poly) >= len(phi):
+            quotient, remainder = _poly_divmod(poly, phi)
+            if len(remainder) > 0:
+                break
+            poly = [int(x) for x in quotient]
+            e += 1
+        if e > 0:
+            factors.append((n, e))
+    if poly != [1]:
+        raise ValueError("The polynomial is not a product of cyclotomic "
+                         "polynomials.")
+    return factors
+
+
+def _root_groups(roots):
+    """Group the roots of a real polynomial into real roots and pairs of
+    complex conjugate roots."""
+    groups = []
+    remaining = list(roots)
+    while len(remaining) > 0:
+        r = remaining.pop(0)
+        if abs(r.imag) < 1e-9 * max(1, abs(r)):
+            groups.append([r])
+        else:
+            j = min(range(len(remaining)),
+                    key=lambda k: abs(remaining[k] - r.conjugate()))
+            groups.append([r, remaining.pop(j)])
+    return groups
+
+
+def irreducible_factor(poly, root, max_num_candidates=2**16):
+    """Return the irreducible factor of an integer polynomial that vanishes
+    on a real root.
+
+    The factor is found by multiplying out the linear factors of the root
+    and of sets of other roots (closed under complex conjugation) in the
+    order of increasing degree, and checking by exact division if the
+    rounded product divides the polynomial. The first such factor has the
+    smallest degree, so it is irreducible.
+
+    INPUT:
+
+    - ``poly`` -- the list of integer coefficients, starting with the
+      leading coefficient
+
+    - ``root`` -- an approximation of the root
+
+    - ``max_num_candidates`` -- if there are more candidate factors than
+      this, the squarefree part of ``poly`` is returned instead
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import irreducible_factor
+        >>> irreducible_factor([1, -4, 4, -1], 2.6)  # (x-1) (x^2-3x+1)
+        [1, -3, 1]
+        >>> irreducible_factor([1, -4, 4, -1], 1)
+        [1, -1]
+        >>> irreducible_factor([1, 0, -4, 0, 2], 1.8)  # irreducible
+        [1, 0, -4, 0, 2]
+
+    """
+    from itertools import combinations
+    poly = squarefree_part(poly)
+    roots = list(np.roots([float(c) for c in poly]))
+    idx = min(range(len(roots)), key=lambda k: abs(roots[k] - root))
+    own = roots.pop(idx)
+    groups = _root_groups(roots)
+    if 2**len(groups) > max_num_candidates:
+        return poly
+
+    candidates = []
+    for k in range(len(groups) + 1):
+        for subset in combinations(groups, k):
+            candidates.append((sum(len(g) for g in subset), subset))
+    candidates.sort(key=lambda x: x[0])
+    for degree, subset in candidates:
+        factor_roots = [own] + [r for g in subset for r in g]
+        coeffs = np.poly(factor_roots).real
+        rounded = [int(round(c)) for c in coeffs]
+        if max(abs(c - r) for c, r in zip(coeffs, rounded)) > \
+           1e-6 * max(1, max(abs(c) for c in coeffs)):
+            continue
+        if len(_poly_divmod(poly, rounded)[1]) == 0:
+            return rounded
+    return poly
+
+
+class AlgebraicNumber(object):
+    """A real algebraic number.
+
+    The number is represented by its minimal polynomial over the integers
+    and an approximation which distinguishes it from the other real roots of
+    the polynomial.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import AlgebraicNumber
+        >>> x = AlgebraicNumber([1, -4, 4, -1], 2.6)
+        >>> x
+        Root of x^2 - 3*x + 1 near 2.618034
+        >>> round(float(x), 6)
+        2.618034
+        >>> x.polynomial()
+        [1, -3, 1]
+
+    """
+    def __init__(self, polynomial, approximation):
+        self._polynomial = irreducible_factor(polynomial, approximation)
+        roots = np.roots([float(c) for c in self._polynomial])
+        real_roots = [r.real for r in roots if abs(r.imag) < 1e-7]
+        self._approximation = min(real_roots,
+                                  key=lambda r: abs(r - approximation))
+
+    def polynomial(self):
+        """Return the coefficients of the minimal polynomial, starting with
+        the leading coefficient."""
+        return list(self._polynomial)
+
+    def __float__(self):
+        return float(self._approximation)
+
+    def __repr__(self):
+        n = len(self._polynomial) - 1
+        terms = []
+        for i, c in enumerate(self._polynomial):
+            if c == 0:
+                continue
+            deg = n - i
+            sign = '-' if c < 0 else '+'
+            c = abs(c)
+            if deg == 0:
+                mono = str(c)
+            else:
+                mono = 'x' if deg == 1 else 'x^%d' % deg
+                if c != 1:
+                    mono = '%d*%s' % (c, mono)
+            terms.append((sign, mono))
+        s = ('-' if terms[0][0] == '-' else '') + terms[0][1]
+        for sign, mono in terms[1:]:
+            s += ' %s %s' % (sign, mono)
+        return 'Root of %s near %f' % (s, self._approximation)
+
+
+def perron_frobenius_eigenvalue(matrix):
+    """Return the Perron-Frobenius eigenvalue of a nonnegative integer
+    matrix as an AlgebraicNumber.
+
+    EXAMPLES::
+
+        >>> from macaw.linear_algebra import perron_frobenius_eigenvalue
+        >>> perron_frobenius_eigenvalue([[2, 1], [1, 1]])
+        Root of x^2 - 3*x + 1 near 2.618034
+        >>> perron_frobenius_eigenvalue([[1, 1, 0], [0, 1, 1], [1, 0, 0]])
+        Root of x^3 - 2*x^2 + x - 1 near 1.754878
+
+    """
+    poly = characteristic_polynomial(matrix)
+    roots = np.roots([float(c) for c in poly])
+    return AlgebraicNumber(poly, max(abs(r) for r in roots))
@@ -0,0 +1,184 @@
+r"""
+Operation counters and timers for the train track primitives.
+
+Inside a :func:`collect` block, the calls of the primitives (peeling,
+folding, regluing endpoints, reallocating buffers, elementary moves,
+twists and constructing laminations) are counted and timed, and the
+measures too large for an int64 are counted. The primitives are wrapped
+only while a block is active: outside of it the original methods are in
+place, so disabled metrics cost nothing.
+
+The times are inclusive: e.g. the time of the peels during a second
+elementary move is counted for both ``peel`` and ``second_move``.
+
+The ``twist`` category counts the twists applied to laminations (e.g. one
+per twist of the compiled word of a mapping class), not the twists done
+by the train track internally during the first elementary moves.
+
+EXAMPLES::
+
+    >>> from macaw import metrics
+    >>> from macaw.generating_sets import map_from_list
+    >>> from macaw.pants_lamination import PantsLamination
+    >>> f = map_from_list(2, [1, 2, 3, 4])
+    >>> p = f._pants_decomposition
+    >>> with metrics.collect() as m:
+    ...     lam = f * PantsLamination(p, [2, 1, 2, 1, 2, 1])
+    >>> m.counts['lamination'], m.counts['twist']
+    (1, 4)
+    >>> m.counts['first_move'] > 0 and m.times['first_move'] > 0
+    True
+    >>> print(m.report())  # doctest: +ELLIPSIS
+    category             calls   time (s)
+    ...
+
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_INT64_MAX = 2**63 - 1
+
+
+def _is_lamination(self, pants_decomposition, *args, **kwds):
+    # PantsLamination.copy() creates an empty object first.
+    return pants_decomposition is not None
+
+
+def _is_bignum(self, branch, new_measure):
+    return abs(new_measure) > _INT64_MAX
+
+
+# The instrumented methods as tuples (module, class, method, category,
+# timed, predicate). If the predicate is not None, only the calls for
+# which it returns True are recorded.
+_PRIMITIVES = [
+    ('macaw.train_tracks.train_track', 'TrainTrack', 'peel',
+     'peel', True, None),
+    ('macaw.train_tracks.train_track', 'TrainTrack', 'fold',
+     'fold', True, None),
+    ('macaw.train_tracks.train_track0', 'TrainTrack', 'reglue_endpoint',
+     'reglue_endpoint', True, None),
+    ('macaw.train_tracks.train_track0', 'TrainTrack',
+     '_allocate_more_branches', 'reallocation', True, None),
+    ('macaw.train_tracks.train_track0', 'TrainTrack',
+     '_allocate_more_switches', 'reallocation', True, None),
+    ('macaw.train_tracks.train_track0', 'TrainTrack',
+     '_allocate_more_outgoing_branches', 'reallocation', True, None),
+    ('macaw.train_tracks.train_track0', 'TrainTrack', '_set_measure',
+     'bignum', False, _is_bignum),
+    ('macaw.train_tracks.dehn_thurston.dehn_thurston_tt', 'DehnThurstonTT',
+     'unzip_fold_first_move', 'first_move', True, None),
+    ('macaw.train_tracks.dehn_thurston.dehn_thurston_tt', 'DehnThurstonTT',
+     'unzip_fold_second_move', 'second_move', True, None),
+    ('macaw.pants_lamination', 'PantsLamination', 'apply_twist',
+     'twist', True, None),
+    ('macaw.pants_lamination', 'PantsLamination', '__init__',
+     'lamination', True, _is_lamination),
+]
+
+CATEGORIES = ['peel', 'fold', 'reglue_endpoint', 'reallocation', 'bignum',
+              'first_move', 'second_move', 'twist', 'lamination']
+
+# The Metrics of the active collect() blocks.
+_active = []
+
+# The original methods, while they are wrapped.
+_originals = []
+
+
+class Metrics(object):
+    """The counts and cumulative times of the primitives.
+
+    ``counts`` and ``times`` are dictionaries keyed by the elements of
+    CATEGORIES. Times are in seconds.
+    """
+    def __init__(self):
+        self.counts = dict((category, 0) for category in CATEGORIES)
+        self.times = dict((category, 0.0) for category in CATEGORIES)
+
+    def _add(self, category, elapsed):
+        self.counts[category] += 1
+        self.times[category] += elapsed
+
+    def as_dict(self):
+        """Return the counts and times as a dictionary of pairs."""
+        return dict((category, (self.counts[category],
+                                self.times[category]))
+                    for category in CATEGORIES)
+
+    def report(self):
+        """Return a table of the counts and times."""
+        lines = ['%-16s %9s %10s' % ('category', 'calls', 'time (s)')]
+        for category in CATEGORIES:
+            lines.append('%-16s %9d %10.6f' % (category,
+                                               self.counts[category],
+                                               self.times[category]))
+        return '\n'.join(lines)
+
+
+def _wrap(function, category, timed, predicate):
+    """Return a wrapper of a method recording its calls."""
+    if timed:
+        @functools.wraps(function)
+        def wrapper(*args, **kwds):
+            if predicate is not None and not predicate(*args, **kwds):
+                return function(*args, **kwds)
+            start = _clock()
+            try:
+                return function(*args, **kwds)
+            finally:
+                elapsed = _clock() - start
+                for metrics in _active:
+                    metrics._add(category, elapsed)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwds):
+            if predicate is None or predicate(*args, **kwds):
+                for metrics in _active:
+                    metrics._add(category, 0.0)
+            return function(*args, **kwds)
+    return wrapper
+
+
+def _install():
+    for module_name, class_name, method, category, timed, predicate in \
+            _PRIMITIVES:
+        cls = getattr(import_module(module_name), class_name)
+        original = cls.__dict__[method]
+        _originals.append((cls, method, original))
+        setattr(cls, method, _wrap(original, category, timed, predicate))
+
+
+def _uninstall():
+    while _originals:
+        cls, method, original = _originals.pop()
+        setattr(cls, method, original)
+
+
+def is_enabled():
+    """Decide if a collect() block is active."""
+    return len(_active) > 0
+
+
+@contextmanager
+def collect():
+    """Count and time the primitives in a block.
+
+    The block yields a :class:`Metrics`, which is filled in while the block
+    runs. Blocks can be nested; each block records the calls made in it.
+    """
+    metrics = Metrics()
+    if not _active:
+        _install()
+    _active.append(metrics)
+    try:
+        yield metrics
+    finally:
+        _active.remove(metrics)
+        if not _active:
+            _uninstall()
@@ -24,9 +24,12 @@ EXAMPLES::
 #                  http://www.gnu.org/licenses/
 # *****************************************************************************
 
-import networkx as nx
+from collections import deque
 from .surface import Surface
 from .constants import LEFT, RIGHT
+from . import serialization
+from .serialization import PANTS_DECOMPOSITION, write_header, read_header, \
+    check_end, write_uint, write_int, read_uint, read_int
 
 PANT = 0
 BDY_IDX = 1
@@ -226,28 +229,79 @@ class PantsDecomposition(Surface):
         for pant in range(self.num_pants()):
             # curves = self.adjacent_curves(pant)
             edge_ls.extend([(pant, (pant, i), 0) for i in range(3)])
+        import networkx as nx
         graph = nx.Graph()
         graph.add_weighted_edges_from(edge_ls)
         return graph
 
+    def _pants_adjacency(self):
+        """Return the adjacency lists of the pants.
+
+        For each pair of pants, the list contains a pair ``(pant, label)``
+        for each inner pants curve on its boundary, where ``pant`` is the
+        pair of pants on the other side and ``label`` is 1 if the gluing
+        is orientation-reversing and 0 otherwise (as the labels of the
+        edges of dual_graph()).
+        """
+        adjacency = [[] for i in range(self.num_pants())]
+        for c in self.inner_pants_curves():
+            left, right = self.adjacent_pants(c)
+            if len(left) == 1:
+                pant1, pant2, label = left[0][0], right[0][0], 0
+            elif len(left) == 2:
+                pant1, pant2, label = left[0][0], left[1][0], 1
+            else:
+                pant1, pant2, label = right[0][0], right[1][0], 1
+            adjacency[pant1].append((pant2, label))
+            adjacency[pant2].append((pant1, label))
+        return adjacency
+
     def _compute_orientable(self):
         """Decide if the surface is orientable.
+
+        The pairs of pants are oriented one by one by a breadth-first search
+        in the dual graph. The surface is orientable if the orientations
+        are consistent along every inner pants curve.
         """
-        G = self.dual_graph()
-        for cycle in nx.cycle_basis(G):
-            total = 0
-            for i in range(len(cycle)):
-                node = cycle[i]
-                node2 = cycle[(i+1) % len(cycle)]
-                total += G.get_edge_data(node, node2)['weight']
-            if total % 2 == 1:
-                return False
+        adjacency = self._pants_adjacency()
+        orientation = {}
+        for start in range(len(adjacency)):
+            if start in orientation:
+                continue
+            orientation[start] = 0
+            queue = deque([start])
+            while len(queue) > 0:
+                pant = queue.popleft()
+                for neighbor, label in adjacency[pant]:
+                    expected = orientation[pant] ^ label
+                    if neighbor not in orientation:
+                        orientation[neighbor] = expected
+                        queue.append(neighbor)
+                    elif orientation[neighbor] != expected:
+                        return False
         return True
 
     def is_connected(self):
         """Decide if the surface is connected.
+
+        EXAMPLES::
+
+            >>> from macaw import PantsDecomposition
+            >>> PantsDecomposition([[1, 2, 3], [-3, -2, -1]]).is_connected()
+            True
+            >>> PantsDecomposition([[1, 2, 3], [-1, 4, 5]]).is_connected()
+            True
+
         """
-        return nx.is_connected(self.dual_graph())
+        adjacency = self._pants_adjacency()
+        visited = {0}
+        queue = deque([0])
+        while len(queue) > 0:
+            for neighbor, label in adjacency[queue.popleft()]:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+        return len(visited) == len(adjacency)
 
     def homology_basis(self):
         """Compute a homology basis for the surface.
@@ -267,14 +321,135 @@ class PantsDecomposition(Surface):
         For punctured surfaces, we also follow the above process, but we don't
         get enough generators. We fix this by adding in a generator for all but
         one boundary components of the surface.
+
+        OUTPUT:
+
+        A tuple ``(curves, cycles)``. The list ``curves`` contains the pants
+        curves in the basis: the inner pants curves not in the spanning tree
+        (in increasing order), followed by all but the last boundary pants
+        curves. The list ``cycles`` contains a cycle for each inner pants
+        curve not in the spanning tree, in the same order. A cycle is
+        encoded by the list of pants curves it crosses, in order. A positive
+        curve is crossed from its left to its right, a negative curve from
+        its right to its left. The first curve of each cycle is the
+        corresponding curve not in the spanning tree.
+
+        The spanning tree is found by a breadth-first search from pants 0,
+        so the basis only depends on the gluing list.
+
+        EXAMPLES::
+
+            >>> from macaw import PantsDecomposition
+            >>> p = PantsDecomposition.humphries(3)
+            >>> p
+            Pants decomposition with gluing list [[1, 2, -1], [4, 3, -2], [-3, -4, 5], [-6, -5, 6]]
+            >>> p.homology_basis()
+            ([1, 4, 6], [[1], [4, -3], [6]])
+
+            >>> p = PantsDecomposition([[1, 2, 3], [-3, 4, 5]])
+            >>> p.homology_basis()
+            ([1, 2, 4], [])
+
         """
-        # assert self.homology_dimension() = size of the basis constructed
-        pass
+        if not self.is_orientable():
+            raise NotImplementedError("Homology bases are only implemented "
+                                      "for orientable surfaces.")
+        curves = self.inner_pants_curves()
+        ends = {}
+        for c in curves:
+            left, right = self.adjacent_pants(c)
+            ends[c] = (left[0][PANT], right[0][PANT])
+
+        # For each pants, the pants curve crossed towards the root of the
+        # spanning tree, with the sign of the crossing.
+        to_parent = {0: None}
+        queue = deque([0])
+        tree = set()
+        while len(queue) > 0:
+            pant = queue.popleft()
+            for c in curves:
+                left, right = ends[c]
+                for start, end, crossing in [(left, right, -c),
+                                             (right, left, c)]:
+                    if start == pant and end not in to_parent:
+                        to_parent[end] = crossing
+                        queue.append(end)
+                        tree.add(c)
+
+        def path_to_root(pant):
+            path = []
+            while to_parent[pant] is not None:
+                crossing = to_parent[pant]
+                path.append(crossing)
+                pant = ends[abs(crossing)][LEFT if crossing < 0 else RIGHT]
+            return path
+
+        basis_curves = [c for c in curves if c not in tree]
+        cycles = []
+        for c in basis_curves:
+            left, right = ends[c]
+            # crossing c, then going back along the tree
+            up = path_to_root(right)
+            down = [-x for x in reversed(path_to_root(left))]
+            while len(up) > 0 and len(down) > 0 and up[-1] == -down[0]:
+                up.pop()
+                down.pop(0)
+            cycles.append([c] + up + down)
+        return basis_curves + self.boundary_pants_curves()[:-1], cycles
 
     def __repr__(self):
         return 'Pants decomposition with gluing list ' + repr(self._gluing_list)
         # return 'Pants decomposition of the ' + super(PantsDecomposition, self).__repr__().lower()
 
+    def _write(self, buf):
+        write_uint(buf, len(self._gluing_list))
+        for pant in self._gluing_list:
+            for bdy in pant:
+                write_int(buf, bdy)
+
+    @classmethod
+    def _read(cls, data, pos):
+        num_pants, pos = read_uint(data, pos)
+        gluing_list = []
+        for i in range(num_pants):
+            pant = []
+            for j in range(3):
+                bdy, pos = read_int(data, pos)
+                pant.append(bdy)
+            gluing_list.append(pant)
+        return cls(gluing_list), pos
+
+    def to_bytes(self):
+        """Return a compact binary encoding of the pants decomposition.
+
+        EXAMPLES::
+
+            >>> from macaw.pants_decomposition import PantsDecomposition
+            >>> p = PantsDecomposition.humphries(3)
+            >>> q = PantsDecomposition.from_bytes(p.to_bytes())
+            >>> q._gluing_list == p._gluing_list
+            True
+            >>> len(p.to_bytes())
+            15
+
+        """
+        buf = bytearray()
+        write_header(buf, PANTS_DECOMPOSITION)
+        self._write(buf)
+        return bytes(buf)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a pants decomposition from the output of :meth:`to_bytes`.
+        """
+        data, pos = read_header(data, PANTS_DECOMPOSITION)
+        p, pos = cls._read(data, pos)
+        check_end(data, pos)
+        return p
+
+    def __reduce__(self):
+        return (serialization.from_bytes, (self.to_bytes(),))
+
     def bdy_index_left_of_pants_curve(self, pants_curve):
         """
         EXAMPLES:
@@ -23,6 +23,9 @@ AUTHORS:
 import numpy as np
 from .train_tracks.dehn_thurston.dehn_thurston_tt import DehnThurstonTT
 from .constants import LEFT, RIGHT
+from . import serialization, tracing
+from .serialization import PANTS_LAMINATION, write_header, read_header, \
+    check_end
 from bisect import insort
 
 
@@ -36,7 +39,7 @@ class MeasuredLamination(object):
 
 
 class PantsLamination(object):
-    def __init__(self, pants_decomposition, coordinates, debug=False):
+    def __init__(self, pants_decomposition, coordinates):
         """
         Pants laminations can be represented by a pants decomposition and a list of six
         coordinates for the pants decomposition. The pants decomposition is a pants
@@ -94,13 +97,6 @@ class PantsLamination(object):
             [0, 0, 0, 1, 0, 0, 0, 0, 0]
 
         """
-        if debug:
-            print "----------------------------------"
-            print "BEGIN: PantsLamination.__init__():"
-            print "----------------------------------"
-            print "Pants decomposition", pants_decomposition
-            print "Coordinates", coordinates
-
         if pants_decomposition is None:
             # creating empty object, just for the copy() method
             return
@@ -117,6 +113,50 @@ class PantsLamination(object):
         lam._tt = self._tt.copy()
         return lam
 
+    def to_bytes(self):
+        """Return a compact binary encoding of the lamination.
+
+        Only the train track is stored, with its measures written as
+        varints, so this is also a faster way of copying laminations to
+        other processes than pickling the buffers of the train track or
+        rebuilding it from the coordinates.
+
+        EXAMPLES::
+
+            >>> from macaw.pants_decomposition import PantsDecomposition
+            >>> from macaw.pants_lamination import PantsLamination
+            >>> p = PantsDecomposition([[-1, 1, 2], [-2, 3, -3]])
+            >>> lam = PantsLamination(p, [2, -2, 8, 1, 1, 1])
+            >>> lam2 = PantsLamination.from_bytes(lam.to_bytes())
+            >>> lam2 == lam
+            True
+            >>> lam2._tt.gluing_list() == lam._tt.gluing_list()
+            True
+
+        Pickling uses the same encoding::
+
+            >>> import pickle
+            >>> pickle.loads(pickle.dumps(lam)) == lam
+            True
+
+        """
+        buf = bytearray()
+        write_header(buf, PANTS_LAMINATION)
+        self._tt._write(buf)
+        return bytes(buf)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a lamination from the output of :meth:`to_bytes`."""
+        data, pos = read_header(data, PANTS_LAMINATION)
+        lam = cls(None, None)
+        lam._tt, pos = DehnThurstonTT._read(data, pos)
+        check_end(data, pos)
+        return lam
+
+    def __reduce__(self):
+        return (serialization.from_bytes, (self.to_bytes(),))
+
     def __repr__(self):
         return repr(self.to_vector())
 
@@ -152,13 +192,6 @@ class PantsLamination(object):
         coordinates calculated from the pants curve
 
         """
-        debug = False
-        if debug:
-            print "-------------------------"
-            print "BEGIN: from_pants_curve()"
-            print "-------------------------"
-            print "PantsDecomposition", pants_decomposition
-            print "Pants curve", pants_curve
         p = pants_decomposition
         l = []
         for c in p.inner_pants_curves():
@@ -170,13 +203,6 @@ class PantsLamination(object):
 
     @classmethod
     def from_transversal(cls, pants_decomposition, pants_curve):
-        debug = False
-        if debug:
-            print "-------------------------"
-            print "BEGIN: from_transversal()"
-            print "-------------------------"
-            print "PantsDecomposition", pants_decomposition
-            print "Pants curve", pants_curve
         p = pants_decomposition
         l = []
         typ = p.elementary_move_type(pants_curve)
@@ -244,26 +270,23 @@ class PantsLamination(object):
                 ls.append(-tt.branch_measure(b))
         return np.array(ls)
 
-    def apply_elementary_move(self, pants_curve, inverse=False, debug=False):
-        # print debug
+    def apply_elementary_move(self, pants_curve, inverse=False):
         tt = self._tt
-        if debug:
-            print "-------------------------------"
-            print "BEGIN: apply_elementary_move()"
-            print "-------------------------------"
-            print "Gluing list:", tt._gluing_list
-            print "Measure:", tt.measure()
-            print "pants_curve", pants_curve
         typ = tt.elem_move_type(pants_curve)
-        if debug:
-            print "Type: ", typ
         if typ == 1:
-            tt.unzip_fold_first_move(pants_curve, inverse=inverse, debug=debug)
+            tt.unzip_fold_first_move(pants_curve, inverse=inverse)
         elif typ == 2:
-            tt.unzip_fold_second_move(pants_curve, debug=debug)
+            tt.unzip_fold_second_move(pants_curve)
 
     def apply_twist(self, pants_curve, power=1):
-        self._tt.unzip_fold_pants_twist(pants_curve, power)
+        trace = tracing.active
+        if trace is not None:
+            trace.begin('twist', pants_curve=pants_curve, power=power)
+        try:
+            self._tt.unzip_fold_pants_twist(pants_curve, power)
+        finally:
+            if trace is not None:
+                trace.end()
 
     def apply_twist_copy(self, pants_curve, power=1):
         lam = self.copy()
@@ -304,9 +327,9 @@ class PantsLamination(object):
         return tt
 
     # returns a copy of the lamination with apply_elementary_move applied to it
-    def get_elementary_move(self, pants_curve, inverse=False, debug=False):
+    def get_elementary_move(self, pants_curve, inverse=False):
         tt = self.copy()
-        tt.apply_elementary_move(pants_curve, inverse, debug)
+        tt.apply_elementary_move(pants_curve, inverse)
         return tt
 
     # recursive function that returns a copy of the lamination whose cost is
@@ -20,9 +20,28 @@ AUTHORS:
 # *****************************************************************************
 
 
+import json
+from fractions import gcd
+from math import log
+from operator import truediv
 import numpy as np
+from . import serialization, tracing
+from .pants_decomposition import PantsDecomposition
 from .pants_lamination import PantsLamination
 from .mapping_class import MappingClass
+from .train_tracks.train_track import TrainTrack
+from .train_tracks.splitting import find_periodic_splitting_sequence, \
+    positive_subtrack
+from .linear_algebra import perron_frobenius_eigenvalue, \
+    characteristic_polynomial
+from .homology import HomologyAction, pants_homology
+from .constants import PERIODIC, REDUCIBLE, PSEUDO_ANOSOV
+from .serialization import PANTS_MAPPING_CLASS, write_header, read_header, \
+    check_end, write_uint, write_int, write_ints, read_uint, read_int, \
+    read_ints
+
+MOVE = 'move'
+TWIST = 'twist'
 
 
 class PantsTwist(object):
@@ -54,22 +73,322 @@ class PantsTwist(object):
     def inverse(self):
         return PantsTwist(self.elementary_moves, self.pants_curve, -self.power)
 
+    def curve_key(self):
+        """Return a key identifying the twisting curve.
+
+        The twisting curve is the pants curve ``pants_curve`` of the pants
+        decomposition obtained by the elementary moves. Elementary moves
+        after the last move about ``pants_curve`` do not change this curve,
+        so they are dropped.
+
+        OUTPUT:
+
+        A tuple ``(moves, pants_curve)``, where ``moves`` is the tuple of
+        the elementary moves that are not dropped.
+
+        EXAMPLES::
+
+            >>> from macaw.pants_mapping_class import PantsTwist
+            >>> PantsTwist([3, 4], 4).curve_key()
+            ((3, 4), 4)
+            >>> PantsTwist([3, 4], 3).curve_key()
+            ((3,), 3)
+            >>> PantsTwist([3, 4], 1).curve_key()
+            ((), 1)
+
+        """
+        moves = self.elementary_moves
+        if self.pants_curve not in moves:
+            return (), self.pants_curve
+        last = len(moves) - 1 - moves[::-1].index(self.pants_curve)
+        return tuple(moves[:last+1]), self.pants_curve
+
+
+def _pants_touched(pants_decomposition, moves):
+    """Return the set of pants adjacent to the curves of elementary moves."""
+    touched = set()
+    for curve in moves:
+        for side in pants_decomposition.adjacent_pants(curve):
+            for pant, bdy_index in side:
+                touched.add(pant)
+    return touched
+
+
+def twists_commute(key1, key2, pants_decomposition=None):
+    """Decide if the twists about two curves commute, using only that the
+    curves of a pants decomposition are disjoint.
+
+    The curves are given by :meth:`PantsTwist.curve_key`. Two curves are
+    known to be disjoint if they are pants curves of the same pants
+    decomposition, which is the case if they are obtained by the same
+    elementary moves, or if one of them is a curve of the original pants
+    decomposition that is not changed by the elementary moves of the other.
+    If the pants decomposition is given, the curves are also disjoint if
+    the elementary moves take place in disjoint sets of pants, since then
+    the moves can be done independently. If ``False`` is returned, the
+    twists may still commute.
+
+    EXAMPLES::
+
+        >>> from macaw.pants_mapping_class import twists_commute
+        >>> twists_commute(((), 1), ((), 3))
+        True
+        >>> twists_commute(((3, 4), 4), ((), 1))
+        True
+        >>> twists_commute(((3, 4), 4), ((), 3))
+        False
+
+        >>> from macaw import PantsDecomposition
+        >>> p = PantsDecomposition.humphries(3)
+        >>> twists_commute(((2,), 2), ((6,), 6))
+        False
+        >>> twists_commute(((2,), 2), ((6,), 6), p)
+        True
+
+    """
+    moves1, curve1 = key1
+    moves2, curve2 = key2
+    if moves1 == moves2:
+        return True
+    if len(moves2) == 0 and curve2 not in moves1:
+        return True
+    if len(moves1) == 0 and curve1 not in moves2:
+        return True
+    if pants_decomposition is not None and len(moves1) > 0 and \
+       len(moves2) > 0:
+        return _pants_touched(pants_decomposition, moves1).isdisjoint(
+            _pants_touched(pants_decomposition, moves2))
+    return False
+
+
+def normalize_twists(pants_twists, pants_decomposition=None):
+    """Return a shorter word of twists representing the same mapping class.
+
+    Twists about curves known to be disjoint (see :func:`twists_commute`)
+    are commuted so that neighbouring twists about disjoint curves are
+    ordered by their curve keys, twists about the same curve are merged
+    into one twist with the sum of the powers, and twists with power zero
+    are removed. This is repeated until the word does not get shorter.
+
+    INPUT:
+
+    - ``pants_twists`` -- a list of PantsTwists
+
+    - ``pants_decomposition`` -- (default: None) the pants decomposition of
+      the twists. If given, more pairs of twists are known to commute.
+
+    EXAMPLES::
+
+        >>> from macaw.pants_mapping_class import PantsTwist, normalize_twists
+        >>> twists = [PantsTwist([], 3), PantsTwist([], 1),
+        ...           PantsTwist([], 3, -1), PantsTwist([1], 1),
+        ...           PantsTwist([1], 1, 2)]
+        >>> [(t.elementary_moves, t.pants_curve, t.power)
+        ...  for t in normalize_twists(twists)]
+        [([], 1, 1), ([1], 1, 3)]
+
+    """
+    word = [(t.curve_key(), t.power) for t in pants_twists]
+    while True:
+        new_word = []
+        for key, power in word:
+            # Moving the letter to the left past the letters commuting with
+            # it, looking for a letter to merge with.
+            i = len(new_word)
+            while i > 0 and new_word[i-1][0] != key and \
+                    twists_commute(new_word[i-1][0], key,
+                                   pants_decomposition):
+                i -= 1
+            if i > 0 and new_word[i-1][0] == key:
+                power += new_word[i-1][1]
+                if power == 0:
+                    del new_word[i-1]
+                else:
+                    new_word[i-1] = (key, power)
+                continue
+            j = len(new_word)
+            while j > i and new_word[j-1][0] > key:
+                j -= 1
+            new_word.insert(j, (key, power))
+        if len(new_word) == len(word):
+            break
+        word = new_word
+    return [PantsTwist(list(key[0]), key[1], power)
+            for key, power in new_word]
+
+
+def compile_twists(pants_twists):
+    """Return the sequence of elementary moves and twists applied to a
+    lamination by a word of twists.
+
+    The twists are applied from right to left. Each twist is applied by
+    doing its elementary moves, twisting and undoing the elementary moves.
+    An elementary move undone right before the same move is done again
+    cancels, and consecutive twists about the same curve are merged.
+
+    OUTPUT:
+
+    A list of tuples ``(MOVE, pants_curve, inverse)`` and ``(TWIST,
+    pants_curve, power)``.
+
+    EXAMPLES::
+
+        >>> from macaw.pants_mapping_class import PantsTwist, compile_twists
+        >>> compile_twists([PantsTwist([3, 4], 4), PantsTwist([3, 4], 4)])
+        [('move', 3, False), ('move', 4, False), ('twist', 4, 2), ('move', 4, True), ('move', 3, True)]
+        >>> compile_twists([PantsTwist([3], 3), PantsTwist([3, 4], 4)])
+        [('move', 3, False), ('move', 4, False), ('twist', 4, 1), ('move', 4, True), ('twist', 3, 1), ('move', 3, True)]
+
+    """
+    ops = []
+    for t in reversed(pants_twists):
+        for curve in t.elementary_moves:
+            _push_operation(ops, (MOVE, curve, False))
+        _push_operation(ops, (TWIST, t.pants_curve, t.power))
+        for curve in reversed(t.elementary_moves):
+            _push_operation(ops, (MOVE, curve, True))
+    return ops
+
+
+def _merge_operations(op1, op2):
+    """Return the operations doing ``op1`` and then ``op2`` as a list of at
+    most one operation, or None if they cannot be merged."""
+    typ, curve, x = op1
+    if typ != op2[0] or curve != op2[1]:
+        return None
+    if typ == MOVE:
+        return [] if x != op2[2] else None
+    return [(TWIST, curve, x + op2[2])] if x + op2[2] != 0 else []
+
+
+def _push_operation(ops, op):
+    """Append an operation to a list of operations, merging it with the
+    last one if possible.
+
+    OUTPUT:
+
+    True if the operation was merged with the last one, False otherwise.
+    """
+    merged = _merge_operations(ops[-1], op) if len(ops) > 0 else None
+    if merged is None:
+        ops.append(op)
+        return False
+    ops[-1:] = merged
+    return True
+
+
+def _apply_operations(lam, operations):
+    """Apply the output of :func:`compile_twists` to a lamination in place.
+    """
+    for typ, curve, x in operations:
+        if typ == MOVE:
+            lam.apply_elementary_move(curve, inverse=x)
+        else:
+            lam.apply_twist(curve, x)
+
+
+def _coordinate_key(lam):
+    """Return the coordinates of a lamination as a hashable tuple."""
+    return tuple(int(x) for x in lam.to_vector())
+
+
+def _size(lam):
+    """Return the sum of the absolute values of the coordinates."""
+    return float(sum(abs(int(x)) for x in lam.to_vector()))
+
 
 class PantsMappingClass(MappingClass):
+    # If an ImageCache is set here, the images of laminations under the
+    # suffixes of the words of twists are cached. See _apply_with_cache().
+    image_cache = None
+    # If a ResultCache is set here, the results of order(), stretch_factor()
+    # and homology_charpoly() are looked up in it before they are computed.
+    result_cache = None
+
     def __init__(self, pants_decomposition, pants_twists=[],
                  action_on_homology=None):
         self._pants_twists = pants_twists
         self._pants_decomposition = pants_decomposition
+        if action_on_homology is not None and \
+           not isinstance(action_on_homology, HomologyAction):
+            action_on_homology = HomologyAction.from_matrix(
+                action_on_homology)
         self._action_on_homology = action_on_homology
+        self._automatic_action = None
+        self._invariant_lamination_cache = None
+        self._normalized_twists = None
+        self._compiled_twists = None
 
     def _repr_(self):
         return "Mapping class; product of the twists " + \
             repr(self._pants_twists)
 
+    def to_bytes(self):
+        """Return a compact binary encoding of the mapping class.
+
+        The pants decomposition, the word of twists and the action on
+        homology (if it was specified) are stored, but not the data cached
+        by the computations.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import map_from_list
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> f = map_from_list(2, [1, 2, 3, 4])
+            >>> g = PantsMappingClass.from_bytes(f.to_bytes())
+            >>> g.order()
+            10
+            >>> (g.action_on_homology() == f.action_on_homology()).all()
+            True
+
+        Pickling uses the same encoding::
+
+            >>> import pickle
+            >>> pickle.loads(pickle.dumps(f)).to_bytes() == f.to_bytes()
+            True
+
+        """
+        buf = bytearray()
+        write_header(buf, PANTS_MAPPING_CLASS)
+        self._pants_decomposition._write(buf)
+        write_uint(buf, len(self._pants_twists))
+        for t in self._pants_twists:
+            write_ints(buf, t.elementary_moves)
+            write_int(buf, t.pants_curve)
+            write_int(buf, t.power)
+        if self._action_on_homology is None:
+            write_uint(buf, 0)
+        else:
+            write_uint(buf, 1)
+            self._action_on_homology._write(buf)
+        return bytes(buf)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a mapping class from the output of :meth:`to_bytes`."""
+        data, pos = read_header(data, PANTS_MAPPING_CLASS)
+        p, pos = PantsDecomposition._read(data, pos)
+        num_twists, pos = read_uint(data, pos)
+        twists = []
+        for i in range(num_twists):
+            moves, pos = read_ints(data, pos)
+            pants_curve, pos = read_int(data, pos)
+            power, pos = read_int(data, pos)
+            twists.append(PantsTwist(moves, pants_curve, power))
+        has_action, pos = read_uint(data, pos)
+        action = None
+        if has_action:
+            action, pos = HomologyAction._read(data, pos)
+        check_end(data, pos)
+        return cls(p, twists, action)
+
+    def __reduce__(self):
+        return (serialization.from_bytes, (self.to_bytes(),))
+
     @classmethod
     def identity(cls, pants_decomposition):
         p = pants_decomposition
-        return cls(p, np.identity(p.homology_dimension(), dtype=object))
+        return cls(p, [], HomologyAction.identity(p.homology_dimension()))
 
     def __mul__(self, other):
         if isinstance(other, PantsMappingClass):
@@ -79,68 +398,130 @@ class PantsMappingClass(MappingClass):
             #                      "corresponding to different pants "
             #                      "decompositions")
             p = self._pants_decomposition
+            # The actions on homology are only multiplied when the matrix is
+            # requested.
+            if self._action_on_homology is None or \
+               other._action_on_homology is None:
+                ah = None
+            else:
+                ah = self._action_on_homology * other._action_on_homology
             return PantsMappingClass(
                 p,
                 self._pants_twists + other._pants_twists,
-                self.action_on_homology() * other.action_on_homology()
+                ah
             )
 
         if isinstance(other, PantsLamination):
-            lam = other.copy()
-            # print type(other)
-            # print "Other", other
-            debug = False
-            if debug:
-                print "Mapping class:", self
-            # apply twists from right to left
-            for pants_twist in reversed(self._pants_twists):
-                if debug:
-                    print "Apply elementary moves..."
-                for curve in pants_twist.elementary_moves:
-                    if debug:
-                        print "Curve", lam
-                        # print "Other", other
-                    lam.apply_elementary_move(curve, debug=debug)
-                    # print other
-                if debug:
-                    print "Curve", lam
-                    # print lam._tt._gluing_list
-                    # print lam._tt._measure
-                    # print lam._tt._branch_endpoint
-                    # print lam._tt._pants_branches
-                    # print "Other", other
-                    # print other._tt._gluing_list
-                    # print other._tt._measure
-                    # print other._tt._branch_endpoint
-                    # print other._tt._pants_branches
-                    print "Applying twist..."
-                lam.apply_twist(pants_twist.pants_curve, pants_twist.power)
-                if debug:
-                    print "Curve", lam
-                    # print lam._tt._gluing_list
-                    # print lam._tt._measure
-                    # print lam._tt._branch_endpoint
-                    # print lam._tt._pants_branches
-                    # print "Other", other
-                    # print other._tt._gluing_list
-                    # print other._tt._measure
-                    # print other._tt._branch_endpoint
-                    # print other._tt._pants_branches
-                    print "Applying inverse elementary moves..."
-                for curve in reversed(pants_twist.elementary_moves):
-                    if debug:
-                        print "Curve", lam
-                        # print "Other", other
-                    lam.apply_elementary_move(curve, inverse=True, debug=debug)
-                    # print other
-            if debug:
-                print "FINAL curve:", lam
-                # print "Other", other
-                print "-------------------------"
+            self._normalize()
+            trace = tracing.active
+            if trace is not None:
+                trace.begin('apply_mapping_class',
+                            num_twists=len(self._normalized_twists),
+                            coordinates_before=other.to_vector())
+            lam = None
+            try:
+                if PantsMappingClass.image_cache is not None:
+                    lam = self._apply_with_cache(
+                        other, PantsMappingClass.image_cache)
+                else:
+                    lam = other.copy()
+                    _apply_operations(lam, self._compiled_twists)
+            finally:
+                if trace is not None:
+                    trace.end(coordinates_after=None if lam is None
+                              else lam.to_vector())
             return lam
 
         raise ValueError
 
+    def _normalize(self):
+        """Compute the normalized and compiled words of twists."""
+        if self._normalized_twists is None:
+            self._normalized_twists = normalize_twists(
+                self._pants_twists, self._pants_decomposition)
+            self._compiled_twists = compile_twists(self._normalized_twists)
+
+    def _result_key(self):
+        """Return the genus, the pants decomposition and the normalized word
+        of twists as keys of a ResultCache."""
+        self._normalize()
+        p = self._pants_decomposition
+        word = [[list(t.curve_key()[0]), t.pants_curve, t.power]
+                for t in self._normalized_twists]
+        gluing_list = [[int(x) for x in pant] for pant in p._gluing_list]
+        return (p.genus(), json.dumps(gluing_list),
+                json.dumps(word, separators=(',', ':')))
+
+    def _cached_result(self, kind):
+        """Return a result stored in the result cache, or None."""
+        cache = PantsMappingClass.result_cache
+        if cache is None:
+            return None
+        return cache.lookup(kind, *self._result_key())
+
+    def _store_result(self, kind, value):
+        """Store a result in the result cache, if there is one."""
+        cache = PantsMappingClass.result_cache
+        if cache is not None:
+            cache.store(kind, *(self._result_key() + (value,)))
+
+    def _apply_with_cache(self, lam, cache):
+        """Apply the mapping class to a lamination, using and updating the
+        cached images of the lamination under the suffixes of the word.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import humphries_generators
+            >>> from macaw.pants_lamination import PantsLamination
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> from macaw.image_cache import ImageCache
+            >>> A, B, c = humphries_generators(2)
+            >>> p = A[0]._pants_decomposition
+            >>> lam = PantsLamination(p, [2, 1, 2, 1, 2, 1])
+            >>> f = PantsMappingClass(p, B[0]._pants_twists + c._pants_twists)
+            >>> cache = ImageCache()
+            >>> PantsMappingClass.image_cache = cache
+            >>> image = f * lam
+            >>> f * lam == image
+            True
+            >>> cache.statistics()['hits'], cache.statistics()['misses']
+            (1, 1)
+            >>> PantsMappingClass.image_cache = None
+            >>> f * lam == image
+            True
+
+        """
+        p = self._pants_decomposition
+        domain = tuple(tuple(pant) for pant in p._gluing_list)
+        twists = self._normalized_twists
+        word = [(t.curve_key(), t.power) for t in twists]
+        coordinates = tuple(int(x) for x in lam.to_vector())
+        num_cached, image = cache.lookup(domain, word, coordinates)
+        if image is None:
+            lam = lam.copy()
+        else:
+            lam = PantsLamination(p, list(image))
+        # The operations of the letters are merged as in compile_twists().
+        # The image under a suffix is only computed and cached if the
+        # operations of the suffix are not merged with later ones.
+        ops = []
+        boundaries = []
+        for i in range(len(word) - num_cached - 1, -1, -1):
+            for op in compile_twists([twists[i]]):
+                length = len(ops)
+                if _push_operation(ops, op):
+                    while len(boundaries) > 0 and \
+                            boundaries[-1][1] >= length:
+                        boundaries.pop()
+            boundaries.append((i, len(ops)))
+        start = 0
+        for i, end in boundaries:
+            _apply_operations(lam, ops[start:end])
+            start = end
+            cache.insert(domain, word[i:], coordinates,
+                         tuple(int(x) for x in lam.to_vector()))
+        return lam
+
     # def __rmul__(self, pants_lamination):
     #     raise ValueError
 
@@ -151,10 +532,9 @@ class PantsMappingClass(MappingClass):
             return PantsMappingClass.identity(p)
         twists = self._pants_twists * abs(k)
 
-        try:
-            ah = self.action_on_homology() ** k
-        except NotImplementedError:
-            ah = None
+        ah = None
+        if self._action_on_homology is not None:
+            ah = self._action_on_homology ** k
 
         if k > 0:
             return PantsMappingClass(p, twists, action_on_homology=ah)
@@ -212,18 +592,393 @@ class PantsMappingClass(MappingClass):
     def __ne__(self, other):
         return not self.__eq__(other)
 
-    # def nielsen_thurston_type(self):
-    #     p = self._pants_decomposition
-    #     inner_curve = p.inner_pants_curves()[0]
-    #     c = PantsLamination.from_pants_curve(p, inner_curve)
+    def _apply_in_place(self, lam):
+        """Apply the mapping class to a lamination, changing the lamination.
+        """
+        self._normalize()
+        _apply_operations(lam, self._compiled_twists)
 
-    def stretch_factor(self):
-        """Return an approximation of the stretch factor.
+    def orbit(self, lam):
+        """Iterate the mapping class on a lamination.
 
-        EXAMPLES:
+        The mapping class is applied to a copy of ``lam`` again and again
+        and the iterates ``f(lam), f^2(lam), ...`` are yielded. Each iterate
+        is computed from the previous one in place, so the iterates are
+        not copied and the word of twists is not multiplied out. The
+        generator is infinite.
+
+        .. WARNING::
+
+            The same lamination object is yielded every time, changed by
+            the next step. Copy the iterates that have to be kept.
+
+        EXAMPLES::
+
+            >>> from itertools import islice
+            >>> from macaw.generating_sets import map_from_list
+            >>> from macaw.pants_lamination import PantsLamination
+            >>> f = map_from_list(2, [1, 2, 3, 4])
+            >>> lam = PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+            >>> iterates = [x.copy() for x in islice(f.orbit(lam), 10)]
+            >>> iterates[0] == f * lam
+            True
+            >>> iterates[9] == lam
+            True
+
+        """
+        lam = lam.copy()
+        while True:
+            self._apply_in_place(lam)
+            yield lam
+
+    def find_period(self, lam, max_steps=1000):
+        """Find the period of a lamination under the mapping class.
+
+        Mapping classes act on laminations bijectively, so an orbit that
+        becomes periodic returns to the starting lamination; there is no
+        preperiod. The iterates are therefore compared to the starting
+        lamination only, using a hash of its coordinates, and the orbit is
+        traversed once, in constant memory.
+
+        INPUT:
+
+        - ``lam`` -- a PantsLamination
+
+        - ``max_steps`` -- (default: 1000) the maximal number of times the
+          mapping class is applied
+
+        OUTPUT:
+
+        The smallest ``n > 0`` such that ``f^n(lam) = lam``, or None if
+        there is no such ``n`` up to ``max_steps``.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import map_from_list
+            >>> from macaw.pants_lamination import PantsLamination
+            >>> f = map_from_list(2, [1, 2, 3, 4])
+            >>> p = f._pants_decomposition
+            >>> f.order()
+            10
+            >>> f.find_period(PantsLamination(p, [2, 1, 2, 1, 2, 1]))
+            5
+
+        (The fifth power of ``f`` is the hyperelliptic involution, which
+        fixes every curve.)
+
+            >>> g = map_from_list(2, [1, -2])
+            >>> g.find_period(PantsLamination(p, [2, 1, 2, 1, 2, 1]), 50) is None
+            True
+
+        """
+        if max_steps < 1:
+            return None
+        start = _coordinate_key(lam)
+        start_hash = hash(start)
+        n = 0
+        for image in self.orbit(lam):
+            n += 1
+            key = _coordinate_key(image)
+            if hash(key) == start_hash and key == start:
+                return n
+            if n >= max_steps:
+                return None
+
+    def growth_profile(self, lam, n):
+        """Return the sizes of the iterates of a lamination.
+
+        The size of a lamination is the sum of the absolute values of its
+        Dehn-Thurston coordinates.
+
+        INPUT:
+
+        - ``lam`` -- a PantsLamination
+
+        - ``n`` -- the number of iterations
+
+        OUTPUT:
+
+        A float numpy array of length ``n+1`` whose entry ``k`` is the size
+        of ``f^k(lam)``. The ratios of consecutive entries approximate the
+        growth rate of the mapping class.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import map_from_list
+            >>> from macaw.pants_lamination import PantsLamination
+            >>> f = map_from_list(2, [1, -2, 3, -4, -6])
+            >>> lam = PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+            >>> sizes = f.growth_profile(lam, 30)
+            >>> len(sizes), sizes[0]
+            (31, 9.0)
+            >>> round(sizes[-1] / sizes[-2], 2)
+            4.25
+
+        """
+        sizes = np.empty(n+1)
+        sizes[0] = _size(lam)
+        if n > 0:
+            for k, image in enumerate(self.orbit(lam)):
+                sizes[k+1] = _size(image)
+                if k+1 == n:
+                    break
+        return sizes
+
+    def _curve_period(self, max_period):
+        """Return the smallest ``n > 0`` such that ``f^n`` fixes the
+        laminations tested by :meth:`is_identity`, or None if it is larger
+        than ``max_period``.
+
+        ``f^n`` fixes a lamination exactly if ``n`` is a multiple of its
+        period, so the answer is the least common multiple of the periods.
+        """
+        p = self._pants_decomposition
+        period = 1
+        for c in p.inner_pants_curves():
+            for lam in [PantsLamination.from_pants_curve(p, c),
+                        PantsLamination.from_transversal(p, c)]:
+                n = self.find_period(lam, max_period)
+                if n is None:
+                    return None
+                period = period * n // gcd(period, n)
+                if period > max_period:
+                    return None
+        return period
+
+    def _is_periodic(self):
+        """Decide if the mapping class has finite order.
+
+        Unlike :meth:`order`, this does not use the action on homology: if
+        a power acts trivially on the curves, then it is the identity or the
+        hyperelliptic involution, so the mapping class has finite order.
+        """
+        p = self._pants_decomposition
+        g = p.genus()
+        if g < 2 or p.num_punctures() > 0:
+            raise NotImplementedError(
+                "Detecting periodic mapping classes currently "
+                "only works for closed surfaces of genus 2 and higher.")
+        return self._curve_period(4*g+2) is not None
+
+    def _find_invariant_lamination(self, num_iterations=16,
+                                   max_num_iterations=256):
+        """Search for a projectively invariant measured lamination by a
+        periodic splitting sequence.
+
+        A fixed curve is iterated under the mapping class and the part of
+        the Dehn-Thurston train track of the image with non-negligible
+        measure is split maximally. If the curves converge to a projectively invariant
+        lamination, the splitting sequence becomes periodic. The number of
+        iterations is doubled until a period is found whose growth matches
+        the growth of the iterated curves, or until ``max_num_iterations``
+        is reached.
+
+        OUTPUT:
+
+        A tuple ``(sequence, power)``, where ``sequence`` is a
+        PeriodicSplittingSequence and the growth of the curves under the
+        mapping class is the growth of the period raised to ``power``. (The
+        period may correspond to a root of the mapping class.) If no such
+        sequence is found, ``None`` is returned.
+
+        """
+        p = self._pants_decomposition
+        # Starting from a fixed curve makes the result reproducible.
+        lam = PantsLamination(p, [2, 1] * len(p.inner_pants_curves()))
+        num_done = 0
+        previous_ratio = None
+        while num_iterations <= max_num_iterations:
+            for i in range(num_iterations - num_done):
+                self._apply_in_place(lam)
+            num_done = num_iterations
+            num_iterations *= 2
+
+            image = self * lam
+            ratio = truediv(sum(abs(x) for x in image.to_vector()),
+                            sum(abs(x) for x in lam.to_vector()))
+            if previous_ratio is None:
+                tolerance = 1e-6
+            else:
+                tolerance = max(1e-6, 10 * abs(ratio - previous_ratio) / ratio)
+            previous_ratio = ratio
+
+            # Parts of the curve that do not grow are negligible compared
+            # to the precision of comparing measures in the splitting.
+            measure = lam._tt.measure()
+            tt = positive_subtrack(TrainTrack(lam._tt.gluing_list(), measure),
+                                   threshold=sum(measure) * 1e-9)
+            tt.make_trivalent()
+            try:
+                seq = find_periodic_splitting_sequence(tt)
+            except ValueError:
+                # The train track is disconnected or has closed components.
+                continue
+            if seq is None:
+                continue
+
+            growth = float(seq.growth())
+            if growth <= 1 + tolerance:
+                # no power of the period grows, so only the period itself
+                # can match the growth of the curves
+                power = 1
+            else:
+                power = max(1, int(round(log(ratio) / log(growth))))
+            if abs(growth**power - ratio) < tolerance * ratio:
+                return seq, power
+        return None
+
+    def _invariant_lamination_data(self):
+        if self._invariant_lamination_cache is None:
+            self._invariant_lamination_cache = \
+                (self._find_invariant_lamination(),)
+        return self._invariant_lamination_cache[0]
+
+    def nielsen_thurston_type(self):
+        """Return the Nielsen-Thurston type of the mapping class.
+
+        Periodic mapping classes are detected by their action on curves. For
+        other mapping classes, a projectively invariant measured lamination
+        is searched for by iterating a curve and finding a periodic maximal
+        splitting sequence. The mapping class is pseudo-Anosov if the
+        lamination fills the surface and reducible otherwise.
+
+        OUTPUT:
+
+        One of the constants ``PERIODIC``, ``REDUCIBLE`` and
+        ``PSEUDO_ANOSOV`` in ``macaw.constants``, or ``None`` if no invariant
+        lamination is found. (For example, the splitting sequence is never
+        periodic for a Dehn twist.)
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import humphries_generators
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> A, B, c = humphries_generators(2)
+            >>> p = A[0]._pants_decomposition
+            >>> def inv(f):
+            ...     return [t.inverse() for t in reversed(f._pants_twists)]
+            >>> f = PantsMappingClass(p, A[0]._pants_twists + inv(B[0]) +
+            ...                       A[1]._pants_twists + inv(B[1]) + inv(c))
+            >>> f.nielsen_thurston_type()
+            'pseudo-Anosov'
+
+        An Anosov map on a one-holed torus is reducible::
+
+            >>> g = PantsMappingClass(p, A[0]._pants_twists + inv(B[0]))
+            >>> g.nielsen_thurston_type()
+            'reducible'
+
+        The hyperelliptic involution is periodic::
+
+            >>> from macaw.examples import hyperelliptic_involution
+            >>> hyperelliptic_involution(2).nielsen_thurston_type()
+            'periodic'
+
+        The type of a Dehn twist is not detected::
+
+            >>> c.nielsen_thurston_type() is None
+            True
+
+        """
+        try:
+            if self._is_periodic():
+                return PERIODIC
+        except NotImplementedError:
+            pass
+        data = self._invariant_lamination_data()
+        if data is None:
+            return None
+        tt = data[0].train_track()
+        if tt.num_switches() - tt.num_branches() + \
+           tt.num_complementary_regions() == \
+           2 - 2*self._pants_decomposition.genus():
+            return PSEUDO_ANOSOV
+        return REDUCIBLE
+
+    def is_pseudo_anosov(self):
+        """Decide if the mapping class is pseudo-Anosov.
+
+        A ValueError is raised if the Nielsen-Thurston type cannot be
+        determined. See :meth:`nielsen_thurston_type`.
+        """
+        typ = self.nielsen_thurston_type()
+        if typ is None:
+            raise ValueError("The Nielsen-Thurston type could not be "
+                             "determined.")
+        return typ == PSEUDO_ANOSOV
+
+    def invariant_train_track(self):
+        """Return a measured train track invariant under a pseudo-Anosov
+        mapping class.
+
+        The measure is an approximation of the unstable lamination.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import humphries_generators
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> A, B, c = humphries_generators(2)
+            >>> p = A[0]._pants_decomposition
+            >>> def inv(f):
+            ...     return [t.inverse() for t in reversed(f._pants_twists)]
+            >>> f = PantsMappingClass(p, A[0]._pants_twists + inv(B[0]) +
+            ...                       A[1]._pants_twists + inv(B[1]) + inv(c))
+            >>> tt = f.invariant_train_track()
+            >>> tt.is_trivalent()
+            True
+            >>> tt.num_switches() - tt.num_branches() + \\
+            ...     tt.num_complementary_regions()
+            -2
+
+        """
+        if self.nielsen_thurston_type() != PSEUDO_ANOSOV:
+            raise ValueError("The mapping class is not known to be "
+                             "pseudo-Anosov.")
+        return self._invariant_lamination_data()[0].train_track()
+
+    def stretch_factor(self, exact=False, classify=True):
+        """Return the stretch factor.
+
+        For pseudo-Anosov mapping classes, the stretch factor is computed
+        from the transition matrix of a periodic splitting sequence, and it
+        is 1 for periodic mapping classes. For other mapping classes, an
+        approximation of the growth rate of a random curve is returned.
+
+        Finding the type of the mapping class (see
+        :meth:`nielsen_thurston_type`) takes most of the time for mapping
+        classes that are not pseudo-Anosov. It can be skipped by setting
+        ``classify`` to False.
+
+        INPUT:
+
+        - ``exact`` -- (default: False) if True, the stretch factor of a
+          pseudo-Anosov mapping class is returned as an AlgebraicNumber
+
+        - ``classify`` -- (default: True) if False, the approximation of the
+          growth rate of a random curve is returned without finding the
+          type of the mapping class. It is ignored if ``exact`` is True.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import humphries_generators
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> A, B, c = humphries_generators(2)
+            >>> p = A[0]._pants_decomposition
+            >>> def inv(f):
+            ...     return [t.inverse() for t in reversed(f._pants_twists)]
+            >>> f = PantsMappingClass(p, A[0]._pants_twists + inv(B[0]) +
+            ...                       A[1]._pants_twists + inv(B[1]) + inv(c))
+            >>> round(f.stretch_factor(), 6)
+            4.254228
+            >>> f.stretch_factor(exact=True)
+            Root of x^6 - 6*x^5 + 8*x^4 - 4*x^3 + 8*x^2 - 6*x + 1 near 4.254228
+
+        The stretch factor of a periodic mapping class is 1::
+
+            >>> from macaw.generating_sets import map_from_list
+            >>> map_from_list(2, [1, 2, 3, 4, 5]).stretch_factor()
+            1.0
 
-        >>> from macaw.generating_sets import humphries_generators
-        >>> A, B, c = humphries_generators(2)
         >>> f = A[0]*B[0]**(-1)
         >>> f.stretch_factor()  # doctest: +SKIP
         2.618
@@ -232,39 +987,109 @@ class PantsMappingClass(MappingClass):
         1.01
 
         """
+        if not exact:
+            sf = self._cached_result('stretch_factor')
+            if sf is not None:
+                return sf
+        typ = None
+        if classify or exact:
+            typ = self.nielsen_thurston_type()
+        if typ == PERIODIC and not exact:
+            self._store_result('stretch_factor', 1.0)
+            return 1.0
+        if typ == PSEUDO_ANOSOV:
+            seq, power = self._invariant_lamination_data()
+            matrix = seq.transition_matrix()
+            result = matrix
+            for i in range(power - 1):
+                result = result.dot(matrix)
+            sf = perron_frobenius_eigenvalue(result)
+            # The exact stretch factors of pseudo-Anosov and periodic maps
+            # are stored, never the random approximations of the others.
+            self._store_result('stretch_factor', float(sf))
+            return sf if exact else float(sf)
+        if exact:
+            raise ValueError("The mapping class is not known to be "
+                             "pseudo-Anosov.")
+
         p = self._pants_decomposition
 
         # pick a curve to iterate
         c = PantsLamination.random(p)
-        # print c
+        sizes = self.growth_profile(c, 101)
+        return sizes[-1] / sizes[-2]
+
+    def _homology_action(self):
+        """Return the action on homology as a HomologyAction.
 
-        cc = (self**100) * c
-        # print self**100
-        # print cc
-        return float(sum(abs(x) for x in (self*cc).to_vector())) / \
-                    sum(abs(x) for x in cc.to_vector())
+        If the action was not specified, it is computed from the actions of
+        the twists in the basis of PantsDecomposition.homology_basis().
+        """
+        if self._action_on_homology is not None:
+            return self._action_on_homology
+        if self._automatic_action is None:
+            h = pants_homology(self._pants_decomposition)
+            action = HomologyAction.identity(h.dimension())
+            for twist in self._pants_twists:
+                action = action * h.twist_action(twist)
+            self._automatic_action = action
+        return self._automatic_action
 
     def action_on_homology(self):
         """Compute the action on homology.
 
-        Currently the action on homology has to be specified manually for the
-        generators. Later on, this can be made automatic as follows.
-        PantsDecomposition.homology_basis() computes a collection of curves
-        that serve as the homology basis. To compute the action of a Dehn twist
-        on any of these curves, we just need to compute the algebraic
-        intersection number. When the twist is about a pants curves, this is
-        easy, because then the twist curve has zero intersection with all basis
-        elements that are pants curves, and +/-1 intersection with the basis
-        elements coming from cycles. When the twist is about a transverse
-        curve, it has zero algebraic intersection number with all pants curves
-        again, however, the algebraic intersection number with the basis
-        elements coming from the cycles is somewhat more delicate.
+        If the action was specified when the mapping class was created (as
+        for the Humphries generators), that action is used. Otherwise the
+        action is computed in the basis given by
+        PantsDecomposition.homology_basis(): each twist acts by the
+        transvection of its twisting curve, whose class is computed from the
+        algebraic intersection numbers of curves (see
+        :class:`~macaw.homology.PantsHomology`). This is only implemented
+        for closed surfaces.
+
+        The action is stored as a product of elementary matrices and
+        transvections and the matrix is computed when this method is first
+        called. It is returned as a numpy matrix (as the matrices of the
+        Humphries generators in :mod:`macaw.generating_sets`), so ``*``
+        multiplies two actions as matrices.
+
+        EXAMPLES::
+
+            >>> from macaw import PantsDecomposition
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> from macaw.pants_mapping_class import PantsTwist
+            >>> p = PantsDecomposition([[1, 2, 3], [-1, -2, -3]])
+            >>> p.homology_basis()
+            ([2, 3], [[2, -1], [3, -1]])
+            >>> f = PantsMappingClass(p, [PantsTwist([], 2), PantsTwist([2], 2)])
+            >>> f.action_on_homology().tolist()
+            [[1, 0, -2, -2], [0, 1, -2, -4], [0, 0, 1, 0], [0, 0, 0, 1]]
+            >>> (f.action_on_homology() * f.action_on_homology()).tolist()
+            [[1, 0, -4, -4], [0, 1, -4, -8], [0, 0, 1, 0], [0, 0, 0, 1]]
+
         """
-        if self._action_on_homology is None:
-            raise NotImplementedError("The action on homology is not"
-                                      " implemented for this mapping class.")
-        else:
-            return self._action_on_homology
+        return np.matrix(self._homology_action().matrix())
+
+    def homology_charpoly(self):
+        """Return the characteristic polynomial of the action on homology.
+
+        OUTPUT:
+
+        The list of coefficients, starting with the leading coefficient 1.
+
+        EXAMPLES::
+
+            >>> from macaw.examples import hyperelliptic_involution
+            >>> hyperelliptic_involution(2).homology_charpoly()
+            [1, 4, 6, 4, 1]
+
+        """
+        poly = self._cached_result('homology_charpoly')
+        if poly is None:
+            poly = characteristic_polynomial(
+                self._homology_action().matrix())
+            self._store_result('homology_charpoly', poly)
+        return poly
 
     def is_in_torelli(self):
         """Decide if the mapping class is in the Torelli subgroup.
@@ -279,9 +1104,45 @@ class PantsMappingClass(MappingClass):
             >>> (f**2).is_in_torelli()
             True
 
+        The action is also computed for mapping classes without a specified
+        action. A twist about a separating curve is in the Torelli group::
+
+            >>> from macaw import PantsDecomposition
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> from macaw.pants_mapping_class import PantsTwist
+            >>> p = PantsDecomposition.humphries(2)
+            >>> PantsMappingClass(p, [PantsTwist([], 2)]).is_in_torelli()
+            True
+            >>> PantsMappingClass(p, [PantsTwist([2], 2)]).is_in_torelli()
+            False
+
+        """
+        return self._homology_action().is_identity()
+
+    def is_in_level(self, modulus):
+        """Decide if the mapping class is in the level ``modulus``
+        congruence subgroup, i.e., if it acts trivially on homology with
+        coefficients in the integers modulo ``modulus``.
+
+        The action is computed modulo ``modulus`` in int64 arithmetic, so
+        this does not require the exact matrix.
+
+        EXAMPLES::
+
+            >>> from macaw import PantsDecomposition
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> from macaw.pants_mapping_class import PantsTwist
+            >>> p = PantsDecomposition.humphries(2)
+            >>> f = PantsMappingClass(p, [PantsTwist([2], 2)])
+            >>> f.is_in_level(2)
+            False
+            >>> (f**2).is_in_level(2)
+            True
+            >>> (f**2).is_in_level(3)
+            False
+
         """
-        mat = self.action_on_homology()
-        return np.array_equal(mat, np.identity(mat.shape[0], dtype=object))
+        return self._homology_action().reduce([modulus]).is_identity()
 
     def order(self):
         """Return the order of ``self``.
@@ -289,6 +1150,24 @@ class PantsMappingClass(MappingClass):
         OUTPUT:
         The order if it is finite. If the order is infinite, 0 is returned.
 
+        If ``PantsMappingClass.result_cache`` is set to a
+        :class:`~macaw.result_cache.ResultCache`, the order is looked up in
+        and stored to it.
+
+        EXAMPLES::
+
+            >>> from macaw.generating_sets import map_from_list
+            >>> from macaw.pants_mapping_class import PantsMappingClass
+            >>> from macaw.result_cache import ResultCache
+            >>> PantsMappingClass.result_cache = ResultCache(':memory:')
+            >>> map_from_list(2, [1, 2, 3, 4]).order()
+            10
+            >>> map_from_list(2, [1, 2, 3, 4]).order()
+            10
+            >>> PantsMappingClass.result_cache.statistics()['hits']
+            1
+            >>> PantsMappingClass.result_cache = None
+
         """
         p = self._pants_decomposition
         g = p.genus()
@@ -296,11 +1175,35 @@ class PantsMappingClass(MappingClass):
             raise NotImplementedError(
                 "The order computation currently "
                 "only works for closed surfaces of genus 2 and higher.")
+        order = self._cached_result('order')
+        if order is None:
+            order = self._compute_order()
+            self._store_result('order', order)
+        return order
+
+    def _compute_order(self):
+        """Compute the order of ``self`` (see :meth:`order`)."""
+        g = self._pants_decomposition.genus()
+        # A power acting nontrivially on homology modulo a prime is not the
+        # identity, so most powers are ruled out without acting on curves.
+        mod_action = self._homology_action().reduce()
+        mod_power = mod_action**0
+        candidates = []
         for n in range(1, 4*g+3):
-            power = self**n
-            if power.is_identity():
-                if g > 2 or g == 2 and power.is_in_torelli():
-                    return n
+            mod_power = mod_power * mod_action
+            if mod_power.is_identity():
+                candidates.append(n)
+        if not candidates:
+            return 0
+        # The powers acting trivially on curves are the multiples of the
+        # period of the curves, which is found by iterating the curves once.
+        period = self._curve_period(candidates[-1])
+        if period is None:
+            return 0
+        for n in candidates:
+            if n % period == 0 and \
+               (g > 2 or g == 2 and (self**n).is_in_torelli()):
+                return n
         return 0
 
     # def splitting_sequence(self, pants_lamination):
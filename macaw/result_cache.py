@@ -0,0 +1,191 @@
+r"""
+A persistent cache of results computed for mapping classes.
+
+The results are stored in an SQLite database, keyed by the kind of the
+result (e.g. ``'order'``), the genus, the pants decomposition on which the
+twists are defined and the normalized word of twists. Each kind of result
+has an algorithm version, and results stored by a different version are
+ignored and overwritten.
+
+Only exact results are stored. For ``'stretch_factor'``, these are the
+stretch factors of pseudo-Anosov mapping classes and the value 1.0 of
+periodic mapping classes, never the estimated growth rates of mapping
+classes whose type was not found.
+
+"""
+
+
+import json
+import os
+import sqlite3
+
+
+# The default location of the database.
+RESULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache',
+                                 'macaw', 'results.sqlite')
+
+# The version of the algorithm computing each kind of result. Increase the
+# version when the algorithm changes in a way that changes its results.
+RESULT_VERSIONS = {
+    'order': 1,
+    'stretch_factor': 1,
+    'homology_charpoly': 1,
+}
+
+# The version of the layout of the database. Databases of other versions
+# are emptied when opened.
+SCHEMA_VERSION = 1
+
+
+class ResultCache(object):
+    """A persistent cache of results computed for mapping classes.
+
+    The database is opened on first use, separately in every process, so a
+    ResultCache can be sent to worker processes and several processes can
+    share the same database.
+
+    INPUT:
+
+    - ``path`` -- (default: RESULT_CACHE_FILE) the file of the database.
+      If ``':memory:'``, the results are not stored on disk.
+
+    - ``versions`` -- (default: None) a dictionary overriding the versions
+      in RESULT_VERSIONS
+
+    EXAMPLES::
+
+        >>> from macaw.result_cache import ResultCache
+        >>> cache = ResultCache(':memory:')
+        >>> cache.store('order', 2, '[[1, 2, 3]]', '[]', 1)
+        >>> cache.lookup('order', 2, '[[1, 2, 3]]', '[]')
+        1
+        >>> cache.lookup('order', 2, '[[1, 2, 3]]', '[[[[], 1], 1]]') is None
+        True
+        >>> cache.statistics()['hits'], cache.statistics()['misses']
+        (1, 1)
+
+    Results of older versions of the algorithms are ignored::
+
+        >>> cache._versions['order'] = 2
+        >>> cache.lookup('order', 2, '[[1, 2, 3]]', '[]') is None
+        True
+
+    """
+    def __init__(self, path=RESULT_CACHE_FILE, versions=None):
+        self._path = path
+        self._versions = dict(RESULT_VERSIONS)
+        if versions is not None:
+            self._versions.update(versions)
+        self._connection = None
+        self._pid = None
+        self._hits = 0
+        self._misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def _connect(self):
+        """Return the connection to the database of this process."""
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        if self._path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(self._path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        conn = sqlite3.connect(self._path, timeout=60)
+        if self._path != ':memory:':
+            # Readers do not block the writers of other processes.
+            conn.execute('PRAGMA journal_mode=WAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != \
+           SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS results')
+            conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                     'kind TEXT, genus INTEGER, pants_decomposition TEXT, '
+                     'word TEXT, version INTEGER, value TEXT, '
+                     'PRIMARY KEY (kind, genus, pants_decomposition, word))')
+        conn.commit()
+        self._connection = conn
+        self._pid = os.getpid()
+        return conn
+
+    def lookup(self, kind, genus, pants_decomposition, word):
+        """Return a cached result.
+
+        INPUT:
+
+        - ``kind`` -- the kind of the result, a key of RESULT_VERSIONS
+
+        - ``genus`` -- the genus of the surface
+
+        - ``pants_decomposition`` -- a string identifying the pants
+          decomposition
+
+        - ``word`` -- a string identifying the normalized word of twists
+
+        OUTPUT:
+
+        The cached result, or None if there is no result computed by the
+        current version of the algorithm.
+
+        """
+        row = self._connect().execute(
+            'SELECT version, value FROM results WHERE kind = ? AND '
+            'genus = ? AND pants_decomposition = ? AND word = ?',
+            (kind, genus, pants_decomposition, word)).fetchone()
+        if row is None or row[0] != self._versions[kind]:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return json.loads(row[1])
+
+    def store(self, kind, genus, pants_decomposition, word, value):
+        """Store a result.
+
+        The arguments are as in :meth:`lookup`; ``value`` is the result,
+        which is stored as JSON.
+        """
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO results '
+                     'VALUES (?, ?, ?, ?, ?, ?)',
+                     (kind, genus, pants_decomposition, word,
+                      self._versions[kind], json.dumps(value)))
+        conn.commit()
+
+    def clear(self, kind=None):
+        """Remove the results of a kind, or all results if ``kind`` is None.
+        """
+        conn = self._connect()
+        if kind is None:
+            conn.execute('DELETE FROM results')
+        else:
+            conn.execute('DELETE FROM results WHERE kind = ?', (kind,))
+        conn.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def statistics(self):
+        """Return the number of hits and misses of :meth:`lookup` in this
+        process and the number of stored results.
+
+        EXAMPLES::
+
+            >>> from macaw.result_cache import ResultCache
+            >>> cache = ResultCache(':memory:')
+            >>> cache.store('order', 2, 'p', '[]', 1)
+            >>> stats = cache.statistics()
+            >>> stats['entries'], stats['hits'], stats['misses']
+            (1, 0, 0)
+
+        """
+        num_entries = self._connect().execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+        return {'entries': num_entries,
+                'hits': self._hits,
+                'misses': self._misses}
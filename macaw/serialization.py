@@ -0,0 +1,155 @@
+r"""
+Compact binary serialization of pants decompositions, train tracks,
+laminations and mapping classes.
+
+The objects are written as a tag identifying the class, the format
+version and the data of the object. Integers are written as varints
+(little-endian base 128, signed integers after zigzag encoding), so small
+measures and words take one byte per entry and measures of any size can be
+stored. Only the live data is written: the unused parts of the buffers of
+train tracks and the cached data of mapping classes are not.
+
+The classes provide ``to_bytes()`` and ``from_bytes()`` methods, and they
+are pickled in this format.
+
+EXAMPLES::
+
+    >>> from macaw.serialization import from_bytes, write_int, read_int
+    >>> from macaw.pants_decomposition import PantsDecomposition
+    >>> p = PantsDecomposition([[1, 2, 3], [-3, -2, -1]])
+    >>> from_bytes(p.to_bytes())
+    Pants decomposition with gluing list [[1, 2, 3], [-3, -2, -1]]
+
+    >>> buf = bytearray()
+    >>> for n in [0, -1, 300, -2**70]:
+    ...     write_int(buf, n)
+    >>> len(buf)
+    15
+    >>> pos = 0
+    >>> for i in range(4):
+    ...     n, pos = read_int(buf, pos)
+    ...     print(n)
+    0
+    -1
+    300
+    -1180591620717411303424
+
+"""
+
+from importlib import import_module
+
+# The version of the format. Data written by other versions is rejected.
+FORMAT_VERSION = 1
+
+PANTS_DECOMPOSITION = 1
+TRAIN_TRACK = 2
+DEHN_THURSTON_TT = 3
+PANTS_LAMINATION = 4
+PANTS_MAPPING_CLASS = 5
+
+# The classes of the tags, as (module, class) pairs.
+_CLASSES = {
+    PANTS_DECOMPOSITION: ('macaw.pants_decomposition', 'PantsDecomposition'),
+    TRAIN_TRACK: ('macaw.train_tracks.train_track', 'TrainTrack'),
+    DEHN_THURSTON_TT: ('macaw.train_tracks.dehn_thurston.dehn_thurston_tt',
+                       'DehnThurstonTT'),
+    PANTS_LAMINATION: ('macaw.pants_lamination', 'PantsLamination'),
+    PANTS_MAPPING_CLASS: ('macaw.pants_mapping_class', 'PantsMappingClass'),
+}
+
+
+def write_uint(buf, n):
+    """Append a nonnegative integer to a bytearray as a varint."""
+    n = int(n)
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def write_int(buf, n):
+    """Append an integer to a bytearray as a zigzag encoded varint."""
+    n = int(n)
+    write_uint(buf, 2*n if n >= 0 else -2*n - 1)
+
+
+def write_ints(buf, ls):
+    """Append the length and the entries of a list of integers."""
+    write_uint(buf, len(ls))
+    for n in ls:
+        write_int(buf, n)
+
+
+def read_uint(data, pos):
+    """Read a varint from a bytearray.
+
+    OUTPUT:
+
+    A pair ``(n, pos)`` of the integer and the position after it.
+    """
+    n = 0
+    shift = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise ValueError("The data ends in the middle of an integer.")
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def read_int(data, pos):
+    """Read a zigzag encoded varint from a bytearray."""
+    n, pos = read_uint(data, pos)
+    return (n >> 1 if n % 2 == 0 else -(n >> 1) - 1), pos
+
+
+def read_ints(data, pos):
+    """Read a list of integers written by write_ints()."""
+    length, pos = read_uint(data, pos)
+    ls = []
+    for i in range(length):
+        n, pos = read_int(data, pos)
+        ls.append(n)
+    return ls, pos
+
+
+def write_header(buf, tag):
+    buf.append(tag)
+    buf.append(FORMAT_VERSION)
+
+
+def read_header(data, tag):
+    """Check the header of the data of an object.
+
+    OUTPUT:
+
+    The data as a bytearray and the position after the header.
+    """
+    data = bytearray(data)
+    if len(data) < 2 or data[0] != tag:
+        raise ValueError("The data does not encode a %s." %
+                         _CLASSES[tag][1])
+    if data[1] != FORMAT_VERSION:
+        raise ValueError("Unsupported format version: %d." % data[1])
+    return data, 2
+
+
+def check_end(data, pos):
+    if pos != len(data):
+        raise ValueError("There is extra data after the encoded object.")
+
+
+def from_bytes(data):
+    """Decode an object written by one of the ``to_bytes()`` methods.
+
+    This is also the function reconstructing pickled objects.
+    """
+    tag = bytearray(data[:1])
+    if len(tag) == 0 or tag[0] not in _CLASSES:
+        raise ValueError("Unknown object type.")
+    module_name, class_name = _CLASSES[tag[0]]
+    return getattr(import_module(module_name), class_name).from_bytes(data)
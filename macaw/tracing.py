@@ -0,0 +1,191 @@
+r"""
+Structured tracing of train track operations.
+
+While a :class:`Tracer` is active (see :func:`trace`), the elementary
+moves, twists, peels and applications of mapping classes record events
+into the ring buffer of the tracer: the operation, the switch, the branches
+involved and the measures before and after. Operations are spans with a
+start time and a duration; nested operations (e.g. the peels of a second
+elementary move) are recorded as nested spans.
+
+The ``twist`` spans are the twists applied to laminations, one per twist
+of the compiled word of a mapping class. The twists done by the train
+track are recorded as ``general_twist`` spans: nested in the ``twist``
+spans and in the elementary moves, or next to the first elementary moves
+done by an inverse first elementary move.
+
+The instrumented code checks the module attribute ``active`` once per
+operation, so without an active tracer the only cost is that check.
+
+The events can be exported as JSON lines or in the Chrome trace format
+(loadable in ``chrome://tracing`` or Perfetto).
+
+EXAMPLES::
+
+    >>> from macaw import tracing
+    >>> from macaw.generating_sets import map_from_list
+    >>> from macaw.pants_lamination import PantsLamination
+    >>> f = map_from_list(2, [1, 2])
+    >>> lam = PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+    >>> with tracing.trace() as tracer:
+    ...     image = f * lam
+    >>> events = tracer.events()
+    >>> sorted(set(event['name'] for event in events if event['depth'] <= 1))
+    ['apply_mapping_class', 'first_move', 'general_twist', 'twist']
+    >>> [event['depth'] for event in events if event['name'] == 'twist']
+    [1, 1]
+    >>> event = tracer.events()[-1]
+    >>> event['name'], event['args']['num_twists']
+    ('apply_mapping_class', 2)
+
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# The active Tracer, or None. The instrumented code checks this attribute.
+active = None
+
+
+class Tracer(object):
+    """A ring buffer of trace events.
+
+    Every event is a dictionary with the keys ``name``, ``ts`` (the start
+    time in microseconds), ``dur`` (the duration in microseconds, 0 for
+    instant events), ``depth`` (the nesting depth) and ``args`` (the data
+    of the operation).
+
+    INPUT:
+
+    - ``capacity`` -- (default: 100000) the maximal number of stored
+      events. When the buffer is full, the oldest events are discarded.
+
+    - ``sample_rate`` -- (default: 1.0) the probability of recording a
+      top-level operation. Nested operations are recorded together with
+      the enclosing top-level operation, so sampled traces are complete.
+
+    - ``seed`` -- (default: None) the seed of the sampling
+
+    EXAMPLES::
+
+        >>> from macaw.tracing import Tracer
+        >>> tracer = Tracer(capacity=2)
+        >>> tracer.begin('outer', switch=1)
+        >>> tracer.instant('step', branch=3)
+        >>> tracer.end(measure=[1, 2])
+        >>> tracer.instant('last')
+        >>> [(e['name'], e['depth']) for e in tracer.events()]
+        [('outer', 0), ('last', 0)]
+        >>> sorted(tracer.events()[0]['args'].items())
+        [('measure', [1, 2]), ('switch', 1)]
+        >>> tracer.num_dropped()
+        1
+
+    """
+    def __init__(self, capacity=100000, sample_rate=1.0, seed=None):
+        self._events = deque(maxlen=capacity)
+        self._sample_rate = sample_rate
+        self._random = random.Random(seed)
+        self._start = _clock()
+        # the open spans as lists [name, start, args, sampled]
+        self._stack = []
+        self._num_recorded = 0
+
+    def _now(self):
+        return (_clock() - self._start) * 1e6
+
+    def _sampled(self):
+        """Decide if an event at the current depth is recorded."""
+        if self._stack:
+            return self._stack[-1][3]
+        return self._sample_rate >= 1 or \
+            self._random.random() < self._sample_rate
+
+    def _record(self, name, ts, dur, depth, args):
+        self._events.append({'name': name, 'ts': ts, 'dur': dur,
+                             'depth': depth, 'args': args})
+        self._num_recorded += 1
+
+    def begin(self, name, **args):
+        """Start a span. The span is recorded when :meth:`end` is called."""
+        self._stack.append([name, self._now(), args, self._sampled()])
+
+    def end(self, **args):
+        """End the last span started, adding ``args`` to its data."""
+        name, start, span_args, sampled = self._stack.pop()
+        if sampled:
+            span_args.update(args)
+            self._record(name, start, self._now() - start,
+                         len(self._stack), span_args)
+
+    def instant(self, name, **args):
+        """Record an event without duration."""
+        if self._sampled():
+            self._record(name, self._now(), 0, len(self._stack), args)
+
+    def events(self):
+        """Return the list of the stored events, ordered by their end."""
+        return list(self._events)
+
+    def num_dropped(self):
+        """Return the number of events discarded because the buffer was
+        full."""
+        return self._num_recorded - len(self._events)
+
+    def clear(self):
+        self._events.clear()
+        self._num_recorded = 0
+
+    def write_json_lines(self, f):
+        """Write the events to a file object, one JSON object per line."""
+        for event in self._events:
+            f.write(json.dumps(event, sort_keys=True, default=_to_json))
+            f.write('\n')
+
+    def write_chrome_trace(self, f):
+        """Write the events to a file object in the Chrome trace format."""
+        pid = os.getpid()
+        tid = threading.current_thread().ident
+        events = []
+        for event in self._events:
+            events.append({'name': event['name'],
+                           'cat': 'macaw',
+                           'ph': 'X' if event['dur'] > 0 else 'i',
+                           'ts': event['ts'],
+                           'dur': event['dur'],
+                           'pid': pid,
+                           'tid': tid,
+                           'args': event['args']})
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f,
+                  default=_to_json)
+
+
+def _to_json(obj):
+    """Convert numpy arrays and integers in the event data to JSON."""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return int(obj)
+
+
+@contextmanager
+def trace(capacity=100000, sample_rate=1.0, seed=None):
+    """Activate a new :class:`Tracer` in a block.
+
+    The arguments are as in Tracer. The previously active tracer is
+    restored at the end of the block.
+    """
+    global active
+    tracer = Tracer(capacity, sample_rate, seed)
+    previous = active
+    active = tracer
+    try:
+        yield tracer
+    finally:
+        active = previous
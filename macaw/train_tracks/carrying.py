@@ -21,9 +21,11 @@ AUTHORS:
 
 
 import numpy as np
+from collections import deque
 from ..constants import LEFT, RIGHT, START, END, BRANCH, CUSP, \
-    FORWARD, BACKWARD, INTERVAL
+    FORWARD, BACKWARD, INTERVAL, CLICK
 from .train_track import SMALL_COLLAPSIBLE, FoldError, TrainTrack
+from .sparse import SparseMatrix, SparseVector
 
 
 class CarryingMap(object):
@@ -50,13 +52,20 @@ class CarryingMap(object):
 
         - ``small_tt`` -- the small (carried) train track
 
-        - ``paths`` -- a 2D array whose rows
-        correspond to branches and cusps of the small train
-        track. The columns correspond to branches of the large train track and intervals.
-
         - ``cusp_map`` -- A 1D array specifying the image of any cusp in the
           small train track in the large train track.
 
+        - ``large_branch_preimages`` -- a list of two dictionaries, one for
+          the branches (index BRANCH) and one for the cusps (index CUSP) of
+          the small train track. The values are dictionaries which specify how
+          many times the branch or cusp path goes through each branch of the
+          large train track.
+
+        - ``large_switch_data`` -- a dictionary whose keys are the switches of
+          the large train track. The values are lists, alternating between the
+          intersection data of intervals and the sets of small switches in
+          clicks, from left to right.
+
         """
         self._large_tt = large_tt
         self._small_tt = small_tt
@@ -81,18 +90,33 @@ class CarryingMap(object):
             max_num_intervals, dtype=int)
         self._large_switch_to_extremal_interval = np.zeros(
             (2, max_num_large_switches), dtype=int)
-        # 2D array containing how many times paths map onto branches of the large train track and how many times they intersect intervals.
-        # Rows correspond to paths, columns to branches of the large train track and intervals.
-        self._paths = np.zeros(
-            (max_num_small_branches+max_num_small_switches, 
-             max_num_large_branches+max_num_intervals),
-            dtype=object)
+        # Sparse matrix containing how many times paths map onto branches of the large train track and how many times they intersect intervals.
+        # Rows correspond to paths, columns to branches of the large train track and intervals. Only the nonzero entries are stored, so the memory used is proportional to the carrying data, not to the size of the train tracks.
+        self._paths = SparseMatrix()
         # The first ``self._cusp_index_offset`` rows of self._paths
         # correspond to branches, the rest correspond to cusps.
-        self._cusp_index_offset = max_num_small_switches
+        self._cusp_index_offset = max_num_small_branches
         # The first ``interval_index_offset`` columns of self._paths correspond to branches of the large train track. The rest corresponds to intervals.
-        self._interval_index_offset = max_num_large_switches
-
+        self._interval_index_offset = max_num_large_branches
+
+        # For each large switch (positively oriented), the intervals and
+        # clicks from left to right with the cumulative intersections. The
+        # entries are computed when needed and they are discarded whenever
+        # the carrying data changes. See _large_switch_index().
+        self._large_switch_indices = {}
+
+        # The number of switch isotopies performed and the number of
+        # switches examined by isotope_switch_recursively().
+        self._num_switch_moves = 0
+        self._num_switch_visits = 0
+
+        for typ in [BRANCH, CUSP]:
+            preimages = large_branch_preimages[typ]
+            for branch_or_cusp in preimages:
+                for large_branch in preimages[branch_or_cusp]:
+                    self.add_intersection(
+                        typ, branch_or_cusp, BRANCH, large_branch,
+                        with_sign=preimages[branch_or_cusp][large_branch])
 
         interval = 0
         click = 0
@@ -107,16 +131,21 @@ class CarryingMap(object):
                 if not first_interval:
                     self.set_interval_to_click(interval, LEFT, click)
                     self.set_click_to_interval(click, RIGHT, interval)
+                else:
+                    self._large_switch_to_extremal_interval[
+                        LEFT, large_sw-1] = interval
                 first_interval = False
                 for typ in [BRANCH, CUSP]:
                     intersections = intersection_data[typ]
                     for branch_or_cusp in intersections:
                         count = intersections[branch_or_cusp]
                         self.add_intersection_with_interval(
-                            typ, branch_or_cusp, interval)
+                            typ, branch_or_cusp, interval, with_sign=count)
                 try:
                     click_set = next(data_it)
                 except StopIteration:
+                    self._large_switch_to_extremal_interval[
+                        RIGHT, large_sw-1] = interval
                     break
                 click += 1
                 self.set_interval_to_click(interval, RIGHT, click)
@@ -192,6 +221,92 @@ class CarryingMap(object):
                    hb_between_branches,
                    branch_to_cusp_idx)
 
+    def compose(self, other):
+        """Return the composition of two carrying maps.
+
+        If the small train track of ``other`` is the large train track of
+        ``self``, then the returned carrying map carries the small train track
+        of ``self`` on the large train track of ``other``.
+
+        The paths of the composition are computed by a single sparse matrix
+        product: a branch or cusp path crosses a branch or interval of the
+        large train track of ``other`` as many times as the branch paths of
+        ``other`` along it cross it. The intervals and clicks are those of
+        ``other``, with the switches of the small train track of ``self`` put
+        in the clicks of their images.
+
+        INPUT:
+
+        - ``other`` -- a CarryingMap whose small train track is the same as
+          the large train track of ``self``
+
+        """
+        if self._large_tt.gluing_list() != other._small_tt.gluing_list():
+            raise ValueError("The large train track of the first carrying "
+                             "map is not the small train track of the second"
+                             " carrying map.")
+        composed = CarryingMap.__new__(CarryingMap)
+        composed._large_tt = other._large_tt
+        composed._small_tt = self._small_tt
+        composed._large_switch_indices = {}
+
+        # Rows of ``other`` indexed by the branches of the middle train track
+        # (before the cusp offset) are multiplied by the columns of ``self``
+        # indexed by the same branches (before the interval offset).
+        composed._paths = \
+            self._paths.restrict_to_columns(self._interval_index_offset) *\
+            other._paths
+        composed._cusp_index_offset = self._cusp_index_offset
+        composed._interval_index_offset = other._interval_index_offset
+
+        composed._cusp_map = np.zeros(self._cusp_map.shape, dtype=int)
+        for i in range(self._cusp_map.size):
+            if self._cusp_map[i] != 0:
+                composed._cusp_map[i] = \
+                    other.small_cusp_to_large_cusp(self._cusp_map[i])
+
+        composed._click_to_interval = other._click_to_interval.copy()
+        composed._interval_to_click = other._interval_to_click.copy()
+        composed._interval_to_large_switch = \
+            other._interval_to_large_switch.copy()
+        composed._large_switch_to_extremal_interval = \
+            other._large_switch_to_extremal_interval.copy()
+        composed._small_switch_to_click = np.zeros(
+            self._small_switch_to_click.shape, dtype=int)
+        for sw in self._small_tt.switches():
+            middle_sw = self.small_switch_to_large_switch(sw)
+            composed.set_small_switch_to_click(
+                sw, other.small_switch_to_click(middle_sw))
+        return composed
+
+    def transition_matrix(self, sparse=False):
+        """Return the transition matrix of the carrying map.
+
+        The rows correspond to the branches of the large train track, the
+        columns to the branches of the small train track. The entries are the
+        number of times the small branches go through the large branches.
+
+        INPUT:
+
+        - ``sparse`` -- (default: False) if True, a SparseMatrix with
+          zero-based indices is returned, otherwise a dense numpy array with
+          Python integer entries
+
+        """
+        num_small_branches = max(self._small_tt.branches())
+        num_large_branches = max(self._large_tt.branches())
+        m = self._paths.restrict_to_columns(num_large_branches)
+        # removing the cusp paths
+        for i in m.nonzero_rows():
+            if i >= self._cusp_index_offset:
+                for j in m.row(i):
+                    m[i, j] = 0
+        m = m.transpose()
+        if sparse:
+            return m
+        return np.array(m.to_dense(num_large_branches, num_small_branches),
+                        dtype=object)
+
     # ------------------------------------------------------------------
     # GETTERS
     # ------------------------------------------------------------------
@@ -252,7 +367,7 @@ class CarryingMap(object):
         """Return the switch of the large train track containing the click.
         """
         interval = self.click_to_interval(click, LEFT)
-        return interval_to_large_switch(interval)
+        return self.interval_to_large_switch(interval)
 
     def _branch_or_interval_idx(self, typ, branch_or_interval):
         """Return the index of a branch of the large train track of an interval.
@@ -265,13 +380,18 @@ class CarryingMap(object):
         assert False
 
     def get_intersections(self, typ, branch_or_interval):
-        """Return a view on the intersections with a large branch or an interval.
+        """Return the intersections with a large branch or an interval.
+
+        OUTPUT:
+
+        a SparseVector indexed by the branch and cusp paths. It is a copy, so
+        modifying it does not change the carrying data.
         """
         idx = self._branch_or_interval_idx(typ, branch_or_interval)
-        return self._paths[:, idx]
+        return self._paths.column(idx)
 
     def paths_in_large_branch(self, branch):
-        """Return a view of the array counting the branches and cusp paths in a branch of the large train track.
+        """Return the vector counting the branches and cusp paths in a branch of the large train track.
 
         INPUT:
 
@@ -280,24 +400,21 @@ class CarryingMap(object):
 
         OUTPUT:
 
-        a view of the 1D array containing how many times each branch and cusp path of the small train track shows up in this branch.
+        a SparseVector containing how many times each branch and cusp path of the small train track shows up in this branch.
 
         """
         return self.get_intersections(BRANCH, branch)
 
     def get_intersections_with_interval(self, interval):
-        """Return a view on the intersections of paths with a
+        """Return the intersections of paths with a
         specified interval.
         """
         return self.get_intersections(INTERVAL, interval)
 
     def _get_zero_intersection_array(self):
-        """Return a temporary intersection array filled with zeros.
-
-        This array is not part of self._paths, but its length and type is the same as slices of that array.
+        """Return a temporary intersection vector filled with zeros.
         """
-        temp = self._paths[:, 0]
-        return np.zeros(temp.shape[0], dtype=temp.dtype)
+        return SparseVector()
 
     def _path_idx(self, typ, branch_or_cusp):
         """Return the index of a branch or cusp path.
@@ -313,12 +430,12 @@ class CarryingMap(object):
         """Return the path coordinates (intersection with branches and intervals) of a branch or cusp of the small train track.
         """
         idx = self._path_idx(typ, branch_or_cusp)
-        return self._paths[idx]
+        return self._paths.row(idx)
 
     def is_branch_or_cusp_collapsed(self, typ, branch_or_cusp):
         """Decide if a branch or cusp of the small train track is collapsed.
         """
-        return np.all(self.path_coordinates(typ, branch_or_cusp) == 0)
+        return self._paths.is_row_zero(self._path_idx(typ, branch_or_cusp))
 
     def is_branch_collapsed(self, branch):
         """Decide if a branch of the small train track is collapsed.
@@ -406,25 +523,28 @@ class CarryingMap(object):
                with_sign=1):
         """Append a branch or cusp path to another.
         """
-        path1 = self.path_coordinates(typ1, append_to_num)
+        idx = self._path_idx(typ1, append_to_num)
         path2 = self.path_coordinates(typ2, appended_num)
-        path1 += with_sign*path2
+        self._paths.add_to_row(idx, path2, with_sign)
+        self._invalidate_large_switch_indices()
     
     def append_path(self, typ, append_to_num, path,
                with_sign=1):
         """Append a custom path to a branch or cusp path.
 
         """
-        old_path = self.path_coordinates(typ, append_to_num)
-        old_path += with_sign * path
+        idx = self._path_idx(typ, append_to_num)
+        self._paths.add_to_row(idx, path, with_sign)
+        self._invalidate_large_switch_indices()
 
     def append_in_large(self, typ1, append_to_num, typ2, appended_num, 
                                      with_sign=1):
         """Add the paths in a branch of the large train track to another branch.
         """
-        x1 = self.paths_in_large_branch(add_to_branch)
-        x2 = self.paths_in_large_branch(added_branch)
-        x1 += with_sign * x2
+        idx = self._branch_or_interval_idx(typ1, append_to_num)
+        x2 = self.get_intersections(typ2, appended_num)
+        self._paths.add_to_column(idx, x2, with_sign)
+        self._invalidate_large_switch_indices()
 
     def new_interval(self):
         """Return an integer suitable for naming a new interval.
@@ -464,8 +584,9 @@ class CarryingMap(object):
     def erase_interval_intersections(self, interval):
         """Zero out the intersection data of an interval.
         """
-        x = self.get_intersections_with_interval(interval)
-        x.fill(0)
+        idx = self._branch_or_interval_idx(INTERVAL, interval)
+        self._paths.set_column(idx, SparseVector())
+        self._invalidate_large_switch_indices()
 
     def delete_interval(self, interval):
         """Delete an interval.
@@ -524,58 +645,73 @@ class CarryingMap(object):
     def set_intersections_with_interval(self, interval, new_data):
         """Set the intersection data an interval to the specified data.
         """
-        x = self.get_intersections_with_interval(interval)
-        x[:] = new_data
+        idx = self._branch_or_interval_idx(INTERVAL, interval)
+        self._paths.set_column(idx, new_data)
+        self._invalidate_large_switch_indices()
 
     def add_intersection_with_interval(self, b_c_typ, branch_or_cusp, interval,
                                        with_sign=1):
         """Add to an intersection of a branch or cusp with an interval (or
         subtract if ``with_sign`` is -1).
         """
-        x = self.get_intersections_with_interval(interval)
-        idx = self._path_idx(b_c_typ, branch_or_cusp)
-        x[idx] += with_sign
+        self.add_intersection(b_c_typ, branch_or_cusp, INTERVAL, interval,
+                              with_sign)
+        self._invalidate_large_switch_indices()
 
     def add_intersection(self, b_c_typ, branch_or_cusp, b_i_typ, branch_or_interval, with_sign=1):
         """Add to an intersection of a small branch or cusp with a large branch or interval (or subtract if ``with_sign`` is -1).
         """
-        x = self.get_intersections(b_i_typ, branch_or_interval)
-        idx = self._path_idx(b_c_typ, branch_or_cusp)
-        x[idx] += with_sign
+        col = self._branch_or_interval_idx(b_i_typ, branch_or_interval)
+        row = self._path_idx(b_c_typ, branch_or_cusp)
+        self._paths.add_to_entry(row, col, with_sign)
+        self._invalidate_large_switch_indices()
 
     def add_interval_to_other_interval(self, added_interval, add_to_interval,
                                        with_sign=1):
         """Add to the intersection data of one interval to that of another
         interval.
         """
-        x1 = self.get_intersections_with_interval(add_to_interval)
+        idx = self._branch_or_interval_idx(INTERVAL, add_to_interval)
         x2 = self.get_intersections_with_interval(added_interval)
-        x1 += with_sign * x2
+        self._paths.add_to_column(idx, x2, with_sign)
+        self._invalidate_large_switch_indices()
 
     def set_small_switch_to_click(self, small_switch, click):
         """Set the click of a switch of the small train track.
         """
         idx = abs(small_switch)-1
         self._small_switch_to_click[idx] = np.sign(small_switch) * click
+        self._invalidate_large_switch_indices()
 
     def set_click_to_interval(self, click, side, interval):
         """Set the interval on the specified side of the click."""
         corrected_side = side if click > 0 else (side+1)%2
         self._click_to_interval[corrected_side][abs(click)-1] = np.sign(click)*interval
+        self._invalidate_large_switch_indices()
 
     def set_interval_to_click(self, interval, side, click):
         """Set the click on the specified side of the interval."""
         corrected_side = side if interval > 0 else (side+1)%2
         self._interval_to_click[corrected_side][abs(interval)-1] = np.sign(interval)*click
+        self._invalidate_large_switch_indices()
+
+    def _invalidate_large_switch_indices(self):
+        """Discard the cumulative intersection data at the large switches.
+
+        This has to be called whenever the paths, the intersections or the
+        clicks and intervals change.
+        """
+        self._large_switch_indices.clear()
 
     def paths_from_click(self, click):
         """Return the array of paths outgoing from a click.
         """
         total = self._get_zero_intersection_array()
+        small_tt = self._small_tt
         def add(typ, branch_or_cusp):
             if not self.is_branch_or_cusp_collapsed(typ, branch_or_cusp):
                 # TODO: collapsed cusp
-                idx = self._path_idx(typ, br)
+                idx = self._path_idx(typ, branch_or_cusp)
                 total[idx] += 1
         for sw in self.switches_in_click(click):
             for br in small_tt.outgoing_branches(sw):
@@ -584,24 +720,98 @@ class CarryingMap(object):
                 add(CUSP, cusp)
         return total
 
+    def _large_switch_index(self, large_switch):
+        """Return the intervals and clicks at a large switch together with
+        the cumulative intersections.
+
+        The data is computed on the first call and reused until the carrying
+        data changes.
+
+        INPUT:
+
+        - ``large_switch`` -- a switch of the large train track. Its sign does
+          not matter.
+
+        OUTPUT:
+
+        A 3-tuple:
+        - the list of intervals and clicks from left to right (looking from
+          the positive orientation of the large switch) as pairs ``(typ,
+          num)``, where ``typ`` is INTERVAL or CLICK
+        - a dictionary from these pairs to their position in the list
+        - the list of cumulative arrays: the k'th array is the sum of the
+          paths crossing the first k+1 intervals and clicks
+        """
+        large_switch = abs(large_switch)
+        if large_switch not in self._large_switch_indices:
+            items = []
+            interval = self.large_switch_to_extremal_interval(
+                large_switch, LEFT)
+            while interval != 0:
+                items.append((INTERVAL, interval))
+                click = self.interval_to_click(interval, RIGHT)
+                if click == 0:
+                    break
+                items.append((CLICK, click))
+                interval = self.click_to_interval(click, RIGHT)
+
+            cumulative = []
+            total = self._get_zero_intersection_array()
+            for typ, num in items:
+                if typ == INTERVAL:
+                    total = total + self.get_intersections_with_interval(num)
+                else:
+                    total = total + self.paths_from_click(num)
+                cumulative.append(total)
+
+            positions = {item: k for k, item in enumerate(items)}
+            self._large_switch_indices[large_switch] = \
+                (items, positions, cumulative)
+        return self._large_switch_indices[large_switch]
+
+    def _cumulative_intersections(self, large_switch, side, k):
+        """Return the sum of the paths crossing the first k intervals and
+        clicks at a large switch, counted from the specified side.
+        """
+        items, positions, cumulative = self._large_switch_index(large_switch)
+        if large_switch < 0:
+            side = (side+1) % 2
+        if k == 0:
+            return self._get_zero_intersection_array()
+        if side == LEFT:
+            return cumulative[k-1].copy()
+        n = len(items)
+        if k == n:
+            return cumulative[-1].copy()
+        return cumulative[-1] - cumulative[n-k-1]
+
+    def _click_or_interval_at(self, large_switch, side, k):
+        """Return the k'th interval or click at a large switch counted from
+        the specified side (starting from 0) as a pair ``(typ, num)``.
+        """
+        items, positions, cumulative = self._large_switch_index(large_switch)
+        if large_switch < 0:
+            side = (side+1) % 2
+        typ, num = items[k] if side == LEFT else items[len(items)-1-k]
+        return typ, np.sign(large_switch)*num
+
     def accumulate_intersections_at_large_switch(
         self, large_switch, start_side):
         """Iterator accumulating intersections with a switch of the large train track from the specified side.
+
+        The iterator yields triples ``(typ, num, total)``, where ``typ`` is INTERVAL or CLICK, ``num`` is the number of the interval or click, and ``total`` is the sum of the paths crossing it and the ones before it.
         """
-        total = self._get_zero_intersection_array()
-        interval = self.large_switch_to_extremal_interval(
-            large_sw, start_side)
-        while interval is not None:
-            total += self.get_intersections_with_interval(interval)
-            yield (INTERVAL, interval, total)
-            click = self.interval_to_click(interval, (start_side+1) % 2)
-            total += self.paths_from_click(click)
-            yield (CLICK, click, total)
-            interval = self.click_to_interval(click, (start_side+1) % 2)
-        # yield (None, None, total)
+        items, positions, cumulative = self._large_switch_index(large_switch)
+        for k in range(len(items)):
+            typ, num = self._click_or_interval_at(large_switch, start_side, k)
+            yield (typ, num,
+                   self._cumulative_intersections(
+                       large_switch, start_side, k+1))
 
     def paths_left_or_right_of_click_or_interval(self, typ, click_or_interval, side):
         """Return the array of outgoing paths to the left or right of the interval.
+
+        The paths are looked up in the cumulative intersections of the large switch, so the cost does not depend on the number of intervals and clicks.
         """
         if typ == INTERVAL:
             large_switch = self.interval_to_large_switch(click_or_interval)
@@ -609,12 +819,26 @@ class CarryingMap(object):
             large_switch = self.click_to_large_switch(click_or_interval)
         else:
             assert False
-        prev_total = self._get_zero_intersection_array()
-        for (current_typ, current_num, total) in self.accumulate_intersections_at_large_switch(
-            large_switch, side):
-            if typ == current_typ and current_num == click_or_interval:
-                return prev_total
-            prev_total = total
+        items, positions, cumulative = self._large_switch_index(large_switch)
+        k = positions[(typ, np.sign(large_switch)*click_or_interval)]
+        # positions are counted from the left side of the positively oriented
+        # large switch
+        positive_side = side if large_switch > 0 else (side+1) % 2
+        if positive_side == RIGHT:
+            k = len(items)-1-k
+        return self._cumulative_intersections(large_switch, side, k)
+
+    def paths_left_or_right_of_interval(self, interval, side):
+        """Return the array of outgoing paths to the left or right of the interval.
+        """
+        return self.paths_left_or_right_of_click_or_interval(
+            INTERVAL, interval, side)
+
+    def paths_left_or_right_of_click(self, click, side):
+        """Return the array of outgoing paths to the left or right of the click.
+        """
+        return self.paths_left_or_right_of_click_or_interval(
+            CLICK, click, side)
 
     def accumulate_outgoing_paths(self, large_switch, start_side):
         """Iterator accumulating the outgoing paths from a switch of the large train track, along outgoing branches starting from the specified side.
@@ -646,10 +870,25 @@ class CarryingMap(object):
         """Convert the position at a switch of the large train track to position in an interval.
         """
         # TODO: collapsed cusp
-        for (typ, num, interval_total) in self.accumulate_intersections_at_large_switch(
-            large_switch, side):
-            if all(interval_total >= paths):
-                return typ, num, interval_total-paths
+
+        # The cumulative intersections increase as we move away from the
+        # side, so the first interval or click where they reach
+        # ``paths_on_side`` can be found by a binary search.
+        items, positions, cumulative = self._large_switch_index(large_switch)
+        lo = 1
+        hi = len(items)+1
+        while lo < hi:
+            mid = (lo+hi) // 2
+            total = self._cumulative_intersections(large_switch, side, mid)
+            if is_smaller_or_equal(paths_on_side, total):
+                hi = mid
+            else:
+                lo = mid+1
+        if lo > len(items):
+            return None
+        typ, num = self._click_or_interval_at(large_switch, side, lo-1)
+        total = self._cumulative_intersections(large_switch, side, lo)
+        return typ, num, total-paths_on_side
 
     def position_in_interval_to_large_switch(self, interval, paths_on_side, side):
         """Convert the position at an interval to position at the large switch."""
@@ -662,7 +901,7 @@ class CarryingMap(object):
         """Convert the position at a switch of the large train track to position in an outgoing large branch."""
         # TODO: collapsed cusp
         for branch, total in self.accumulate_outgoing_paths(large_switch, side):
-            if all(total >= paths_on_side):
+            if is_smaller_or_equal(paths_on_side, total):
                 return paths_on_side-(total-self.get_intersections(BRANCH, branch))
 
     def find_interval_containing_large_cusp(self, large_cusp):
@@ -692,13 +931,13 @@ class CarryingMap(object):
                 break
 
         typ, num, diff = self.position_in_large_switch_to_interval(
-            large_switch, LEFT, total
+            large_switch, total, LEFT
         )
 
         if typ == INTERVAL:
             return num, diff
         elif typ == CLICK:
-            if any(diff > 0):
+            if not diff.is_zero():
                 raise ValueError("The large cusp is contained in a click, not in an interval!")
             else:
                 # otherwise the click is at the very beginning of the next interval
@@ -1043,6 +1282,11 @@ class CarryingMap(object):
     def isotope_switch_as_far_as_possible(self, switch):
         """Isotope a switch of the small train track in the positive direction
         as far as possible.
+
+        OUTPUT:
+
+        ``True`` if the switch was moved, ``False`` if it was blocked by a
+        collapsed branch or cusp path.
         """
         small_tt = self._small_tt
 
@@ -1052,12 +1296,9 @@ class CarryingMap(object):
             [self.path_coordinates(CUSP, cusp) 
             for cusp in small_tt.outgoing_cusps(switch)]
         )
-        # We make a copy, otherwise subtracting a path from itself would make min_path the zero array.
-        min_path = min_path.copy()
-
         # If no isotopy can be performed, there is nothing to do
-        if np.all(min_path == 0):
-            return
+        if min_path.is_zero():
+            return False
 
         # If there is non-trivial isotopy, then we begin by breaking up click at the beginning and updating the intersections.
         self.begin_switch_isotopy(switch)
@@ -1076,39 +1317,100 @@ class CarryingMap(object):
             self.append_path(CUSP, cusp, min_path, with_sign=-1)
 
         self.end_switch_isotopy(switch)
-
-    def isotope_switch_recursively(self, switch, stop_switch=None):
-        """Isotope a switch of the small train track as far as possible, by recursively isotoping other switches the original switch bumps into during the isotopy.
+        return True
+
+    def isotope_switch_recursively(self, switch, stop_switch=None,
+                                   max_num_moves=1000):
+        """Isotope a switch of the small train track as far as possible, by
+        also isotoping the switches it bumps into during the isotopy.
+
+        The switches waiting to be isotoped are kept in a queue. When a
+        switch is blocked by collapsed branches, the switches at the ends of
+        these branches are added to the queue, and the blocked switch is
+        added again after one of them has moved. A switch that is examined
+        is not examined again until a switch in front of it moves, so
+        between two moves every switch is examined at most once.
+
+        Moving a switch can unblock the switches behind it, and there is no
+        known quantity that decreases with the moves, so the loop is only
+        bounded by ``max_num_moves``: at most ``max_num_moves`` switches are
+        moved and at most ``max_num_moves + 1`` times the number of
+        switches are examined.
 
         INPUT:
+
         - ``switch`` -- the oriented switch which is isotoped forward
-        - ``stop_switch`` -- this switch is not allowed to be isotoped. If the recursive isotopy reaches this switch, the process stops.
+
+        - ``stop_switch`` -- this switch is not allowed to be isotoped. If
+          the isotopy reaches this switch, the switches behind it are not
+          isotoped further.
+
+        - ``max_num_moves`` -- the maximal number of switch isotopies. A
+          ValueError is raised if more isotopies are needed.
+
+        OUTPUT:
+
+        The number of switch isotopies performed. The total numbers of
+        isotopies and of examined switches are also recorded, see
+        :meth:`isotopy_statistics`.
         """
-        self.isotope_switch_as_far_as_possible(switch)
-        for cusp in self._small_tt.outgoing_cusps(switch):
-            if self.is_cusp_collapsed(cusp):
+        small_tt = self._small_tt
+        queue = deque([switch])
+        queued = set([switch])
+        settled = set()
+        # For each switch, the switches blocked by it.
+        blocked_by = {}
+        num_moves = 0
+        while queue:
+            sw = queue.popleft()
+            queued.discard(sw)
+            self._num_switch_visits += 1
+            if self.isotope_switch_as_far_as_possible(sw):
+                num_moves += 1
+                self._num_switch_moves += 1
+                if num_moves > max_num_moves:
+                    raise ValueError("The isotopy did not finish in %d "
+                                     "moves." % max_num_moves)
+                for behind in blocked_by.pop(sw, []):
+                    settled.discard(behind)
+                    if behind not in queued:
+                        queue.append(behind)
+                        queued.add(behind)
+            settled.add(sw)
+
+            if any(self.is_cusp_collapsed(cusp)
+                   for cusp in small_tt.outgoing_cusps(sw)):
                 # If a cusp is collapsed, there is no way to isotope further.
-                return
-        # If no cusp is collapsed, then we try to isotope the switches at the collapsed branches further.
-        for branch in self._small_tt.outgoing_branches(switch):
-            if self.is_branch_collapsed(branch):
-                next_sw = -self._small_tt.branch_endpoint(branch)
-                if abs(next_sw) == abs(stop_switch):
+                continue
+            # If no cusp is collapsed, then we try to isotope the switches
+            # at the collapsed branches further.
+            for branch in self.collapsed_branches_from_small_switch(sw):
+                next_sw = -small_tt.branch_endpoint(branch)
+                if stop_switch is not None and \
+                   abs(next_sw) == abs(stop_switch):
                     # We bumped into the stop_switch
-                    return
-                self.isotope_switch_recursively(self, next_sw)
+                    continue
+                blocked_by.setdefault(next_sw, set()).add(sw)
+                if next_sw not in settled and next_sw not in queued:
+                    queue.append(next_sw)
+                    queued.add(next_sw)
+        return num_moves
+
+    def isotopy_statistics(self):
+        """Return the number of switch isotopies performed and the number of
+        switches examined by :meth:`isotope_switch_recursively`.
+        """
+        return {'moves': self._num_switch_moves,
+                'visits': self._num_switch_visits}
 
-        # After all the switches are isotoped further, we isotope the original switch as far as possible one more time.
-        self.isotope_switch_as_far_as_possible(switch)
-        # TODO: Do we need to do more iterations? If so, is there a way to get stuck in an infinite loop?
- 
 
 def is_smaller_or_equal(array1, array2):
     """Decide if all entries of the first array are less than or equal the
     corresponding entries of the second array.
+
+    The arrays are SparseVectors, so only the nonzero entries are compared.
     """
-    assert array1.size == array2.size
-    return all(array2-array1 >= 0)
+    return array1.is_smaller_or_equal(array2)
 
 
 def is_equal(array1, array2):
@@ -1116,8 +1418,7 @@ def is_equal(array1, array2):
     second array.
 
     """
-    assert array1.size == array2.size
-    return all(array2 == array1)
+    return array1 == array2
 
 
 def shortest_path(paths):
@@ -1129,7 +1430,7 @@ def shortest_path(paths):
 
     INPUT:
 
-    - ``paths`` -- a list of paths (arrays of integers)
+    - ``paths`` -- a list of paths (SparseVectors)
     
     """
 
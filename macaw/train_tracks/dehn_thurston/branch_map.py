@@ -19,6 +19,7 @@ AUTHORS:
 # *****************************************************************************
 
 
+from collections import deque
 from macaw.constants import LEFT, RIGHT
 from numpy import sign
 
@@ -42,6 +43,13 @@ transform_rules = {
 
 
 class BranchMap(object):
+    """
+    A map assigning paths to branches.
+
+    The paths are stored in deques so that they can be extended efficiently
+    at both ends. For finding folds quickly, the signed branches are indexed
+    by the first branch of their paths (see subpath_candidates()).
+    """
     def __init__(self, branches):
         """
         EXAMPLES:
@@ -49,15 +57,21 @@ class BranchMap(object):
         >>> from macaw.train_tracks.dehn_thurston.branch_map import BranchMap
         >>> bm = BranchMap([2, -4, 5, -6, 1])
         >>> bm._branch_map[4]
-        [4]
+        deque([4])
         >>> bm._branch_map[2]
-        [2]
+        deque([2])
 
         """
-        self._branch_map = {abs(b): [abs(b)] for b in branches}
+        self._branch_map = {abs(b): deque([abs(b)]) for b in branches}
         # if 13 in self._branch_map.keys():
         #     self._branch_map[13] = [13, 19]
 
+        # dictionary from the first branches of paths to the set of signed
+        # branches whose path start with it. It is built when it is first
+        # needed and discarded whenever the paths change in other ways than
+        # by subtract().
+        self._first_branch_index = None
+
     def branch_list(self, branch):
         """
         EXAMPLES:
@@ -75,10 +89,27 @@ class BranchMap(object):
 
         """
         if branch > 0:
-            return self._branch_map[branch]
+            return list(self._branch_map[branch])
         else:
             return self.reversed_path(self._branch_map[-branch])
 
+    def set_branch_list(self, branch, path):
+        """
+        EXAMPLES:
+
+        >>> from macaw.train_tracks.dehn_thurston.branch_map import BranchMap
+        >>> bm = BranchMap([2, -4, 5, -6, 1])
+        >>> bm.set_branch_list(-2, [5, -4])
+        >>> bm.branch_list(2)
+        [4, -5]
+
+        """
+        if branch > 0:
+            self._branch_map[branch] = deque(path)
+        else:
+            self._branch_map[-branch] = deque(self.reversed_path(path))
+        self._first_branch_index = None
+
     def append(self, append_to, appended_branch):
         """
         EXAMPLES:
@@ -104,8 +135,10 @@ class BranchMap(object):
             self._branch_map[append_to].\
                 extend(self.branch_list(appended_branch))
         else:
-            self._branch_map[-append_to][0:0] =\
-                self.branch_list(-appended_branch)
+            # extendleft() adds the elements in reverse order
+            self._branch_map[-append_to].\
+                extendleft([-b for b in self.branch_list(appended_branch)])
+        self._first_branch_index = None
 
     @staticmethod
     def reversed_path(path):
@@ -124,7 +157,7 @@ class BranchMap(object):
     def path_on_other_side(path):
         return [BranchMap.opposite_branch(b) for b in path]
 
-    def which_side_to_start(self, branch, debug=False):
+    def which_side_to_start(self, branch):
         """
 
         OUTPUT:
@@ -134,8 +167,6 @@ class BranchMap(object):
         two.
         """
         ls = self.branch_list(branch)
-        if debug:
-            print "Branch map of branch:", ls
 
         if ls == [10, 19, -13, -4] or ls == [4, 13, -19, -10]:
             # These branch paths describe the new pants curve, so they should
@@ -166,7 +197,7 @@ class BranchMap(object):
 
     # return LEFT if ls[0] in [-9, 13, 1, 4, -4] else RIGHT
 
-    def transform(self, debug):
+    def transform(self):
         for b in self._branch_map.keys():
             ls = self._branch_map[b]
             new_ls = []
@@ -191,54 +222,58 @@ class BranchMap(object):
                     new_path = self.reversed_path(transform_rules[path])
                     new_ls.extend(new_path)
                     continue
-            self._branch_map[b] = new_ls
-        if debug:
-            print "Branch map before cancellations:", self._branch_map
-        self.perform_cancellations(debug)
-        if debug:
-            print "Branch map after cancellations:", self._branch_map
+            self._branch_map[b] = deque(new_ls)
+        self._first_branch_index = None
+        self.perform_cancellations()
+
+    def perform_cancellations(self):
+        """
+        EXAMPLES:
+
+        >>> from macaw.train_tracks.dehn_thurston.branch_map import BranchMap
+        >>> bm = BranchMap([1, 2])
+        >>> bm.set_branch_list(1, [3, 4, -4, 5, -5, -3, 7])
+        >>> bm.perform_cancellations()
+        >>> bm.branch_list(1)
+        [7]
 
-    def perform_cancellations(self, debug=False):
+        """
         for b in self._branch_map.keys():
-            ls = self._branch_map[b]
-            i = 0
-            while i < len(ls)-1:
-                if ls[i] == -ls[i+1]:
+            reduced = []
+            for x in self._branch_map[b]:
+                if len(reduced) > 0 and reduced[-1] == -x:
                     # remove the cancellation
-                    if debug:
-                        print "perform_cancellation(): remove", ls[i], ls[i+1]
-                    ls.pop(i)
-                    ls.pop(i)
-                    # step back one
-                    if i > 0:
-                        i -= 1
+                    reduced.pop()
                 else:
-                    # if no cancellation, proceed
-                    i += 1
-
-            # = list(transform_rules[tuple(self._branch_map[b])])
+                    reduced.append(x)
+            self._branch_map[b] = deque(reduced)
+        self._first_branch_index = None
 
     def replace_type_2_3(self):
         for b in self._branch_map.keys():
-            ls = self._branch_map[b]
+            ls = self.branch_list(b)
             if ls == [9, 19, -13, -9]:
-                self._branch_map[b] = [12]
+                self._branch_map[b] = deque([12])
             if ls == [9, 13, -19, -9]:
-                self._branch_map[b] = [-12]
+                self._branch_map[b] = deque([-12])
             if ls == [3, 13, -19, -3]:
-                self._branch_map[b] = [6]
+                self._branch_map[b] = deque([6])
             if ls == [3, 19, -13, -3]:
-                self._branch_map[b] = [-6]
+                self._branch_map[b] = deque([-6])
+        self._first_branch_index = None
 
     def standardize_values(self, branch_to_standard):
         for b in self._branch_map.keys():
-            ls = self._branch_map[b]
-            for i in range(len(ls)-1, -1, -1):
-                ls[i] = branch_to_standard[ls[i]]
-                if ls[i] == 13:
-                    ls.insert(i+1, -19)
-                if ls[i] == -13:
-                    ls.insert(i, 19)
+            new_ls = deque()
+            for x in self._branch_map[b]:
+                x = branch_to_standard[x]
+                if x == -13:
+                    new_ls.append(19)
+                new_ls.append(x)
+                if x == 13:
+                    new_ls.append(-19)
+            self._branch_map[b] = new_ls
+        self._first_branch_index = None
 
     def _branch_side(self, branch):
         sides = [[1, 4, 9, 13], [3, 7, 10, 19]]
@@ -248,19 +283,12 @@ class BranchMap(object):
                 return i
         return -1
 
-    def chop_paths(self, debug=False):
+    def chop_paths(self):
         """
         Chop all values of the branch_map to subpaths on the left and on the
         right side of the pants curve.
         """
-        if debug:
-            print "------------------"
-            print "BEGIN: chop_paths()"
-            print "------------------"
-
         for b in self._branch_map.keys():
-            if debug:
-                print "Branch:", b
             ls = self._branch_map[b]
             if len(ls) == 1:
                 self._branch_map[b] = [tuple(ls)]
@@ -272,27 +300,20 @@ class BranchMap(object):
                     # print "A"
                     path.append(ls[i])
                     prev_side = self._branch_side(ls[i])
-                    if debug:
-                        print "Side:", prev_side
                 else:
                     current_side = self._branch_side(ls[i])
-                    if debug:
-                        print "Side:", current_side
                     if current_side == prev_side:
                         # print "B"
                         path.append(ls[i])
                     else:
                         # print "C"
                         new_ls.append(tuple(path))
-                        if debug:
-                            print "Path:", path
                         path = [ls[i]]
                     prev_side = current_side
 
-            if debug:
-                print "Path:", path
             new_ls.append(tuple(path))
             self._branch_map[b] = new_ls
+        self._first_branch_index = None
 
     def is_subpath(self, branch1, branch2):
         a1 = self.branch_list(branch1)
@@ -304,13 +325,73 @@ class BranchMap(object):
                 return False
         return True
 
+    def _first_branch(self, branch):
+        """Return the first branch of the path of a signed branch, or None if
+        the path is empty.
+        """
+        ls = self._branch_map[abs(branch)]
+        if len(ls) == 0:
+            return None
+        return ls[0] if branch > 0 else -ls[-1]
+
+    def _add_to_index(self, branch):
+        for sb in [branch, -branch]:
+            self._first_branch_index.setdefault(
+                self._first_branch(sb), set()).add(sb)
+
+    def _remove_from_index(self, branch):
+        for sb in [branch, -branch]:
+            self._first_branch_index[self._first_branch(sb)].discard(sb)
+
+    def subpath_candidates(self, branch):
+        """Return the signed branches whose paths are initial subpaths of the
+        path of a signed branch.
+
+        Only the signed branches whose paths start with the same branch are
+        compared, which are looked up in an index.
+
+        EXAMPLES:
+
+        >>> from macaw.train_tracks.dehn_thurston.branch_map import BranchMap
+        >>> bm = BranchMap([1, 2, 3, 4])
+        >>> bm.set_branch_list(1, [5, 6, 7])
+        >>> bm.set_branch_list(2, [5, 6])
+        >>> bm.set_branch_list(3, [-7, -6])
+        >>> bm.set_branch_list(4, [5, 8])
+        >>> sorted(bm.subpath_candidates(1))
+        [1, 2]
+        >>> sorted(bm.subpath_candidates(-1))
+        [-1, 3]
+        >>> bm.subtract(1, 2)
+        >>> bm.branch_list(1)
+        [7]
+        >>> sorted(bm.subpath_candidates(3))
+        [-1, 3]
+
+        """
+        if self._first_branch_index is None:
+            self._first_branch_index = {}
+            for b in self._branch_map.keys():
+                self._add_to_index(b)
+        path = self.branch_list(branch)
+        candidates = list(self._first_branch_index.get(None, []))
+        if len(path) > 0:
+            candidates.extend(self._first_branch_index.get(path[0], []))
+        return [sb for sb in candidates if self.is_subpath(sb, branch)]
+
     def subtract(self, subtract_from, subtracted_branch):
         assert self.is_subpath(subtracted_branch, subtract_from)
-        n = len(self.branch_list(subtracted_branch))
-        if subtract_from > 0:
-            del self._branch_map[subtract_from][:n]
-        else:
-            del self._branch_map[-subtract_from][-n:]
+        n = len(self._branch_map[abs(subtracted_branch)])
+        ls = self._branch_map[abs(subtract_from)]
+        if self._first_branch_index is not None:
+            self._remove_from_index(abs(subtract_from))
+        for i in range(n):
+            if subtract_from > 0:
+                ls.popleft()
+            else:
+                ls.pop()
+        if self._first_branch_index is not None:
+            self._add_to_index(abs(subtract_from))
 
     def find_boundary_folds(self):
         """
@@ -329,14 +410,15 @@ class BranchMap(object):
             ls = self._branch_map[b]
             if ls[0] in boundaries:
                 fold_list.append((b, 1))
-                self._branch_map[b].pop(0)
+                self._branch_map[b].popleft()
             elif -ls[0] in boundaries:
                 fold_list.append((b, -1))
-                self._branch_map[b].pop(0)
+                self._branch_map[b].popleft()
             if ls[-1] in boundaries:
                 fold_list.append((-b, -1))
                 self._branch_map[b].pop()
             elif -ls[-1] in boundaries:
                 fold_list.append((-b, 1))
                 self._branch_map[b].pop()
+        self._first_branch_index = None
         return fold_list
@@ -21,8 +21,12 @@ AUTHORS:
 
 
 import numpy as np
+from collections import OrderedDict
 from macaw.train_tracks.train_track import TrainTrack, FoldError
 from macaw.constants import LEFT, RIGHT
+from macaw import tracing
+from macaw.serialization import DEHN_THURSTON_TT, write_header, \
+    read_header, check_end, write_ints, read_ints
 from .branch_map import BranchMap
 
 UP = 0
@@ -62,8 +66,7 @@ class DehnThurstonTT(TrainTrack):
             self._pants_branches = pants_branches
 
     @classmethod
-    def from_dehn_thurston_coordinates(cls, pants_decomposition, coordinates,
-                                       debug=False):
+    def from_dehn_thurston_coordinates(cls, pants_decomposition, coordinates):
         p = pants_decomposition
         # print coordinates
         n = p.num_inner_pants_curves()
@@ -100,13 +103,6 @@ class DehnThurstonTT(TrainTrack):
         measure = [abs(coordinates[c][1]) for c in ipc]
 
         for pant in range(p.num_pants()):
-            if debug:
-                print "---------------------------------"
-                print "Moving on to pants number ", pant
-                print "Current gluing_list:", gluing_list
-                print "Current measure", measure
-                print "Coordinates", coordinates
-
             # the three pants curves bounding the pair of pants
             # the number of the switch on each pants curve coincides with the
             # number of the pants curve
@@ -129,10 +125,6 @@ class DehnThurstonTT(TrainTrack):
             if any(x % 2 == 1 for x in pairs):
                 raise ValueError("The specified coordinates do not result in an integral lamination.")
             pairs = map(lambda x: x/2, pairs)
-            if debug:
-                print "m:", m
-                print "self_conn:", self_conn
-                print "pairs:", pairs
 
             # NOT_DECIDED = -2
             # NO_SELF_CONN = -1
@@ -151,8 +143,6 @@ class DehnThurstonTT(TrainTrack):
             # allow including a self-connecting branch
             if self_conn_idx == -1:
                 for i in range(3):
-                    if debug:
-                        print i, c
                     if pairs[(i+1) % 3] == 0 and abs(c) in ipc and \
                        p.elementary_move_type(c) == 2:
                         # if the type is first move, then the self-connecting
@@ -160,9 +150,6 @@ class DehnThurstonTT(TrainTrack):
                         self_conn_idx = i
                         break
 
-            if debug:
-                print "self_conn_idx:", self_conn_idx
-
             added_branches = []
 
             # Adding pairing branches
@@ -170,18 +157,10 @@ class DehnThurstonTT(TrainTrack):
                 # connecting pants curve i with i+1
                 c1 = curves[i]
                 c2 = curves[(i+1) % 3]
-                if debug:
-                    print
-                    print "Adding pairing branches..."
-                    print "i:", i
-                    print "c1:", c1
-                    print "c2:", c2
                 if c1 in bpc or c2 in bpc or self_conn_idx != -1 and \
                    i == (self_conn_idx+1) % 3:
                     # no branches if one of the curves in a boundary or there
                     # is a blocking self-connecting branch
-                    if debug:
-                        print "Not adding it."
                     continue
 
                 if coordinates[abs(c1)][1] >= 0:
@@ -204,9 +183,6 @@ class DehnThurstonTT(TrainTrack):
 
             # Adding the self-connecting branch if exists
             if self_conn_idx != -1:
-                if debug:
-                    print
-                    print "Adding self-connecting branch..."
                 c = curves[self_conn_idx]
                 switch = np.sign(c)*(ipc.index(abs(c))+1)
                 if coordinates[abs(c)][1] >= 0:
@@ -228,10 +204,6 @@ class DehnThurstonTT(TrainTrack):
                 next_branch += 1
                 measure.append(abs(self_conn[self_conn_idx]))
 
-        if debug:
-            print "Gluing list", gluing_list
-            print "Measure", measure
-
         return cls(gluing_list, measure, range(1, n+1))
 
 
@@ -244,6 +216,42 @@ class DehnThurstonTT(TrainTrack):
             return DehnThurstonTT(self.gluing_list()(),
                                   pants_branches=list(self._pants_branches))
 
+    def to_bytes(self):
+        """Return a compact binary encoding of the train track and its
+        pants branches.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.dehn_thurston.dehn_thurston_tt import DehnThurstonTT
+            >>> tt = DehnThurstonTT([[1, -3], [-1, 3], [2], [-2]], [2, 2, 5], [1, 2])
+            >>> tt2 = DehnThurstonTT.from_bytes(tt.to_bytes())
+            >>> tt2.gluing_list(), tt2.measure(), tt2._pants_branches
+            ([[1, -3], [-1, 3], [2], [-2]], [2, 2, 5], [1, 2])
+
+        """
+        buf = bytearray()
+        write_header(buf, DEHN_THURSTON_TT)
+        self._write(buf)
+        return bytes(buf)
+
+    def _write(self, buf):
+        super(DehnThurstonTT, self)._write(buf)
+        write_ints(buf, self._pants_branches)
+
+    @classmethod
+    def _read(cls, data, pos):
+        tt, pos = super(DehnThurstonTT, cls)._read(data, pos)
+        tt._pants_branches, pos = read_ints(data, pos)
+        return tt, pos
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a train track from the output of :meth:`to_bytes`."""
+        data, pos = read_header(data, DEHN_THURSTON_TT)
+        tt, pos = cls._read(data, pos)
+        check_end(data, pos)
+        return tt
+
     def get_turning(self, switch):
         """
 
@@ -300,6 +308,12 @@ class DehnThurstonTT(TrainTrack):
         """
         return self._pants_branches[abs(switch)-1]
 
+    def _set_pants_branch(self, switch, branch):
+        """Set the pants branch at a switch, recording the change in the
+        journal (see :meth:`checkpoint`)."""
+        self._record('_pants_branches', abs(switch)-1)
+        self._pants_branches[abs(switch)-1] = abs(branch)
+
     def transverse_measure(self, switch):
         return self.measure_on_switch(switch) -\
             self.branch_measure(self.pants_branch_on_switch(switch))
@@ -355,8 +369,14 @@ class DehnThurstonTT(TrainTrack):
         return (nbottom-1, ntop-1) if turning == LEFT else (ntop-1, nbottom-1)
 
     def unzip_fold_general_twist(self, pants_curve, twists_on_left,
-                                 twists_on_right, debug=False):
+                                 twists_on_right, peel_outcomes=None):
         """
+        INPUT:
+
+        - ``peel_outcomes`` -- (default: None) if a list is given, the sides
+          returned by the peelings performed during unzipping are appended
+          to it
+
         EXAMPLES:
 
         We only twist in the good direction::
@@ -435,8 +455,6 @@ class DehnThurstonTT(TrainTrack):
 
             good_twists_on_fixed_side = twists_on_right % nright
             good_twists_on_other_side = twists_on_left - num_rotations * nleft
-            nfixed_side = nright
-            nother_side = nleft
         else:
             # we fix the twists so that there is (-nleft-1) to 0 twists on the
             # left
@@ -453,87 +471,57 @@ class DehnThurstonTT(TrainTrack):
             # folding is needed, and negative if the twists are bad (unzipping
             # is
             # needed)
-            nfixed_side = nleft
-            nother_side = nright
-
-        if debug:
-            print
-            print "----------------------------------------"
-            print "BEGIN: unzip_fold_general_twist()"
-            print "----------------------------------------"
-            print "Turning: ", 'LEFT' if turning == LEFT else 'RIGHT'
-            print "Switch: ", switch
-            print "Branches on left: ", nleft
-            print "Branches on right: ", nright
-            print "Branches on fixed side: ", nfixed_side
-            print "Branches on other side: ", nother_side
-            print "Number of rotations: ", num_rotations
-            print "Twists on left (original): ", twists_on_left
-            print "Twists on right (original): ", twists_on_right
-            print "Good twists on fixed side: ", good_twists_on_fixed_side
-            print "Good twists on other side: ", good_twists_on_other_side
-
-        # doing folds on the fixed side
-        for i in range(good_twists_on_fixed_side):
-            # print "Fold fixed side"
-            if debug:
-                print i, self.gluing_list()
-                print i, self.measure()
-
-            self.fold(-switch, 1, 0, start_side=turning)
-
-        if debug:
-            print "After folding on fixed side:", self.gluing_list()
-            print "After folding on fixed side:", self.measure()
-
-        # doing folds or unzips on the other side. This involves the positive
-        # direction of ``switch``.
-        if good_twists_on_other_side >= 0:
-            # if there are only good twists, we fold
-            for i in range(good_twists_on_other_side):
-                self.fold(switch, 1, 0, start_side=turning)
-        else:
-            # otherwise we unzip
-
-            while good_twists_on_other_side < 0:
-                if debug:
-                    print self.gluing_list()
-                    print self.measure()
-
-                pants_branch = self.outgoing_branch(-switch, 0,
-                                                    start_side=turning)
-                side_branch = self.outgoing_branch(switch, 0,
-                                                   start_side=(turning+1) % 2)
-
-                peeled_side = self.peel(switch, side=(turning+1) % 2,
-                                        debug=debug)
-                good_twists_on_other_side += 1
-                if debug:
-                    print "After peeling:"
-                    print self.gluing_list()
-                    print self.measure()
-                    print "Peeled side:", peeled_side
-                    print "Remaining bad twist:", -good_twists_on_other_side
-
-                if peeled_side == turning:
-                    # we unzipped into the pants curve, there is nothing to do
-                    pass
 
-                else:
-                    # we unzip into a branch on the other side
-
-                    if debug:
-                        print self.gluing_list()
-                        print self.measure()
-                        print self._branch_endpoint
-                        print side_branch, pants_branch
-                    self.fold_by_branch_labels(-side_branch, pants_branch)
-                    for i in range(-good_twists_on_other_side):
-                        self.fold(switch, 1, 0, start_side=(turning+1) % 2)
-
-                    self.swap_branch_numbers(-side_branch, pants_branch)
-                    self.change_switch_orientation(switch)
-                    break
+        trace = tracing.active
+        if trace is not None:
+            trace.begin('general_twist', switch=switch,
+                        twists_on_left=twists_on_left,
+                        twists_on_right=twists_on_right,
+                        measure_before=self.measure())
+
+        try:
+            # doing folds on the fixed side
+            for i in range(good_twists_on_fixed_side):
+                # print "Fold fixed side"
+                self.fold(-switch, 1, 0, start_side=turning)
+
+            # doing folds or unzips on the other side. This involves the positive
+            # direction of ``switch``.
+            if good_twists_on_other_side >= 0:
+                # if there are only good twists, we fold
+                for i in range(good_twists_on_other_side):
+                    self.fold(switch, 1, 0, start_side=turning)
+            else:
+                # otherwise we unzip
+
+                while good_twists_on_other_side < 0:
+                    pants_branch = self.outgoing_branch(-switch, 0,
+                                                        start_side=turning)
+                    side_branch = self.outgoing_branch(switch, 0,
+                                                       start_side=(turning+1) % 2)
+
+                    peeled_side = self.peel(switch, side=(turning+1) % 2)
+                    if peel_outcomes is not None:
+                        peel_outcomes.append(peeled_side)
+                    good_twists_on_other_side += 1
+
+                    if peeled_side == turning:
+                        # we unzipped into the pants curve, there is nothing to do
+                        pass
+
+                    else:
+                        # we unzip into a branch on the other side
+                        self.fold_by_branch_labels(-side_branch, pants_branch)
+                        for i in range(-good_twists_on_other_side):
+                            self.fold(switch, 1, 0, start_side=(turning+1) % 2)
+
+                        self.swap_branch_numbers(-side_branch, pants_branch)
+                        self.change_switch_orientation(switch)
+                        break
+        finally:
+            if trace is not None:
+                trace.end(num_rotations=num_rotations,
+                          measure_after=self.measure())
 
     def unzip_fold_pants_twist(self, pants_curve, power=1):
         r"""
@@ -612,7 +600,7 @@ class DehnThurstonTT(TrainTrack):
             return sw
         return -sw
 
-    def unzip_fold_first_move(self, switch, inverse=False, debug=False):
+    def unzip_fold_first_move(self, switch, inverse=False):
         r"""
         TESTS::
 
@@ -689,121 +677,85 @@ class DehnThurstonTT(TrainTrack):
             # implementation of the inverse move at some point as attempted
             # below.
             for i in range(3):
-                self.unzip_fold_first_move(switch, debug=debug)
+                self.unzip_fold_first_move(switch)
             bdy_switch = self.torus_boundary_switch(switch)
             self.unzip_fold_pants_twist(bdy_switch, -1)
             return
 
         assert self.elem_move_type(switch) == 1
         switch = self.orientation_of_switch_first_move(switch)
-        # debug = True
-        if debug:
-            print "--------------------------------"
-            print "BEGIN: unzip_fold_first_move()"
-            print "--------------------------------"
-            print "Initial gluing list:", self.gluing_list()
-            print "Measure:", self.measure()
-            print "Switch:", switch
-            print "Inverse:", inverse
-        turning = self.get_turning(switch)
-        twist_sign = -1 if inverse else 1
-        bdy_switch = self.torus_boundary_switch(switch)
+        trace = tracing.active
+        if trace is not None:
+            trace.begin('first_move', switch=switch,
+                        measure_before=self.measure())
+        case = lamb23 = peeled_side = None
+        try:
+            turning = self.get_turning(switch)
+            twist_sign = -1 if inverse else 1
+            bdy_switch = self.torus_boundary_switch(switch)
 
-        lamb23 = len(self.outgoing_branches(switch)) == 3
-
-        if debug:
-            print "Turning:", "LEFT" if turning == LEFT else "RIGHT"
-            print "Lambda_23" if lamb23 else "Lambda_11"
-            print "bdy_switch", bdy_switch
-
-        peeled_side = self.peel(switch, side=(turning+1) % 2, debug=debug)
-        if debug:
-            print "Peeled side:", "LEFT" if peeled_side == LEFT else "RIGHT"
-        if peeled_side == (turning+1) % 2:
-            self.peel(switch, side=(turning+1) % 2, debug=debug,
-                      preferred_peeled_side=turning)
-
-        if debug:
-            print "Gluing list:", self.gluing_list()
-            print "Measure:", self.measure()
-            print "Outgoing branches in positive direction:", \
-                self.outgoing_branches(switch)
-            print "Outgoing branches in negative direction:", \
-                self.outgoing_branches(-switch)
-
-        # The inverse works in cases A, B, E
-        # Doesn't work for C, D, F, G, and probably H
-
-        if peeled_side == turning:
-            if lamb23:
-                if (turning == LEFT) == (not inverse):
-                    if debug:
-                        print "A"
-                    self.fold(-switch, 1, 2, start_side=turning)
-                else:
-                    if debug:
-                        print "B"
-                    self.fold(switch, 1, 0, (turning+1) % 2)
-                    self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
-            else:
-                if (turning == LEFT) == (not inverse):
-                    if debug:
-                        print "C"
-                        print "Gluing list:", self.gluing_list()
-                        print "Measure:", self.measure()
-                    self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
-                    if debug:
-                        print "Gluing list:", self.gluing_list()
-                        print "Measure:", self.measure()
-                    self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
-                    self.fold_left_of_pants_curve(bdy_switch, 2, 1, inverse)
-                else:
-                    if debug:
-                        print "D"
-                    self.unzip_fold_general_twist(bdy_switch, 2*twist_sign, 0)
-                    if debug:
-                        print self.gluing_list()
-                    self.fold_left_of_pants_curve(bdy_switch, 3, 2, inverse)
-                    if debug:
-                        print self.gluing_list()
-                    self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
-                    if debug:
-                        print self.gluing_list()
+            lamb23 = len(self.outgoing_branches(switch)) == 3
 
-        else:
-            if lamb23:
-                if (turning == LEFT) == (not inverse):
-                    if debug:
-                        print "E"
-                    self.fold(-switch, 0, 1, turning)
+            peeled_side = self.peel(switch, side=(turning+1) % 2)
+            if peeled_side == (turning+1) % 2:
+                self.peel(switch, side=(turning+1) % 2,
+                          preferred_peeled_side=turning)
+
+            # The inverse works in cases A, B, E
+            # Doesn't work for C, D, F, G, and probably H
+
+            if peeled_side == turning:
+                if lamb23:
+                    if (turning == LEFT) == (not inverse):
+                        case = 'A'
+                        self.fold(-switch, 1, 2, start_side=turning)
+                    else:
+                        case = 'B'
+                        self.fold(switch, 1, 0, (turning+1) % 2)
+                        self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
                 else:
-                    if debug:
-                        print "F"
-                    self.fold(switch, 1, 0, (turning+1) % 2)
-                    self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
+                    if (turning == LEFT) == (not inverse):
+                        case = 'C'
+                        self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
+                        self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
+                        self.fold_left_of_pants_curve(bdy_switch, 2, 1, inverse)
+                    else:
+                        case = 'D'
+                        self.unzip_fold_general_twist(bdy_switch, 2*twist_sign, 0)
+                        self.fold_left_of_pants_curve(bdy_switch, 3, 2, inverse)
+                        self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
+
             else:
-                if (turning == LEFT) == (not inverse):
-                    if debug:
-                        print "G"
-                    self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
-                    self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
-                    self.fold_left_of_pants_curve(bdy_switch, 3, 2, inverse)
+                if lamb23:
+                    if (turning == LEFT) == (not inverse):
+                        case = 'E'
+                        self.fold(-switch, 0, 1, turning)
+                    else:
+                        case = 'F'
+                        self.fold(switch, 1, 0, (turning+1) % 2)
+                        self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
                 else:
-                    if debug:
-                        print "H"
-                    self.unzip_fold_general_twist(bdy_switch, 2*twist_sign, 0)
-                    if debug:
-                        print "Gluing list:", self.gluing_list()
-                        print "Measure:", self.measure()
-
-                    self.fold_left_of_pants_curve(bdy_switch, 4, 3, inverse)
-                    self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
-
-        # if the switch was initually left turning, then it become
-        # right-turning and vica versa. This makes updating the pants branch
-        # easy.
-        self._pants_branches[abs(switch)-1] = \
-            abs(self.outgoing_branch(switch, 0, (turning+1) % 2))
+                    if (turning == LEFT) == (not inverse):
+                        case = 'G'
+                        self.unzip_fold_general_twist(bdy_switch, twist_sign, 0)
+                        self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
+                        self.fold_left_of_pants_curve(bdy_switch, 3, 2, inverse)
+                    else:
+                        case = 'H'
+                        self.unzip_fold_general_twist(bdy_switch, 2*twist_sign, 0)
+                        self.fold_left_of_pants_curve(bdy_switch, 4, 3, inverse)
+                        self.fold_left_of_pants_curve(bdy_switch, 0, 1, inverse)
+
+            # if the switch was initually left turning, then it become
+            # right-turning and vica versa. This makes updating the pants branch
+            # easy.
+            self._set_pants_branch(
+                switch, self.outgoing_branch(switch, 0, (turning+1) % 2))
+        finally:
+            if trace is not None:
+                trace.end(case=case, lambda23=lamb23,
+                          peeled_side=peeled_side,
+                          measure_after=self.measure())
 
     def fold_left_of_pants_curve(self, bdy_switch, folded_branch_index,
                                  fold_onto_index, inverse=False):
@@ -914,7 +866,7 @@ class DehnThurstonTT(TrainTrack):
             branch_to_standard[-b] = -branch_to_standard[b]
         return branch_to_standard
 
-    def construct_general_twist_data(self, boundary_folds, debug=False):
+    def construct_general_twist_data(self, boundary_folds):
         """
 
         INPUT:
@@ -929,32 +881,19 @@ class DehnThurstonTT(TrainTrack):
         t_right are the amount of twisting on the left and right side of the
         curves
         """
-        if debug:
-            print "-------------------------------"
-            print "BEGIN: construct_general_twist_data()"
-            print "-------------------------------"
         ret = {}
         for branch, direction in boundary_folds:
             switch = self.branch_endpoint(-branch)
             turning = self.get_turning(switch)
-            if debug:
-                print "Branch:", branch
-                print "Direction:", direction
-                print "switch:", switch
-                print "turning:", turning
             if abs(switch) not in ret.keys():
                 ret[abs(switch)] = [0, 0]
             if (switch > 0) == (turning == RIGHT):
-                if debug:
-                    print "twisting added on the left"
                 ret[abs(switch)][LEFT] += direction
             else:
-                if debug:
-                    print "twisting added on the right"
                 ret[abs(switch)][RIGHT] += direction
         return ret
 
-    def unzip_fold_second_move(self, switch, debug=False):
+    def unzip_fold_second_move(self, switch):
         """
 
         TESTS::
@@ -1002,149 +941,385 @@ class DehnThurstonTT(TrainTrack):
             >>> tt.measure()
             [3, 2, 1, 11, 20, 6, 1, 6, 2]
 
+        TESTS:
+
+        Moves with the same local combinatorics reuse the branch map
+        computations of earlier moves, which does not change the result::
+
+            >>> from macaw.train_tracks.dehn_thurston import dehn_thurston_tt
+            >>> gluing_list = [[-9, 1], [2, -1], [4, 8, 7, 6, -7], [-4, -2, 3, 9, -3], [-8, -5], [-6, 5]]
+            >>> measure = [1, 2, 8, 1, 14, 6, 4, 6, 2]
+            >>> dehn_thurston_tt.clear_second_move_kernels()
+            >>> tt1 = DehnThurstonTT(gluing_list, measure)
+            >>> tt1.unzip_fold_second_move(2)
+            >>> tt2 = DehnThurstonTT(gluing_list, measure)
+            >>> tt2.unzip_fold_second_move(2)
+            >>> stats = dehn_thurston_tt.second_move_kernel_statistics()
+            >>> stats['hits'], stats['misses'], stats['entries']
+            (1, 1, 1)
+            >>> tt1.gluing_list() == tt2.gluing_list()
+            True
+            >>> tt1.measure() == tt2.measure()
+            True
+
+        Whether the kernel was found in the cache is recorded by the
+        tracer::
+
+            >>> from macaw import tracing
+            >>> tt3 = DehnThurstonTT(gluing_list, measure)
+            >>> with tracing.trace() as tracer:
+            ...     tt3.unzip_fold_second_move(2)
+            >>> event = tracer.events()[-1]
+            >>> event['name'], event['args']['cached_kernel']
+            ('second_move', True)
+            >>> event['args']['measure_after'] == tt1.measure()
+            True
 
         """
-        # debug=True
         assert self.elem_move_type(switch) == 2
-        branch_to_standard = self.standardize_neighboring_branches(switch)
-        if debug:
-            print "branch_to_standard:", branch_to_standard
-        turning = self.get_turning(switch)
+        trace = tracing.active
+        if trace is not None:
+            trace.begin('second_move', switch=switch,
+                        measure_before=self.measure())
+        # The outcomes of the peelings are the only measure-dependent
+        # decisions in the unzipping. Together with the local combinatorial
+        # type they determine the branch map after unzipping.
+        peel_outcomes = []
+        fold_sequence = []
+        cached = cached_folds = None
+        try:
+            branch_to_standard = self.standardize_neighboring_branches(switch)
+            turning = self.get_turning(switch)
+            local_type = self._second_move_local_type(switch, branch_to_standard)
+
+            bm = BranchMap(branch_to_standard.keys())
+            bm.standardize_values(branch_to_standard)
+
+            # first we unzip once on the left and once on the right if the switch
+            # is left-turning to reveal any tricky branches
+
+            if turning == LEFT:
+                for side in [LEFT, RIGHT]:
+                    current_switch = switch if side == LEFT else -switch
+                    b = self.outgoing_branch(-current_switch, 0, RIGHT)
+                    if self.branch_endpoint(b) == -current_switch:
+                        # b is a self-connecting branch
+                        peel_outcomes.append(
+                            self.peel(current_switch, LEFT, bm))
+
+            for step in [0, 1]:
+                current_switch = switch if step == 0 else -switch
+                while True:
+                    b1 = self.outgoing_branch(current_switch, 0, turning)
+                    b2 = self.outgoing_branch(-current_switch, 0, (turning+1) % 2)
+
+                    if bm.which_side_to_start(b1) != step or \
+                       bm.which_side_to_start(b2) != step:
+                        break
+
+                    peel_outcomes.append(
+                        self.peel(current_switch, turning, bm))
+
+            kernel = None
+            if local_type is not None:
+                # the order of the folds found by pop_fold() depends on the
+                # order in which the branches are listed in the branch map
+                branch_order = tuple(branch_to_standard[b]
+                                     for b in bm._branch_map.keys())
+                key = (local_type, branch_order, tuple(peel_outcomes))
+                kernel = _second_move_kernels.get(key)
+
+            cached = kernel is not None
+            if not cached:
+                bm.chop_paths()
+                bm.transform()
+                folds = bm.find_boundary_folds()
+                # make replacements in type 2 and type 3 cases
+                bm.replace_type_2_3()
+                kernel = SecondMoveKernel(bm, folds, branch_to_standard)
+                if local_type is not None:
+                    _second_move_kernels[key] = kernel
+            else:
+                folds = kernel.boundary_folds(branch_to_standard)
+
+            general_twist_data = self.construct_general_twist_data(folds)
+            twist_outcomes = []
+            for sw in general_twist_data.keys():
+                left_twists, right_twists = general_twist_data[sw]
+                self.unzip_fold_general_twist(sw, left_twists, right_twists,
+                                              peel_outcomes=twist_outcomes)
+
+            twist_outcomes = tuple(twist_outcomes)
+            if twist_outcomes in kernel.folds:
+                # The same local picture has been seen before, so we simply redo
+                # the folds that were found the first time.
+                fold_sequence, pants_branch = kernel.folds[twist_outcomes]
+                for folded, fold_onto in fold_sequence:
+                    self.fold_by_branch_labels(
+                        kernel.to_branch(folded, branch_to_standard),
+                        kernel.to_branch(fold_onto, branch_to_standard))
+                pants_branch = kernel.to_branch(pants_branch, branch_to_standard)
+                self._set_pants_branch(switch, pants_branch)
+                cached_folds = True
+                return
+
+            if cached:
+                # the branch map was not computed, because the kernel was found
+                # in the cache
+                bm = kernel.branch_map(branch_to_standard)
 
-        bm = BranchMap(branch_to_standard.keys())
-        if debug:
-            print "Turning: ", "LEFT" if turning == LEFT else "RIGHT"
-            print "Branch map:", bm._branch_map
-        bm.standardize_values(branch_to_standard)
-        if debug:
-            print "Branch map:", bm._branch_map
-
-        # first we unzip once on the left and once on the right if the switch
-        # is left-turning to reveal any tricky branches
-
-        if turning == LEFT:
-            for side in [LEFT, RIGHT]:
-                current_switch = switch if side == LEFT else -switch
-                b = self.outgoing_branch(-current_switch, 0, RIGHT)
-                if self.branch_endpoint(b) == -current_switch:
-                    # b is a self-connecting branch
-                    self.peel(current_switch, LEFT, bm, debug=debug)
-
-        for step in [0, 1]:
-            current_switch = switch if step == 0 else -switch
-            if debug:
-                print "Step:", step
-                print "current_switch", current_switch
             while True:
-                b1 = self.outgoing_branch(current_switch, 0, turning)
-                b2 = self.outgoing_branch(-current_switch, 0, (turning+1) % 2)
-
-                if debug:
-                    print "Branches to compare:", b1, b2
-                    print "They start to sides:", bm.which_side_to_start(b1), \
-                        bm.which_side_to_start(b2)
-
-                if bm.which_side_to_start(b1) != step or \
-                   bm.which_side_to_start(b2) != step:
-                    if debug:
-                        print "We have finished unzipping on this side."
-                        if step == 0:
-                            print "Moving on to Step 1."
-                        else:
-                            print "Unzipping completed!"
+                fold = pop_fold(self, bm)
+                if fold is None:
                     break
+                fold_sequence.append(fold)
 
-                if debug:
-                    print "Peeling..."
-                self.peel(current_switch, turning, bm, debug=debug)
-                if debug:
-                    print "Gluing list after peeling:", self.gluing_list()
-                    print "Measure after peeling:", self.measure()
-
-        bm.chop_paths(debug)
-        if debug:
-            print "Branch map after chopping paths:", bm._branch_map
-        bm.transform(debug)
-        if debug:
-            print "Branch map after transforming (isotopy):", bm._branch_map
-        folds = bm.find_boundary_folds()
-        if debug:
-            print "Boundary folds:", folds
-        general_twist_data = self.construct_general_twist_data(folds, debug)
-        if debug:
-            print general_twist_data
-            print "Gluing list before folding boundaries:", self.gluing_list()
-            print "Measure before folding boundaries:", self.measure()
-        for sw in general_twist_data.keys():
-            left_twists, right_twists = general_twist_data[sw]
-            if debug:
-                print "Switch:", sw
-                print "Left twists:", left_twists
-                print "Right twists:", right_twists
-            self.unzip_fold_general_twist(sw, left_twists, right_twists,
-                                          debug=debug)
-            if debug:
-                print "Gluing list after folding boundaries:",\
-                    self.gluing_list()
-                print "Measure after folding boundaries:", self.measure()
-        # make replacements in type 2 and type 3 cases
-        bm.replace_type_2_3()
-
-        while True:
-            if debug:
-                print "---------------------"
-                print "Finding folds"
-                print "---------------------"
-                print "Branch map before folding", bm._branch_map
-                print "Gluing list:", self.gluing_list()
-            success = pop_fold(self, bm, debug)
-            if success is False:
-                if debug:
-                    print "No fold found."
-                    print "Stopping..."
-                break
-            # self.fold_by_branch_labels(folded_branch, fold_onto_branch)
-            if debug:
-                print "Gluing list after fold:", self.gluing_list()
-                print "Measure after fold:", self.measure()
-                print "Branch map after folding", bm._branch_map
-                print "---------------------"
-
-        for b in bm._branch_map.keys():
-            if bm.branch_list(b) == [13, -19] or\
-               bm.branch_list(b) == [19, -13]:
-                self._pants_branches[abs(switch)-1] = abs(b)
-                break
-        else:
-            assert False
+            for b in bm._branch_map.keys():
+                if bm.branch_list(b) == [13, -19] or\
+                   bm.branch_list(b) == [19, -13]:
+                    self._set_pants_branch(switch, b)
+                    break
+            else:
+                assert False
+
+            kernel.folds[twist_outcomes] = (
+                [(branch_to_standard[folded], branch_to_standard[fold_onto])
+                 for folded, fold_onto in fold_sequence],
+                branch_to_standard[b]
+            )
+            cached_folds = False
+        finally:
+            if trace is not None:
+                trace.end(cached_kernel=cached, cached_folds=cached_folds,
+                          peel_outcomes=peel_outcomes,
+                          num_folds=len(fold_sequence),
+                          measure_after=self.measure())
+
+    def _second_move_local_type(self, switch, branch_to_standard):
+        """Return the combinatorial type of the neighborhood of a switch
+        relevant for the second elementary move.
+
+        The type records the gluing pattern of the switches incident to the
+        branches named by ``branch_to_standard``, with these branches
+        replaced by their standard names. Other branches are recorded only by
+        whether they are pants branches. Two switches with the same type
+        differ only in the measure and in the naming of branches and
+        switches.
+
+        OUTPUT:
 
+        a hashable object, or None if the standard naming is not injective,
+        in which case the second move is not cached
 
-def pop_fold(train_track, branch_map, debug=False):
+        TESTS::
+
+            >>> from macaw.train_tracks.dehn_thurston.dehn_thurston_tt import DehnThurstonTT
+            >>> tt1 = DehnThurstonTT([[1, 6, 5], [-1, 4, -6], [-5, -4, 2], [-8, -7, -2], [7, 9, 3], [-9, 8, -3]], [100, 20, 30, 7, 7, 4, 7, 7, 1])
+            >>> tt2 = DehnThurstonTT([[1, 5, 6], [-1, 4, -5], [-6, -4, 2], [-8, -7, -2], [7, 9, 3], [-9, 8, -3]], [100, 20, 30, 7, 4, 7, 7, 7, 1])
+            >>> d1 = tt1.standardize_neighboring_branches(2)
+            >>> d2 = tt2.standardize_neighboring_branches(2)
+            >>> t1 = tt1._second_move_local_type(2, d1)
+            >>> t1 == tt2._second_move_local_type(2, d2)
+            True
+            >>> t1 == tt1._second_move_local_type(-2, tt1.standardize_neighboring_branches(-2))
+            False
+
+        """
+        if len(set(branch_to_standard.values())) != len(branch_to_standard):
+            return None
+        standard_to_branch = {branch_to_standard[b]: b
+                              for b in branch_to_standard}
+
+        # numbering the switches in the order they are encountered, with the
+        # orientation they are first encountered
+        switches = [switch]
+        for label in sorted(standard_to_branch.keys()):
+            sw = self.branch_endpoint(standard_to_branch[label])
+            if abs(sw) not in [abs(x) for x in switches]:
+                switches.append(sw)
+
+        def encode(sw, branch):
+            if branch in branch_to_standard:
+                return branch_to_standard[branch]
+            if abs(branch) == self.pants_branch_on_switch(sw):
+                return 'p'
+            return '*'
+
+        return tuple(
+            (self.get_turning(sw),
+             tuple(encode(sw, b) for b in self.outgoing_branches(sw)),
+             tuple(encode(sw, b) for b in self.outgoing_branches(-sw)))
+            for sw in switches)
+
+
+class SecondMoveKernel(object):
+    """The part of a second elementary move that only depends on the local
+    combinatorics.
+
+    After the unzipping phase of the second move, the branch map, the folds
+    about the neighboring pants curves and (up to the outcomes of the peelings
+    in the twists about the neighboring pants curves) the sequence of folds
+    depend only on the combinatorial type of the neighborhood of the switch
+    and on the outcomes of the peelings done during unzipping. A kernel
+    records these in terms of the standard names of the branches (see
+    DehnThurstonTT.standardize_neighboring_branches()) so that later moves of
+    the same type can skip the branch map computations.
+    """
+    def __init__(self, branch_map, boundary_folds, branch_to_standard):
+        self._branch_paths = [
+            (branch_to_standard[b], tuple(branch_map.branch_list(b)))
+            for b in branch_map._branch_map.keys()
+        ]
+        self._boundary_folds = [(branch_to_standard[b], direction)
+                                for b, direction in boundary_folds]
+        # keys are the outcomes of the peelings during the twists about the
+        # neighboring pants curves, values are the fold sequences and the new
+        # pants branch
+        self.folds = {}
+
+    @staticmethod
+    def to_branch(label, branch_to_standard):
+        """Return the branch with the specified standard name."""
+        for b in branch_to_standard:
+            if branch_to_standard[b] == label:
+                return b
+        assert False
+
+    def boundary_folds(self, branch_to_standard):
+        """Return the boundary folds in the format of
+        BranchMap.find_boundary_folds().
+        """
+        return [(self.to_branch(label, branch_to_standard), direction)
+                for label, direction in self._boundary_folds]
+
+    def branch_map(self, branch_to_standard):
+        """Return the branch map right before the folding phase."""
+        bm = BranchMap(branch_to_standard.keys())
+        for label, path in self._branch_paths:
+            bm.set_branch_list(self.to_branch(label, branch_to_standard), path)
+        return bm
+
+
+class _KernelCache(object):
+    """A bounded cache of SecondMoveKernels.
+
+    The least recently used kernels are discarded when more than
+    ``max_size`` kernels are stored.
+
+    EXAMPLES::
+
+        >>> from macaw.train_tracks.dehn_thurston.dehn_thurston_tt import (
+        ...     _KernelCache)
+        >>> cache = _KernelCache(max_size=2)
+        >>> cache['a'] = 1
+        >>> cache['b'] = 2
+        >>> cache.get('a')
+        1
+        >>> cache['c'] = 3
+        >>> cache.get('b') is None
+        True
+        >>> len(cache)
+        2
+        >>> stats = cache.statistics()
+        >>> stats['hits'], stats['misses'], stats['entries']
+        (1, 1, 2)
+
+    """
+    def __init__(self, max_size=10000):
+        self._max_size = max_size
+        self._kernels = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        """Return the kernel stored for a key, or None."""
+        kernel = self._kernels.pop(key, None)
+        if kernel is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        # marking the kernel as recently used
+        self._kernels[key] = kernel
+        return kernel
+
+    def __setitem__(self, key, kernel):
+        self._kernels.pop(key, None)
+        self._kernels[key] = kernel
+        while len(self._kernels) > self._max_size:
+            self._kernels.popitem(last=False)
+
+    def __len__(self):
+        return len(self._kernels)
+
+    def clear(self):
+        """Discard the kernels and reset the statistics."""
+        self._kernels.clear()
+        self._hits = 0
+        self._misses = 0
+
+    def statistics(self):
+        """Return the number of hits and misses of :meth:`get`, the hit rate
+        and the number of stored kernels."""
+        num_lookups = self._hits + self._misses
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / num_lookups
+                if num_lookups > 0 else 0.0,
+                'entries': len(self._kernels)}
+
+
+# Cache of SecondMoveKernels, keyed by the local combinatorial type of the
+# switch and the outcomes of the peelings during unzipping.
+_second_move_kernels = _KernelCache()
+
+
+def second_move_kernel_statistics():
+    """Return the statistics of the cache of the second elementary moves
+    (see :meth:`DehnThurstonTT.unzip_fold_second_move`).
+
+    The dictionary has the keys ``hits``, ``misses``, ``hit_rate`` and
+    ``entries``.
+    """
+    return _second_move_kernels.statistics()
+
+
+def clear_second_move_kernels():
+    """Empty the cache of the second elementary moves and reset its
+    statistics."""
+    _second_move_kernels.clear()
+
+
+def pop_fold(train_track, branch_map):
+    """Find and perform a fold that shortens a path of the branch map.
+
+    The folds are tried in the same order as by trying all pairs of signed
+    branches, but only the pairs whose paths are initial subpaths of each
+    other are considered, and these are found by
+    BranchMap.subpath_candidates().
+
+    OUTPUT:
+
+    the pair ``(folded_branch, fold_onto_branch)`` if a fold was performed,
+    None otherwise
+    """
     branches = branch_map._branch_map.keys()
+    position = {b: i for i, b in enumerate(branches)}
     for b1 in branches:
         # we want to fold b1 or -b1
-        ls = branch_map._branch_map[b1]
-        if len(ls) == 1:
+        if len(branch_map._branch_map[b1]) == 1:
             # if path of length one, we can't fold the branch
             continue
-        for b2 in branches:
-            if b1 == b2:
-                continue
-            for sb1 in [b1, -b1]:
-                for sb2 in [b2, -b2]:
-                    if branch_map.is_subpath(sb2, sb1):
-                        if debug:
-                            print sb2, " is a subpath of ", sb1
-                        try:
-                            train_track.fold_by_branch_labels(sb1, sb2)
-                            branch_map.subtract(sb1, sb2)
-                            if debug:
-                                print "Folded branch:", sb1
-                                print "Folding onto:", sb2
-                            return True
-                        except FoldError as err:
-                            if debug:
-                                print err
-                                print sb1, "cannot be folded on", sb2
-                            pass
-    return False
+        candidates = []
+        for i, sb1 in enumerate([b1, -b1]):
+            for sb2 in branch_map.subpath_candidates(sb1):
+                if abs(sb2) != b1:
+                    candidates.append((position[abs(sb2)], i,
+                                       0 if sb2 > 0 else 1, sb1, sb2))
+        for _, _, _, sb1, sb2 in sorted(candidates):
+            try:
+                train_track.fold_by_branch_labels(sb1, sb2)
+                branch_map.subtract(sb1, sb2)
+                return sb1, sb2
+            except FoldError:
+                pass
+    return None
@@ -0,0 +1,274 @@
+r"""
+Sparse integer vectors and matrices.
+
+The entries are Python integers, so they never overflow.
+
+"""
+
+
+class SparseVector(dict):
+    """
+    A vector of integers storing only the nonzero entries.
+
+    The keys are the indices of the nonzero entries. Looking up any other
+    index returns 0 and setting an entry to 0 removes it.
+
+    EXAMPLES::
+
+        >>> from macaw.train_tracks.sparse import SparseVector
+        >>> v = SparseVector({0: 2, 3: 0, 5: -1})
+        >>> v
+        {0: 2, 5: -1}
+        >>> v[3]
+        0
+        >>> v[0] -= 2
+        >>> v
+        {5: -1}
+        >>> w = SparseVector({5: 1, 7: 4})
+        >>> v + w
+        {7: 4}
+        >>> w - 2*v
+        {5: 3, 7: 4}
+        >>> (v + v).is_zero()
+        False
+        >>> (v - v).is_zero()
+        True
+
+    """
+    def __init__(self, entries=None):
+        dict.__init__(self)
+        if entries is not None:
+            for idx in entries:
+                self[idx] = entries[idx]
+
+    def __missing__(self, idx):
+        return 0
+
+    def __setitem__(self, idx, value):
+        if value == 0:
+            self.pop(idx, None)
+        else:
+            dict.__setitem__(self, idx, value)
+
+    def copy(self):
+        """Return a copy of the vector."""
+        v = SparseVector()
+        dict.update(v, self)
+        return v
+
+    def is_zero(self):
+        """Decide if all entries are zero."""
+        return len(self) == 0
+
+    def add(self, other, with_sign=1):
+        """Add a vector (or subtract if ``with_sign`` is -1) in place."""
+        for idx in other:
+            self[idx] += with_sign * other[idx]
+
+    def __add__(self, other):
+        v = self.copy()
+        v.add(other)
+        return v
+
+    def __sub__(self, other):
+        v = self.copy()
+        v.add(other, -1)
+        return v
+
+    def __neg__(self):
+        return SparseVector({idx: -self[idx] for idx in self})
+
+    def __mul__(self, scalar):
+        return SparseVector({idx: scalar * self[idx] for idx in self})
+
+    __rmul__ = __mul__
+
+    def __ne__(self, other):
+        return not self == other
+
+    def is_smaller_or_equal(self, other):
+        """Decide if all entries are less than or equal than the corresponding
+        entries of another vector.
+
+        Only the nonzero entries are compared.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.sparse import SparseVector
+            >>> v = SparseVector({1: 1, 4: 2})
+            >>> v.is_smaller_or_equal(SparseVector({1: 1, 4: 3, 5: 1}))
+            True
+            >>> v.is_smaller_or_equal(SparseVector({1: 2}))
+            False
+            >>> v.is_smaller_or_equal(SparseVector({1: 1, 2: -1, 4: 2}))
+            False
+
+        """
+        for idx in self:
+            if self[idx] > other[idx]:
+                return False
+        for idx in other:
+            if idx not in self and other[idx] < 0:
+                return False
+        return True
+
+
+class SparseMatrix(object):
+    """
+    A matrix of integers storing only the nonzero entries.
+
+    The nonzero entries are stored both by rows and by columns, so both rows
+    and columns can be accessed and modified in time proportional to the
+    number of their nonzero entries.
+
+    EXAMPLES::
+
+        >>> from macaw.train_tracks.sparse import SparseMatrix, SparseVector
+        >>> m = SparseMatrix()
+        >>> m.add_to_entry(0, 2, 5)
+        >>> m.add_to_entry(1, 2, 1)
+        >>> m[0, 2]
+        5
+        >>> m[1, 1]
+        0
+        >>> m.row(0)
+        {2: 5}
+        >>> m.column(2)
+        {0: 5, 1: 1}
+        >>> m.add_to_row(1, SparseVector({2: -1, 3: 2}))
+        >>> m.column(2)
+        {0: 5}
+        >>> m.add_to_column(3, m.column(2), with_sign=-1)
+        >>> m.row(0)
+        {2: 5, 3: -5}
+        >>> m.num_nonzero_entries()
+        3
+
+    """
+    def __init__(self):
+        self._rows = {}
+        self._cols = {}
+
+    def __getitem__(self, idx):
+        i, j = idx
+        return self._rows.get(i, {}).get(j, 0)
+
+    def __setitem__(self, idx, value):
+        i, j = idx
+        self._set_entry(i, j, value)
+
+    def _set_entry(self, i, j, value):
+        if value == 0:
+            if i in self._rows and j in self._rows[i]:
+                del self._rows[i][j]
+                del self._cols[j][i]
+                if len(self._rows[i]) == 0:
+                    del self._rows[i]
+                if len(self._cols[j]) == 0:
+                    del self._cols[j]
+        else:
+            self._rows.setdefault(i, {})[j] = value
+            self._cols.setdefault(j, {})[i] = value
+
+    def add_to_entry(self, i, j, value):
+        """Add a number to an entry."""
+        self._set_entry(i, j, self[i, j] + value)
+
+    def row(self, i):
+        """Return a copy of a row as a SparseVector."""
+        return SparseVector(self._rows.get(i, {}))
+
+    def column(self, j):
+        """Return a copy of a column as a SparseVector."""
+        return SparseVector(self._cols.get(j, {}))
+
+    def is_row_zero(self, i):
+        """Decide if a row has only zero entries."""
+        return i not in self._rows
+
+    def add_to_row(self, i, vector, with_sign=1):
+        """Add a vector to a row (or subtract if ``with_sign`` is -1)."""
+        for j in vector.keys():
+            self.add_to_entry(i, j, with_sign * vector[j])
+
+    def add_to_column(self, j, vector, with_sign=1):
+        """Add a vector to a column (or subtract if ``with_sign`` is -1)."""
+        for i in vector.keys():
+            self.add_to_entry(i, j, with_sign * vector[i])
+
+    def set_column(self, j, vector):
+        """Replace a column by a vector."""
+        for i in self._cols.get(j, {}).keys():
+            self._set_entry(i, j, 0)
+        self.add_to_column(j, vector)
+
+    def __mul__(self, other):
+        """Return the product of two matrices.
+
+        Only the products of nonzero entries are computed.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.sparse import SparseMatrix
+            >>> a = SparseMatrix.from_dense([[1, 2], [0, 1]])
+            >>> b = SparseMatrix.from_dense([[1, 0], [3, 1]])
+            >>> (a*b).to_dense(2, 2)
+            [[7, 2], [3, 1]]
+            >>> (b*a).to_dense(2, 2)
+            [[1, 2], [3, 7]]
+
+        """
+        product = SparseMatrix()
+        for i in self._rows:
+            row = self._rows[i]
+            new_row = SparseVector()
+            for k in row:
+                if k in other._rows:
+                    a = row[k]
+                    other_row = other._rows[k]
+                    for j in other_row:
+                        new_row[j] += a * other_row[j]
+            for j in new_row:
+                product._set_entry(i, j, new_row[j])
+        return product
+
+    def restrict_to_columns(self, num_columns):
+        """Return the matrix formed by the columns with index smaller than
+        ``num_columns``.
+        """
+        m = SparseMatrix()
+        for j in self._cols:
+            if j < num_columns:
+                for i in self._cols[j]:
+                    m._set_entry(i, j, self._cols[j][i])
+        return m
+
+    def transpose(self):
+        """Return the transpose of the matrix."""
+        m = SparseMatrix()
+        m._rows = {j: dict(self._cols[j]) for j in self._cols}
+        m._cols = {i: dict(self._rows[i]) for i in self._rows}
+        return m
+
+    @classmethod
+    def from_dense(cls, rows):
+        """Create a sparse matrix from a list of rows."""
+        m = cls()
+        for i in range(len(rows)):
+            for j in range(len(rows[i])):
+                m._set_entry(i, j, rows[i][j])
+        return m
+
+    def to_dense(self, num_rows, num_columns):
+        """Return the first rows and columns of the matrix as a list of
+        rows."""
+        return [[self[i, j] for j in range(num_columns)]
+                for i in range(num_rows)]
+
+    def nonzero_rows(self):
+        """Return the indices of the rows with a nonzero entry."""
+        return self._rows.keys()
+
+    def num_nonzero_entries(self):
+        """Return the number of nonzero entries."""
+        return sum(len(r) for r in self._rows.itervalues())
@@ -0,0 +1,446 @@
+r"""
+Maximal splitting sequences of measured train tracks.
+
+Splitting a measured train track at every large branch of maximal measure
+is called a maximal split. If the measure is the unstable lamination of a
+pseudo-Anosov map, the sequence of maximal splits is eventually periodic
+up to isomorphism and rescaling of the measure [Agol11]_. The train track
+at the beginning of a period is invariant under the pseudo-Anosov map and
+the transition matrix of the period has the stretch factor as its
+Perron-Frobenius eigenvalue.
+
+Periods are detected by hashing the canonical forms of the train tracks
+(see :meth:`TrainTrack.canonical_form`), so each new train track is only
+compared with the earlier train tracks isomorphic to it.
+
+REFERENCES:
+
+- [Agol11]_ I. Agol. Ideal triangulations of pseudo-Anosov mapping tori.
+  Topology and geometry in dimension three, 2011.
+
+"""
+
+
+from operator import truediv
+import numpy as np
+from .train_track import TrainTrack
+from .sparse import SparseMatrix
+from macaw.linear_algebra import perron_frobenius_eigenvalue
+
+
+class CentralSplitError(Exception):
+    pass
+
+
+def _identity_matrix(n):
+    m = SparseMatrix()
+    for i in range(n):
+        m[i, i] = 1
+    return m
+
+
+def maximal_split(train_track, tolerance=0):
+    """Split a trivalent measured train track at every large branch of
+    maximal measure.
+
+    Left and right splits are performed in place. If there are central
+    splits, a new train track is built with the branches renumbered.
+
+    INPUT:
+
+    - ``train_track`` -- a trivalent train track with a positive measure
+
+    - ``tolerance`` -- a split is considered central if the measures it
+      compares differ by at most ``tolerance`` times the measure of the
+      split branch. When the measure is only an approximation of a
+      lamination, a positive tolerance avoids creating branches of
+      negligible measure instead of performing a central split.
+
+    OUTPUT:
+
+    A tuple ``(new_train_track, matrix)``. ``matrix`` is a SparseMatrix
+    expressing the measure before the splits as ``matrix`` times the
+    measure after the splits (the row and column indices are the branch
+    numbers minus one).
+
+    EXAMPLES::
+
+        >>> from macaw.train_tracks.train_track import TrainTrack
+        >>> from macaw.train_tracks.splitting import maximal_split
+        >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [3, 5, 8])
+        >>> new_tt, m = maximal_split(tt)
+        >>> new_tt is tt
+        True
+        >>> tt.measure()
+        [3, 5, 2]
+        >>> m.to_dense(3, 3)
+        [[1, 0, 0], [0, 1, 0], [2, 0, 1]]
+
+    A central split merges the branches on the two sides of the split
+    branch::
+
+        >>> tt = TrainTrack([[1], [-2, -3], [2, 3], [-4, -5], [4, 5], [-1]],
+        ...                 [8, 3, 5, 5, 3])
+        >>> new_tt, m = maximal_split(tt)
+        >>> new_tt.gluing_list()
+        [[1, 2], [-2, -1]]
+        >>> new_tt.measure()
+        [3, 5]
+        >>> m.to_dense(5, 2)
+        [[1, 1], [1, 0], [0, 1], [0, 1], [1, 0]]
+
+    """
+    large = [b for b in train_track.branches()
+             if train_track.is_branch_large(b)]
+    max_measure = max(train_track.branch_measure(b) for b in large)
+    splits = []
+    central = []
+    for b in large:
+        if train_track.branch_measure(b) != max_measure:
+            continue
+        top = -train_track.branch_endpoint(b)
+        bottom = -train_track.branch_endpoint(-b)
+        top_left = train_track.outgoing_branch(top, 0)
+        top_right = train_track.outgoing_branch(top, 1)
+        bottom_left = train_track.outgoing_branch(bottom, 0)
+        bottom_right = train_track.outgoing_branch(bottom, 1)
+        diff = train_track.branch_measure(bottom_right) - \
+            train_track.branch_measure(top_left)
+        if abs(diff) <= tolerance * max_measure:
+            central.append(b)
+        elif diff > 0:
+            splits.append((b, abs(top_left), abs(bottom_left)))
+        elif diff < 0:
+            splits.append((b, abs(top_right), abs(bottom_right)))
+
+    matrix = _identity_matrix(train_track.num_branches())
+    for (b, x, y) in splits:
+        train_track.split(b)
+        matrix.add_to_entry(b - 1, x - 1, 1)
+        matrix.add_to_entry(b - 1, y - 1, 1)
+    if len(central) == 0:
+        return train_track, matrix
+    new_tt, central_matrix = _split_centrally(train_track, central)
+    return new_tt, matrix * central_matrix
+
+
+def _split_centrally(train_track, branches):
+    """Perform central splits at large branches.
+
+    The split branches and their endpoints are removed, and the branches
+    entering the removed switches are joined: the top left branch with the
+    bottom right branch, and the top right branch with the bottom left
+    branch. The resulting branches are numbered in the order they are found.
+
+    OUTPUT:
+
+    A tuple ``(new_train_track, matrix)`` as in :func:`maximal_split`.
+
+    """
+    removed = set()
+    # The branch continuing an oriented branch starting at a removed switch
+    # in the opposite direction.
+    continuation = {}
+    sides = {}
+    for b in branches:
+        top = -train_track.branch_endpoint(b)
+        bottom = -train_track.branch_endpoint(-b)
+        removed.update([abs(top), abs(bottom)])
+        tl, tr = train_track.outgoing_branches(top)
+        bl, br = train_track.outgoing_branches(bottom)
+        continuation.update({tl: br, br: tl, tr: bl, bl: tr})
+        sides[b] = (tl, tr)
+
+    # Following the old branches from the remaining switches through the
+    # removed switches.
+    chain_index = {}
+    branch_chains = {}
+    chains = []
+    for sw in train_track.switches():
+        if sw in removed:
+            continue
+        for side in [sw, -sw]:
+            for e in train_track.outgoing_branches(side):
+                if e in chain_index:
+                    continue
+                chain = [e]
+                while -chain[-1] in continuation:
+                    chain.append(continuation[-chain[-1]])
+                chain_index[e] = len(chains) + 1
+                chain_index[-chain[-1]] = -len(chains) - 1
+                for x in chain:
+                    branch_chains.setdefault(abs(x), []).append(len(chains))
+                chains.append(chain)
+
+    if len(branch_chains) + len(branches) != train_track.num_branches():
+        # Some branches form closed curves through the removed switches.
+        raise CentralSplitError
+
+    gluing_list = []
+    for sw in train_track.switches():
+        if sw in removed:
+            continue
+        for side in [sw, -sw]:
+            gluing_list.append([chain_index[e]
+                                for e in train_track.outgoing_branches(side)])
+    measure = [train_track.branch_measure(chain[0]) for chain in chains]
+
+    matrix = SparseMatrix()
+    for old in branch_chains:
+        for k in branch_chains[old]:
+            matrix.add_to_entry(old - 1, k, 1)
+    for b in branches:
+        for x in sides[b]:
+            matrix.add_to_entry(b - 1, branch_chains[abs(x)][0], 1)
+    return TrainTrack(gluing_list, measure), matrix
+
+
+def positive_subtrack(train_track, threshold=0):
+    """Return the train track formed by the branches of positive measure.
+
+    Switches with one branch on each side are removed by merging the two
+    branches. The branches are renumbered starting from 1.
+
+    INPUT:
+
+    - ``train_track`` -- a measured train track
+
+    - ``threshold`` -- (default: 0) branches with measure at most this are
+      considered to have zero measure. This is useful when the measure
+      approximates a measure with zero entries.
+
+    EXAMPLES::
+
+        >>> from macaw.train_tracks.train_track import TrainTrack
+        >>> from macaw.train_tracks.splitting import positive_subtrack
+        >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [3, 0, 3])
+        >>> sub = positive_subtrack(tt)
+        >>> sub.gluing_list()
+        [[1], [-1]]
+        >>> sub.measure()
+        [3]
+
+        >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [3, 1, 4])
+        >>> positive_subtrack(tt, threshold=1).gluing_list()
+        [[1], [-1]]
+
+    """
+    sides = []
+    for sw in train_track.switches():
+        pos = [b for b in train_track.outgoing_branches(sw)
+               if train_track.branch_measure(b) > threshold]
+        neg = [b for b in train_track.outgoing_branches(-sw)
+               if train_track.branch_measure(b) > threshold]
+        if len(pos) > 0:
+            sides.append([pos, neg])
+
+    # Removing the bivalent switches. The branch on the negative side of the
+    # switch is merged into the branch on the positive side.
+    changed = True
+    while changed:
+        changed = False
+        for k in range(len(sides)):
+            pos, neg = sides[k]
+            if len(pos) == 1 and len(neg) == 1 and pos[0] != -neg[0]:
+                x, y = pos[0], neg[0]
+                for side in [s for sw_sides in sides for s in sw_sides]:
+                    if -y in side:
+                        side[side.index(-y)] = x
+                del sides[k]
+                changed = True
+                break
+
+    branches = sorted(set(abs(b) for sw_sides in sides
+                          for side in sw_sides for b in side))
+    new_number = dict((b, i + 1) for i, b in enumerate(branches))
+    gluing_list = []
+    for sw_sides in sides:
+        for side in sw_sides:
+            gluing_list.append([new_number[b] if b > 0 else -new_number[-b]
+                                for b in side])
+    measure = [train_track.branch_measure(b) for b in branches]
+    return TrainTrack(gluing_list, measure)
+
+
+class PeriodicSplittingSequence(object):
+    """A periodic part of a maximal splitting sequence.
+
+    INPUT:
+
+    - ``train_track`` -- the measured train track at the beginning of the
+      period
+
+    - ``transition_matrix`` -- the matrix `M` expressing the measure of
+      ``train_track`` as `M` times the measure at the end of the period,
+      where the branches at the end of the period are identified with the
+      branches of ``train_track`` by an isomorphism
+
+    - ``preperiod`` -- the number of maximal splits before the period
+
+    - ``period`` -- the number of maximal splits in the period
+
+    """
+    def __init__(self, train_track, transition_matrix, preperiod, period):
+        self._train_track = train_track
+        self._transition_matrix = transition_matrix
+        self._preperiod = preperiod
+        self._period = period
+
+    def __repr__(self):
+        return "Periodic splitting sequence of length %d after %d " \
+            "maximal splits" % (self._period, self._preperiod)
+
+    def train_track(self):
+        """Return the measured train track at the beginning of the
+        period."""
+        return self._train_track
+
+    def transition_matrix(self):
+        """Return the transition matrix of the period."""
+        return self._transition_matrix
+
+    def preperiod(self):
+        """Return the number of maximal splits before the period."""
+        return self._preperiod
+
+    def period(self):
+        """Return the number of maximal splits in the period."""
+        return self._period
+
+    def growth(self):
+        """Return the Perron-Frobenius eigenvalue of the transition matrix
+        as an AlgebraicNumber.
+
+        This is the factor by which the measure shrinks during the period.
+        """
+        return perron_frobenius_eigenvalue(self._transition_matrix)
+
+
+def _canonical_vector(train_track, labelling):
+    """Return the measure normalized to have sum 1 and ordered by the
+    labelling."""
+    total = sum(train_track.measure())
+    vec = [0] * train_track.num_branches()
+    for b in train_track.branches():
+        vec[abs(labelling[b]) - 1] = truediv(train_track.branch_measure(b),
+                                             total)
+    return vec
+
+
+def find_periodic_splitting_sequence(train_track, max_num_steps=1000,
+                                     tolerance=1e-9):
+    """Find a periodic part of the maximal splitting sequence of a trivalent
+    measured train track.
+
+    The measure is usually an integral approximation of a projectively
+    invariant measure, so two train tracks in the sequence are considered
+    the same if they are isomorphic and their normalized measures differ by
+    less than ``tolerance`` at each branch, and splits comparing measures
+    that agree up to ``tolerance`` are performed as central splits. The
+    search stops when the measure becomes too small to distinguish measures at this precision.
+
+    INPUT:
+
+    - ``train_track`` -- a connected trivalent train track with positive
+      measures. It is not changed.
+
+    - ``max_num_steps`` -- the maximal number of maximal splits performed
+
+    - ``tolerance`` -- the tolerance of comparing normalized measures
+
+    OUTPUT:
+
+    A PeriodicSplittingSequence, or ``None`` if no period is found.
+
+    EXAMPLES:
+
+    A measure on the torus track given by an eigenvector of `[[2, 1],
+    [1, 1]]`::
+
+        >>> from macaw.train_tracks.train_track import TrainTrack
+        >>> from macaw.train_tracks.splitting import (
+        ...     find_periodic_splitting_sequence)
+        >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]],
+        ...                 [10**15, 1618033988749895, 2618033988749895])
+        >>> seq = find_periodic_splitting_sequence(tt)
+        >>> seq
+        Periodic splitting sequence of length 2 after 0 maximal splits
+        >>> seq.transition_matrix()
+        array([[0, 0, 1],
+               [1, 2, 0],
+               [0, 1, 2]], dtype=object)
+        >>> seq.growth()
+        Root of x^2 - 3*x + 1 near 2.618034
+
+    The train track is not changed::
+
+        >>> tt.measure()
+        [1000000000000000, 1618033988749895, 2618033988749895]
+
+    A rational measure is not periodic::
+
+        >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [1, 2, 3])
+        >>> find_periodic_splitting_sequence(tt) is None
+        True
+
+    """
+    tt = TrainTrack(train_track.gluing_list(), list(train_track.measure()))
+    if not tt.is_trivalent():
+        raise ValueError("The train track has to be trivalent.")
+    if min(tt.measure()) <= 0:
+        raise ValueError("The measure has to be positive on every branch.")
+
+    seen = {}
+    snapshots = []
+    matrices = []
+    for step in range(max_num_steps + 1):
+        if min(tt.measure()) * tolerance < 1:
+            return None
+        try:
+            encoding, labellings = tt.canonical_form()
+        except ValueError:
+            # central splits disconnected the train track
+            return None
+        vectors = [_canonical_vector(tt, lab) for lab in labellings]
+        for (i, vec) in seen.get(encoding, []):
+            for k in range(len(labellings)):
+                if max(abs(x - y) for x, y in zip(vec, vectors[k])) < \
+                   tolerance:
+                    return _periodic_sequence(snapshots[i], tt,
+                                              labellings[k], matrices[i:], i)
+        seen.setdefault(encoding, []).append((step, vectors[0]))
+        snapshots.append((tt.gluing_list(), list(tt.measure()),
+                          labellings[0]))
+        if step == max_num_steps:
+            break
+        try:
+            tt, matrix = maximal_split(tt, tolerance)
+        except CentralSplitError:
+            return None
+        matrices.append(matrix)
+    return None
+
+
+def _periodic_sequence(snapshot, end_train_track, end_labelling, matrices,
+                       preperiod):
+    """Assemble the PeriodicSplittingSequence from the carrying matrices of
+    the maximal splits between the start and the end of a period."""
+    gluing_list, measure, start_labelling = snapshot
+    n = len(measure)
+
+    product = _identity_matrix(n)
+    for matrix in matrices:
+        product = product * matrix
+
+    # Identifying the branches at the end with the branches at the start.
+    end_branch = {}
+    for b in end_train_track.branches():
+        end_branch[abs(end_labelling[b])] = b
+    transition = np.zeros((n, n), dtype=object)
+    for b in range(1, n + 1):
+        e = end_branch[abs(start_labelling[b])]
+        for a in range(1, n + 1):
+            transition[a - 1, b - 1] = product[a - 1, e - 1]
+
+    return PeriodicSplittingSequence(TrainTrack(gluing_list, measure),
+                                     transition, preperiod, len(matrices))
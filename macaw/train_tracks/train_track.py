@@ -24,6 +24,7 @@ AUTHORS:
 from .train_track1 import TrainTrack as TrainTrack1
 from .train_track0 import DeleteSwitchError
 from macaw.constants import LEFT, RIGHT, BRANCH, CUSP
+from macaw import tracing
 
 
 LARGE = 0
@@ -49,7 +50,7 @@ class TrainTrack(TrainTrack1):
     # Peeling and folding for general train tracks
     # --------------------------------------------
 
-    def peel(self, switch, side, branch_map=None, debug=False,
+    def peel(self, switch, side, branch_map=None,
              preferred_peeled_side=RIGHT,
              carrying_maps_self_small=[],  # DONE
              carrying_maps_self_large=[]):  # TODO
@@ -100,20 +101,9 @@ class TrainTrack(TrainTrack1):
         """
         assert self.is_measured()
         if side == RIGHT:
-            return self.peel(-switch, LEFT, branch_map, debug=debug,
+            return self.peel(-switch, LEFT, branch_map,
                              preferred_peeled_side=preferred_peeled_side)
 
-        if debug:
-            print "-------------------------------"
-            print "BEGIN: peel()"
-            print "-------------------------------"
-            print "Gluing list at beginning", self.gluing_list()
-            print "Measure at beginning", self.measure()
-            if branch_map is not None:
-                print "Branch map at the beginning", branch_map._branch_map
-            print "Switch:", switch
-            print "Preferred side:", preferred_peeled_side
-
         branches = [self.outgoing_branch(-switch, 0, start_side=RIGHT),
                     self.outgoing_branch(switch, 0)]
 
@@ -137,9 +127,6 @@ class TrainTrack(TrainTrack1):
         else:
             sm_idx = preferred_peeled_side
 
-        if debug:
-            print "Peeled side:", "LEFT" if sm_idx == LEFT else "RIGHT"
-
         lg_idx = (sm_idx+1) % 2
         # or_switch = -switch if sm_idx == LEFT else switch
 
@@ -147,9 +134,6 @@ class TrainTrack(TrainTrack1):
         idx = self.outgoing_branch_index(bottom_switch,
                                          -branches[lg_idx],
                                          start_side=lg_idx)
-        if debug:
-            print "Peeling branch", branches[sm_idx], "off of",\
-                branches[lg_idx]
 
         self.reglue_endpoint(-branches[sm_idx], bottom_switch, idx,
                              start_side=lg_idx)
@@ -166,14 +150,12 @@ class TrainTrack(TrainTrack1):
         if branch_map is not None:
             branch_map.append(-branches[sm_idx], branches[lg_idx])
 
-        if debug:
-            print "Gluing list at the end", self.gluing_list()
-            print "Measure at the end", self.measure()
-            if branch_map is not None:
-                print "Branch map at the end", branch_map._branch_map
-            print "-------------------------------"
-            print "END: peel()"
-            print "-------------------------------"
+        trace = tracing.active
+        if trace is not None:
+            trace.instant('peel', switch=switch, peeled=branches[sm_idx],
+                          peeled_off_of=branches[lg_idx],
+                          measures_before=measures,
+                          measure_after=measures[lg_idx] - measures[sm_idx])
 
         for cm in carrying_maps_self_small:
             cm.peel_in_small(peeled_branch=branches[sm_idx],
@@ -24,8 +24,14 @@ EXAMPLES::
 # *****************************************************************************
 
 
+import hashlib
 import numpy as np
+from collections import deque
+from fractions import Fraction
 from macaw.constants import LEFT, RIGHT, START, END
+from macaw import serialization
+from macaw.serialization import TRAIN_TRACK, write_header, read_header, \
+    check_end, write_uint, write_ints, read_uint, read_ints
 
 
 class DeleteSwitchError(Exception):
@@ -151,6 +157,12 @@ class TrainTrack(object):
         self._num_branches = 0
         self._num_cusps = 0
 
+        # The journal of changes since the oldest open checkpoint (None if
+        # there is no checkpoint) and the lengths of the journal at the open
+        # checkpoints. See checkpoint().
+        self._journal = None
+        self._checkpoints = []
+
         # Initializing the arrays.
         for i in range(len(gluing_list)/2):
             for step in range(2):
@@ -836,6 +848,432 @@ class TrainTrack(object):
         else:
             return TrainTrack(self.gluing_list())
 
+    # ----------------------------------------------------------------
+    # SERIALIZATION
+    # ----------------------------------------------------------------
+
+    def _write(self, buf):
+        """Append the gluing list and the measure to a bytearray.
+
+        The numbers of the switches and branches are kept, so switches and
+        branches deleted in the middle of the buffers are written as empty
+        slots.
+        """
+        n = self.switches()[-1]
+        write_uint(buf, n)
+        for i in range(1, n+1):
+            write_ints(buf, self.outgoing_branches(i))
+            write_ints(buf, self.outgoing_branches(-i))
+        if not self.is_measured():
+            write_uint(buf, 0)
+            return
+        branches = self.branches()
+        write_uint(buf, branches[-1] + 1)
+        is_branch = set(branches)
+        for b in range(1, branches[-1]+1):
+            write_uint(buf, self._measure[b-1] if b in is_branch else 0)
+
+    @classmethod
+    def _read(cls, data, pos):
+        """Create a train track from the data written by _write().
+
+        The arrays are filled in directly, without the checks of __init__.
+
+        OUTPUT:
+
+        The train track and the position after its data.
+        """
+        n, pos = read_uint(data, pos)
+        gluing_list = []
+        for i in range(2*n):
+            ls, pos = read_ints(data, pos)
+            gluing_list.append(ls)
+        num_measures, pos = read_uint(data, pos)
+        measure = None
+        if num_measures > 0:
+            measure = np.zeros(num_measures - 1, dtype=object)
+            for i in range(num_measures - 1):
+                measure[i], pos = read_uint(data, pos)
+
+        num_branches = max(max(abs(b) for b in ls) if ls else 0
+                           for ls in gluing_list)
+        max_outgoing = max(len(ls) for ls in gluing_list)
+
+        tt = cls.__new__(cls)
+        tt._outgoing_branches = np.zeros((2, n, max_outgoing), dtype=np.int)
+        tt._num_outgoing_branches = np.zeros((2, n), dtype=np.int)
+        tt._branch_endpoint = np.zeros((2, num_branches), dtype=np.int)
+        tt._adjacent_cusp = np.zeros((2, 2, 2*num_branches), dtype=np.int)
+        tt._num_switches = 0
+        tt._num_branches = 0
+        tt._num_cusps = 0
+        tt._journal = None
+        tt._checkpoints = []
+
+        # The same as in __init__().
+        for i in range(n):
+            if gluing_list[2*i]:
+                tt._num_switches += 1
+            for step in range(2):
+                sgn = 1 if step == 0 else -1
+                ls = gluing_list[2*i + step]
+                for b in ls:
+                    if b > 0:
+                        tt._branch_endpoint[START, b-1] = sgn*(i+1)
+                        tt._num_branches += 1
+                    else:
+                        tt._branch_endpoint[END, -b-1] = sgn*(i+1)
+                tt._num_outgoing_branches[step, i] = len(ls)
+                tt._outgoing_branches[step, i, :len(ls)] = ls
+                for j in range(len(ls)-1):
+                    tt._num_cusps += 1
+                    tt._adjacent_cusp[RIGHT][tt._to_index(ls[j])] = \
+                        tt._num_cusps
+                    tt._adjacent_cusp[LEFT][tt._to_index(ls[j+1])] = \
+                        tt._num_cusps
+
+        if measure is not None and len(measure) != num_branches:
+            raise ValueError("The number of measures does not match the "
+                             "number of branches.")
+        tt._measure = measure
+        return tt, pos
+
+    def to_bytes(self):
+        """Return a compact binary encoding of the train track.
+
+        The numbering of the switches and branches and the measure are
+        preserved.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track import TrainTrack
+            >>> tt = TrainTrack([[1], [-2, -3], [2, 3], [-1]], [8, 3, 5])
+            >>> data = tt.to_bytes()
+            >>> len(data)
+            17
+            >>> tt2 = TrainTrack.from_bytes(data)
+            >>> tt2.gluing_list(), tt2.measure()
+            ([[1], [-2, -3], [2, 3], [-1]], [8, 3, 5])
+
+        """
+        buf = bytearray()
+        write_header(buf, TRAIN_TRACK)
+        self._write(buf)
+        return bytes(buf)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a train track from the output of :meth:`to_bytes`."""
+        data, pos = read_header(data, TRAIN_TRACK)
+        tt, pos = cls._read(data, pos)
+        check_end(data, pos)
+        return tt
+
+    def __reduce__(self):
+        return (serialization.from_bytes, (self.to_bytes(),))
+
+    # ----------------------------------------------------------------
+    # ISOMORPHISM
+    # ----------------------------------------------------------------
+
+    def _labelling_from_switch(self, start_switch):
+        """Relabel the branches of the train track by a breadth-first search
+        starting from an oriented switch.
+
+        The switches are visited in the order they are discovered. At each
+        switch, first the branches on its positive side, then the branches
+        on its negative side are listed from left to right, and the branches
+        that have not been seen are labelled with the next positive number.
+
+        OUTPUT:
+
+        A tuple ``(encoding, labelling)``. ``labelling`` is a dictionary
+        mapping each oriented branch to its new label (the label of ``-b`` is
+        minus the label of ``b``). ``encoding`` lists, for each switch in the
+        order of the search, the new labels of the outgoing branches on the
+        two sides of the switch.
+
+        """
+        labelling = {}
+        seen_switches = set([abs(start_switch)])
+        queue = deque([start_switch])
+        encoding = []
+        while queue:
+            switch = queue.popleft()
+            rows = []
+            for side in [switch, -switch]:
+                row = []
+                for b in self.outgoing_branches(side):
+                    if b not in labelling:
+                        label = len(labelling)//2 + 1
+                        labelling[b] = label
+                        labelling[-b] = -label
+                        end = self.branch_endpoint(b)
+                        if abs(end) not in seen_switches:
+                            seen_switches.add(abs(end))
+                            queue.append(end)
+                    row.append(labelling[b])
+                rows.append(tuple(row))
+            encoding.append(tuple(rows))
+        return tuple(encoding), labelling
+
+    def canonical_form(self):
+        """Return a canonical encoding of the train track up to isomorphism.
+
+        Two connected train tracks have the same encoding if and only if
+        there is an orientation-preserving isomorphism between them. The
+        encoding is the lexicographically smallest one among the encodings
+        obtained by relabelling the branches by a breadth-first search from
+        each oriented switch.
+
+        OUTPUT:
+
+        A tuple ``(encoding, labellings)``, where ``encoding`` is a hashable
+        tuple and ``labellings`` is the list of relabellings of the branches
+        realizing the encoding, as dictionaries from oriented branches to
+        labels. There is more than one relabelling if the train track has
+        symmetries.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track0 import TrainTrack
+            >>> tt1 = TrainTrack([[1, 2], [-1, -3], [3], [-2]])
+            >>> tt2 = TrainTrack([[1], [-3], [2, 3], [-2, -1]])
+            >>> tt1.canonical_form()[0] == tt2.canonical_form()[0]
+            True
+            >>> tt3 = TrainTrack([[1, 2], [-2, -3], [3], [-1]])
+            >>> tt1.canonical_form()[0] == tt3.canonical_form()[0]
+            False
+
+        The track with two branches between two sides of a switch has a
+        symmetry interchanging the branches::
+
+            >>> tt = TrainTrack([[1, 2], [-2, -1]])
+            >>> encoding, labellings = tt.canonical_form()
+            >>> encoding
+            (((1, 2), (-2, -1)),)
+            >>> len(labellings)
+            2
+
+        Disconnected train tracks are not supported::
+
+            >>> TrainTrack([[1], [-1], [2], [-2]]).canonical_form()
+            Traceback (most recent call last):
+            ...
+            ValueError: The train track has to be connected.
+
+        """
+        best = None
+        labellings = []
+        for sw in self.switches():
+            for start_switch in [sw, -sw]:
+                encoding, labelling = self._labelling_from_switch(start_switch)
+                if len(labelling) != 2 * self.num_branches():
+                    raise ValueError("The train track has to be connected.")
+                if best is None or encoding < best:
+                    best = encoding
+                    labellings = [labelling]
+                elif encoding == best:
+                    labellings.append(labelling)
+        return best, labellings
+
+    def canonical_bytes(self, measure=False):
+        """Return a byte string identifying the train track up to
+        isomorphism.
+
+        The byte string is the canonical encoding (see
+        :meth:`canonical_form`) written out as text. Relabelling by a
+        breadth-first search from an oriented switch is the same as starting
+        from the leftmost branch on one of its sides, so every starting
+        oriented branch is considered.
+
+        INPUT:
+
+        - ``measure`` -- if ``True``, the measure, up to scaling, is also
+          encoded. Among the canonical relabellings the one giving the
+          smallest measure vector is used.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track0 import TrainTrack
+            >>> tt = TrainTrack([[1, 2], [-1, -3], [3], [-2]], [3, 5, 5])
+            >>> tt.canonical_bytes()
+            '1|2;3,-1|-3,-2'
+            >>> tt.canonical_bytes(measure=True)
+            '1|2;3,-1|-3,-2:1,1,3/5'
+
+        Measures differing by a scalar factor give the same byte string::
+
+            >>> TrainTrack([[1, 2], [-1, -3], [3], [-2]],
+            ...            [6, 10, 10]).canonical_bytes(measure=True)
+            '1|2;3,-1|-3,-2:1,1,3/5'
+
+        Branches of measure zero are allowed::
+
+            >>> tt = TrainTrack([[1, 2], [-1, -2]], [0, 3])
+            >>> tt.canonical_bytes(measure=True) == TrainTrack(
+            ...     [[1, 2], [-1, -2]], [0, 6]).canonical_bytes(measure=True)
+            True
+
+        """
+        encoding, labellings = self.canonical_form()
+        text = ';'.join('|'.join(','.join(str(b) for b in row)
+                                 for row in switch)
+                        for switch in encoding)
+        if not measure:
+            return text
+        vectors = []
+        for labelling in labellings:
+            vec = [0] * self.num_branches()
+            for b in self.branches():
+                vec[abs(labelling[b]) - 1] = Fraction(self.branch_measure(b))
+            # scale by the first nonzero entry (the first entries of the
+            # relabellings may be zero), a zero measure is kept as it is
+            scale = next((x for x in vec if x != 0), 1)
+            vectors.append([x / scale for x in vec])
+        return text + ':' + ','.join(str(x) for x in min(vectors))
+
+    def canonical_hash(self, measure=False):
+        """Return a hash of the train track that is invariant under
+        isomorphisms.
+
+        The hash is the SHA-1 digest of :meth:`canonical_bytes`, so it is
+        the same across sessions and can be used as a key of dictionaries
+        and of caches stored on disk.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track0 import TrainTrack
+            >>> tt1 = TrainTrack([[1, 2], [-1, -3], [3], [-2]])
+            >>> tt2 = TrainTrack([[1], [-3], [2, 3], [-2, -1]])
+            >>> tt1.canonical_hash() == tt2.canonical_hash()
+            True
+            >>> len(tt1.canonical_hash())
+            40
+
+        """
+        return hashlib.sha1(self.canonical_bytes(measure)).hexdigest()
+
+    def is_isomorphic(self, other, measure=False):
+        """Decide if there is an orientation-preserving isomorphism between
+        two connected train tracks.
+
+        INPUT:
+
+        - ``other`` -- a train track
+
+        - ``measure`` -- if ``True``, the isomorphism also has to map the
+          measures to each other up to scaling
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track0 import TrainTrack
+            >>> tt1 = TrainTrack([[1, 2], [-1, -3], [3], [-2]], [3, 5, 5])
+            >>> tt2 = TrainTrack([[1], [-3], [2, 3], [-2, -1]], [10, 6, 10])
+            >>> tt1.is_isomorphic(tt2, measure=True)
+            True
+            >>> tt3 = TrainTrack([[1], [-3], [2, 3], [-2, -1]], [3, 5, 3])
+            >>> tt1.is_isomorphic(tt3)
+            True
+            >>> tt1.is_isomorphic(tt3, measure=True)
+            False
+
+        """
+        if self.num_branches() != other.num_branches() or \
+           self.num_switches() != other.num_switches():
+            return False
+        return self.canonical_bytes(measure) == other.canonical_bytes(measure)
+
+    # ----------------------------------------------------------------
+    # CHECKPOINTS
+    # ----------------------------------------------------------------
+
+    def checkpoint(self):
+        """Start recording changes so that they can be undone by rollback().
+
+        Every primitive mutator records the old value of the data it changes
+        in a journal, so undoing a move takes time proportional to the number
+        of changes rather than the size of the train track. Checkpoints can
+        be nested: rollback() and commit() close the last open checkpoint.
+
+        EXAMPLES::
+
+            >>> from macaw.train_tracks.train_track import TrainTrack
+            >>> tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [3, 5, 8])
+            >>> tt.checkpoint()
+            >>> tt.split(3)
+            >>> tt.gluing_list()
+            [[2], [-1, -3], [1, 3], [-2]]
+            >>> tt.rollback()
+            >>> tt.gluing_list()
+            [[1, 2], [-3], [3], [-1, -2]]
+            >>> tt.measure()
+            [3, 5, 8]
+
+        Nested checkpoints::
+
+            >>> tt.checkpoint()
+            >>> tt.change_switch_orientation(1)
+            >>> tt.checkpoint()
+            >>> tt.split(3)
+            >>> tt.rollback()
+            >>> tt.gluing_list()
+            [[-3], [1, 2], [3], [-1, -2]]
+            >>> tt.commit()
+            >>> tt.gluing_list()
+            [[-3], [1, 2], [3], [-1, -2]]
+            >>> tt.rollback()
+            Traceback (most recent call last):
+            ...
+            ValueError: There is no open checkpoint.
+
+        """
+        if self._journal is None:
+            self._journal = []
+        self._checkpoints.append(len(self._journal))
+
+    def rollback(self):
+        """Undo the changes since the last open checkpoint and close it.
+        """
+        if len(self._checkpoints) == 0:
+            raise ValueError("There is no open checkpoint.")
+        mark = self._checkpoints.pop()
+        journal = self._journal
+        while len(journal) > mark:
+            name, index, value = journal.pop()
+            if index is None:
+                setattr(self, name, value)
+            else:
+                getattr(self, name)[index] = value
+        if len(self._checkpoints) == 0:
+            self._journal = None
+
+    def commit(self):
+        """Keep the changes since the last open checkpoint and close it.
+
+        The changes can still be undone by rolling back an enclosing
+        checkpoint.
+        """
+        if len(self._checkpoints) == 0:
+            raise ValueError("There is no open checkpoint.")
+        self._checkpoints.pop()
+        if len(self._checkpoints) == 0:
+            self._journal = None
+
+    def _record(self, name, index=None):
+        """Record the current value of an attribute (if ``index`` is None)
+        or of an entry or row of an array attribute in the journal.
+        """
+        if self._journal is None:
+            return
+        if index is None:
+            self._journal.append((name, None, getattr(self, name)))
+        else:
+            value = getattr(self, name)[index]
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+            self._journal.append((name, index, value))
+
     # ----------------------------------------------------------------
     # SETTERS
     # ----------------------------------------------------------------
@@ -865,8 +1303,10 @@ class TrainTrack(object):
 
         """
         if branch > 0:
+            self._record('_branch_endpoint', (END, branch-1))
             self._branch_endpoint[END, branch-1] = switch
         else:
+            self._record('_branch_endpoint', (START, -branch-1))
             self._branch_endpoint[START, -branch-1] = switch
 
     def _set_measure(self, branch, new_measure):
@@ -885,6 +1325,7 @@ class TrainTrack(object):
             array([16, 3, 5], dtype=object)
 
         """
+        self._record('_measure', abs(branch)-1)
         self._measure[abs(branch)-1] = new_measure
 
     # -----------------------------------------------------
@@ -912,6 +1353,9 @@ class TrainTrack(object):
 
 
         """
+        for name in ['_measure', '_branch_endpoint', '_adjacent_cusp']:
+            self._record(name)
+
         # Increase self._measure
         if self.is_measured():
             ext = np.zeros(k, dtype=self._measure.dtype)
@@ -959,6 +1403,8 @@ class TrainTrack(object):
                    [2, 1, 0, 0]])
 
         """
+        self._record('_outgoing_branches')
+        self._record('_num_outgoing_branches')
         ob = self._outgoing_branches
         ext = np.zeros((2, k, ob.shape[2]), dtype=ob.dtype)
         self._outgoing_branches = np.concatenate((ob, ext), axis=1)
@@ -995,6 +1441,7 @@ class TrainTrack(object):
                    [2, 1]])
 
         """
+        self._record('_outgoing_branches')
         ob = self._outgoing_branches
         ext = np.zeros((2, ob.shape[1], k), dtype=ob.dtype)
         self._outgoing_branches = np.concatenate((ob, ext), axis=2)
@@ -1112,6 +1559,8 @@ class TrainTrack(object):
             self._allocate_more_outgoing_branches(k)
             arr = self._outgoing_branches[self._to_index(switch)]
             n = self.num_outgoing_branches(switch)
+        self._record('_outgoing_branches', self._to_index(switch))
+        self._record('_num_outgoing_branches', self._to_index(switch))
         self._num_outgoing_branches[self._to_index(switch)] += 1
 
         if start_side == RIGHT:
@@ -1250,6 +1699,7 @@ class TrainTrack(object):
         self._set_endpoint(b, end_switch)
         self._set_endpoint(-b, start_switch)
 
+        self._record('_num_branches')
         # n = self._num_branches
         # for i in range(n, 0, -1):
         #     if self._branches[i-1] > b:
@@ -1285,6 +1735,7 @@ class TrainTrack(object):
         sw = self._find_new_switch_number()
         # print self._num_outgoing_branches
         # print self._outgoing_branches
+        self._record('_num_switches')
         self._num_switches += 1
         self.reglue_endpoint(branch, -sw, 0)
 
@@ -1334,6 +1785,8 @@ class TrainTrack(object):
         if pos < 0 or pos >= n:
             raise ValueError("There is no branch at position %d from switch"
                              "%d." % (pos, switch))
+        self._record('_outgoing_branches', self._to_index(switch))
+        self._record('_num_outgoing_branches', self._to_index(switch))
         self._num_outgoing_branches[self._to_index(switch)] -= 1
         if start_side == RIGHT:
             pos = n-1-pos
@@ -1386,6 +1839,7 @@ class TrainTrack(object):
             self._pop_outgoing_branch(sw, pos)
         self._set_endpoint(branch, 0)
         self._set_endpoint(-branch, 0)
+        self._record('_num_branches')
         self._num_branches -= 1
         if self.is_measured():
             self._set_measure(branch, 0)
@@ -1448,6 +1902,7 @@ class TrainTrack(object):
             carrying_maps_self_small=carrying_maps_self_small
         )
         self.reglue_endpoint(-pos_branch, sw, pos)
+        self._record('_num_switches')
         self._num_switches -= 1
 
         for cm in carrying_maps_self_large:
@@ -1530,6 +1985,9 @@ class TrainTrack(object):
         for br in self.outgoing_branches(-switch):
             self._set_endpoint(-br, switch)
         idx1, idx2 = self._to_index(switch), self._to_index(-switch)
+        for idx in [idx1, idx2]:
+            self._record('_outgoing_branches', idx)
+            self._record('_num_outgoing_branches', idx)
         temp = np.copy(self._outgoing_branches[idx1])
         self._outgoing_branches[idx1] = self._outgoing_branches[idx2]
         self._outgoing_branches[idx2] = temp
@@ -1571,8 +2029,9 @@ class TrainTrack(object):
                    for i in range(4)]
 
         for i in range(4):
-            arr = self._outgoing_branches[self._to_index(endpoints[i])]
-            arr[indices[i]] = branches[3-i]
+            idx = self._to_index(endpoints[i]) + (indices[i],)
+            self._record('_outgoing_branches', idx)
+            self._outgoing_branches[idx] = branches[3-i]
             self._set_endpoint(branches[i], endpoints[(i+2) % 4])
 
         # sw1p = self.branch_endpoint(branch1)
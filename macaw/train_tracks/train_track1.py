@@ -23,7 +23,6 @@ EXAMPLES::
 #                  http://www.gnu.org/licenses/
 # *****************************************************************************
 
-import networkx as nx
 from .train_track0 import TrainTrack as TrainTrack0
 from ..surface import Surface
 # from sage.graphs.graph import Graph
@@ -103,6 +102,7 @@ class TrainTrack(TrainTrack0):
             return self._puncturefinder_graph
         except AttributeError:
             pass
+        import networkx as nx
 
         # g = Graph(multiedges=True, loops=True)
         g = nx.MultiGraph()
@@ -142,6 +142,7 @@ class TrainTrack(TrainTrack0):
         4
 
         """
+        import networkx as nx
         g = self._get_puncturefinder_graph()
         # return g.connected_components_number()
         return nx.number_connected_components(g)
@@ -175,6 +176,7 @@ class TrainTrack(TrainTrack0):
 
 
         """
+        import networkx as nx
         g = self._get_puncturefinder_graph()
         # return g.connected_components()
         return list(nx.connected_components(g))
@@ -227,6 +229,7 @@ class TrainTrack(TrainTrack0):
             [1, 1, 1, 1]
 
         """
+        import networkx as nx
         G = self._get_puncturefinder_graph()
         # return [sum(G.subgraph(vertices=region).edge_labels())
         #         for region in G.connected_components()]
@@ -291,6 +294,7 @@ class TrainTrack(TrainTrack0):
             return self._recurrence_graph
         except AttributeError:
             pass
+        import networkx as nx
 
         # g = DiGraph()
         g = nx.DiGraph()
@@ -330,6 +334,7 @@ class TrainTrack(TrainTrack0):
             False
 
         """
+        import networkx as nx
         G = self._get_recurrence_graph()
         # C = G.strongly_connected_components()
         first_component = nx.strongly_connected_components(G).next()
@@ -0,0 +1,83 @@
+import json
+from macaw.batch import evaluate_record, evaluate_stream, main
+
+
+def test_evaluate_record():
+    result = evaluate_record((3, '{"genus": 2, "word": [1, 2, 3, 4], '
+                                 '"id": "x"}'), ['order', 'is_identity'])
+    assert result == {'line': 3, 'id': 'x', 'order': 10,
+                      'is_identity': False}
+
+
+def test_record_tasks_override_default():
+    result = evaluate_record((1, '{"genus": 2, "word": [], '
+                                 '"tasks": ["is_identity"]}'), ['order'])
+    assert result == {'line': 1, 'is_identity': True}
+
+
+def test_errors_are_reported():
+    result = evaluate_record((1, 'not json'))
+    assert list(result['errors']) == ['record']
+    result = evaluate_record((2, '{"genus": 2, "word": [7]}'))
+    assert 'ValueError' in result['errors']['record']
+    result = evaluate_record((3, '{"genus": 2, "word": [1], '
+                                 '"tasks": ["colour"]}'))
+    assert 'colour' in result['errors']['record']
+
+
+def test_stream_keeps_input_order():
+    lines = ['{"genus": 2, "word": %s}' % json.dumps(word)
+             for word in [[1, 2, 3, 4], [1, 2, 3, 4, 4], [1, 2, 3, 4, 5]]]
+    results = list(evaluate_stream(lines, ['order'], processes=2,
+                                   max_in_flight=1))
+    assert [r['order'] for r in results] == [10, 8, 6]
+    assert [r['line'] for r in results] == [1, 2, 3]
+
+
+def test_stream_unordered_tags_lines():
+    lines = ['{"genus": 2, "word": [%d]}' % (i % 5 + 1) for i in range(10)]
+    results = list(evaluate_stream(lines, ['is_identity'], processes=2,
+                                   ordered=False))
+    assert sorted(r['line'] for r in results) == list(range(1, 11))
+    assert not any(r['is_identity'] for r in results)
+
+
+def test_main(tmpdir):
+    infile = tmpdir.join('in.jsonl')
+    infile.write('{"genus": 2, "word": [1, 2, 3, 4], "id": 7}\n')
+    outfile = tmpdir.join('out.jsonl')
+    main([str(infile), '-o', str(outfile), '-t', 'order', '-p', '1'])
+    assert json.loads(outfile.read()) == {'line': 1, 'id': 7, 'order': 10}
+
+
+def test_main_with_cache(tmpdir):
+    from macaw.result_cache import ResultCache
+    infile = tmpdir.join('in.jsonl')
+    infile.write('{"genus": 2, "word": [1, 2, 3, 4]}\n')
+    cache_file = str(tmpdir.join('results.sqlite'))
+    for i in range(2):
+        outfile = tmpdir.join('out%d.jsonl' % i)
+        main([str(infile), '-o', str(outfile), '-t',
+              'order,homology_charpoly', '-p', '1', '--cache',
+              '--cache-file', cache_file])
+        result = json.loads(outfile.read())
+        assert result['order'] == 10
+        assert result['homology_charpoly'] == [1, -1, 1, -1, 1]
+    assert ResultCache(cache_file).statistics()['entries'] == 2
+
+
+def test_serial_stream_uses_cache_file(tmpdir):
+    from macaw.pants_mapping_class import PantsMappingClass
+    from macaw.result_cache import ResultCache
+    cache_file = str(tmpdir.join('results.sqlite'))
+    lines = ['{"genus": 2, "word": [1, 2, 3, 4]}']
+    hits = []
+    for i in range(2):
+        for result in evaluate_stream(lines, ['order'], processes=1,
+                                      cache_file=cache_file):
+            assert result['order'] == 10
+            stats = PantsMappingClass.result_cache.statistics()
+            hits.append(stats['hits'])
+        assert PantsMappingClass.result_cache is None
+    assert hits == [0, 1]
+    assert ResultCache(cache_file).statistics()['entries'] == 1
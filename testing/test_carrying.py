@@ -1,6 +1,6 @@
 from macaw import TrainTrack
 from macaw.train_tracks.carrying import CarryingMap
-from macaw.constants import LEFT, RIGHT
+from macaw.constants import LEFT, RIGHT, BRANCH, CUSP, INTERVAL, CLICK
 import pytest
 
 
@@ -47,3 +47,183 @@ def test_click_to_interval(torus_carrying1):
     assert torus_carrying1.click_to_interval(-1, LEFT) == -2
     assert torus_carrying1.click_to_interval(-1, RIGHT) == -1
     
+
+def test_large_switch_to_extremal_interval(torus_carrying1):
+    """Test large_switch_to_extremal_interval()"""
+    assert torus_carrying1.large_switch_to_extremal_interval(1, LEFT) == 1
+    assert torus_carrying1.large_switch_to_extremal_interval(1, RIGHT) == 2
+    assert torus_carrying1.large_switch_to_extremal_interval(-1, LEFT) == -2
+    assert torus_carrying1.large_switch_to_extremal_interval(-1, RIGHT) == -1
+
+def test_paths_left_or_right_of_interval(torus_carrying1):
+    """Test paths_left_or_right_of_interval()"""
+    cm = torus_carrying1
+    int1 = cm.get_intersections_with_interval(1)
+    int2 = cm.get_intersections_with_interval(2)
+    click = cm.paths_from_click(1)
+    assert cm.paths_left_or_right_of_interval(1, LEFT).is_zero()
+    assert cm.paths_left_or_right_of_interval(2, RIGHT).is_zero()
+    assert cm.paths_left_or_right_of_interval(2, LEFT) == int1 + click
+    assert cm.paths_left_or_right_of_interval(1, RIGHT) == int2 + click
+    assert cm.paths_left_or_right_of_interval(-2, RIGHT) == int1 + click
+    assert cm.paths_left_or_right_of_click(1, LEFT) == int1
+    assert cm.paths_left_or_right_of_click(-1, LEFT) == int2
+
+def test_position_in_large_switch_to_interval(torus_carrying1):
+    """Test position_in_large_switch_to_interval()"""
+    cm = torus_carrying1
+    int1 = cm.get_intersections_with_interval(1)
+    int2 = cm.get_intersections_with_interval(2)
+    click = cm.paths_from_click(1)
+
+    typ, num, diff = cm.position_in_large_switch_to_interval(1, int1, LEFT)
+    assert (typ, num) == (INTERVAL, 1)
+    assert diff.is_zero()
+
+    typ, num, diff = cm.position_in_large_switch_to_interval(
+        1, int1 + click, LEFT)
+    assert (typ, num) == (CLICK, 1)
+    assert diff.is_zero()
+
+    typ, num, diff = cm.position_in_large_switch_to_interval(
+        1, int2 + click + int1, RIGHT)
+    assert (typ, num) == (INTERVAL, 1)
+    assert diff.is_zero()
+
+    typ, num, diff = cm.position_in_large_switch_to_interval(-1, int2, LEFT)
+    assert (typ, num) == (INTERVAL, -2)
+    assert diff.is_zero()
+
+def test_large_switch_index_is_updated(torus_carrying1):
+    """Test that the intersections at large switches are updated after
+    changing the intersections with an interval."""
+    cm = torus_carrying1
+    before = cm.paths_left_or_right_of_interval(2, LEFT)
+    cm.add_intersection_with_interval(BRANCH, 1, 1)
+    after = cm.paths_left_or_right_of_interval(2, LEFT)
+    assert sum(after.values()) == sum(before.values()) + 1
+
+def test_paths_are_sparse(torus_carrying1):
+    """Test that only the nonzero intersections are stored."""
+    cm = torus_carrying1
+    assert cm._paths.num_nonzero_entries() == 14
+    cm.add_intersection_with_interval(BRANCH, 2, 1, with_sign=-3)
+    assert cm._paths.num_nonzero_entries() == 13
+    assert cm.get_intersections_with_interval(1)[cm._path_idx(BRANCH, 2)] == 0
+
+def test_transition_matrix(torus_carrying1):
+    """Test transition_matrix()"""
+    m = torus_carrying1.transition_matrix()
+    assert m.tolist() == [[3, 5], [1, 2]]
+    sparse_m = torus_carrying1.transition_matrix(sparse=True)
+    assert sparse_m.to_dense(2, 2) == [[3, 5], [1, 2]]
+
+def test_compose(torus_carrying1):
+    """Test compose()"""
+    cm = torus_carrying1
+    composed = cm.compose(cm)
+    assert composed.transition_matrix().tolist() == [[14, 25], [5, 9]]
+    assert composed.small_switch_to_click(1) == 1
+    assert composed.small_cusp_to_large_cusp(2) == 2
+    composed = composed.compose(cm).compose(cm)
+    assert composed.transition_matrix().tolist() == [[321, 575], [115, 206]]
+
+def test_isotopy_worklist_settles_blocked_switch(torus_carrying1):
+    """Test that a blocked switch is examined only once."""
+    cm = torus_carrying1
+    cm.isotope_switch_as_far_as_possible = lambda switch: False
+    cm.is_branch_collapsed = lambda branch: True
+    assert cm.isotope_switch_recursively(1) == 0
+    assert cm.isotopy_statistics() == {'moves': 0, 'visits': 1}
+
+def test_isotopy_worklist_revisits_after_move(torus_carrying1):
+    """Test that a switch is examined again only after a switch in front of
+    it has moved, and that the number of moves is bounded."""
+    cm = torus_carrying1
+    # Each switch is blocked by the other one.
+    cm._small_tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]])
+    cm.is_branch_collapsed = lambda branch: True
+    cm.is_cusp_collapsed = lambda cusp: False
+    moves = {1: [False, True], 2: [True]}
+    cm.isotope_switch_as_far_as_possible = \
+        lambda switch: moves[switch].pop(0) if moves[switch] else False
+    assert cm.isotope_switch_recursively(1) == 2
+    assert cm.isotopy_statistics() == {'moves': 2, 'visits': 4}
+
+    cm.isotope_switch_as_far_as_possible = lambda switch: True
+    with pytest.raises(ValueError):
+        cm.isotope_switch_recursively(1, max_num_moves=10)
+    assert cm.isotopy_statistics()['moves'] == 13
+
+def chain_carrying():
+    """Return a carrying map whose small train track has a chain of
+    switches connected by the collapsed branches 3 and 4."""
+    small_tt = TrainTrack([[1, 2], [-3], [3], [-4], [4], [-1, -2]])
+    large_tt = TrainTrack([[1, 2], [-1, -2]])
+    return CarryingMap(
+        small_tt=small_tt,
+        large_tt=large_tt,
+        cusp_map={1:1, 2:2},
+        large_branch_preimages=[{1: {1:3, 2:1}, 2: {1:5, 2:2}}, {1: {1:6, 2:2}, 2: {1:1, 2:0}}],
+        large_switch_data={1: [[{1:2, 2:3}, {1:4, 2:1}], {1, 2, 3}, [{1:1, 2:3}, {1:4, 2:0}]]}
+    )
+
+def test_isotopy_worklist_order():
+    """Test that a blocked switch of a carrying map is examined again after
+    the switch in front of it has moved."""
+    cm = chain_carrying()
+    examined = []
+
+    def move_once(sw):
+        # the switches in front of -1 move when they are first examined
+        examined.append(sw)
+        return sw != -1 and examined.count(sw) == 1
+
+    cm.isotope_switch_as_far_as_possible = move_once
+    assert cm.isotope_switch_recursively(-1) == 2
+    assert examined == [-1, -2, -1, -3, -2]
+    assert cm.isotopy_statistics() == {'moves': 2, 'visits': 5}
+
+def isotope_recursively(cm, switch, stop_switch):
+    """The recursive isotopy replaced by the worklist (with the repeated
+    ``self`` argument of the recursive call removed)."""
+    small_tt = cm._small_tt
+    cm.isotope_switch_as_far_as_possible(switch)
+    for cusp in small_tt.outgoing_cusps(switch):
+        if cm.is_cusp_collapsed(cusp):
+            return
+    for branch in small_tt.outgoing_branches(switch):
+        if cm.is_branch_collapsed(branch):
+            next_sw = -small_tt.branch_endpoint(branch)
+            if abs(next_sw) == abs(stop_switch):
+                return
+            isotope_recursively(cm, next_sw, stop_switch)
+    cm.isotope_switch_as_far_as_possible(switch)
+
+@pytest.mark.parametrize("switch, stop_switch", [(-1, 3), (3, 1), (2, 1)])
+def test_isotopy_worklist_matches_recursion(switch, stop_switch):
+    """Test that the worklist examines the same switches of a carrying map
+    as the recursive isotopy and leaves the same train paths."""
+    results = []
+    for isotope in [isotope_recursively,
+                    CarryingMap.isotope_switch_recursively]:
+        cm = chain_carrying()
+        examined = []
+        original = cm.isotope_switch_as_far_as_possible
+
+        def recording(sw):
+            examined.append(sw)
+            return original(sw)
+
+        cm.isotope_switch_as_far_as_possible = recording
+        isotope(cm, switch, stop_switch)
+        paths = [cm.path_coordinates(BRANCH, br) for br in [1, 2, 3, 4]] + \
+            [cm.path_coordinates(CUSP, cusp) for cusp in [1, 2]]
+        results.append((cm, examined, paths))
+    (old, old_examined, old_paths), (new, new_examined, new_paths) = results
+    assert set(new_examined) == set(old_examined)
+    assert len(new_examined) == len(set(new_examined))
+    assert new_paths == old_paths
+    assert new.isotopy_statistics() == {'moves': 0,
+                                        'visits': len(new_examined)}
+    assert old.isotopy_statistics() == {'moves': 0, 'visits': 0}
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pytest
+
+from macaw.coordinate_store import CoordinateStore, OVERFLOW
+from macaw.pants_decomposition import PantsDecomposition
+from macaw.pants_lamination import PantsLamination
+
+
+def test_growth_and_lookup(tmpdir):
+    path = str(tmpdir.join('store'))
+    store = CoordinateStore(path, width=3)
+    vectors = [[i, -i, i*i] for i in range(3000)]
+    store.extend(vectors)
+    assert len(store) == 3000
+    assert store[2999] == vectors[2999]
+    assert store[-1] == vectors[-1]
+    assert all(store.find(vectors[i]) == i for i in range(0, 3000, 97))
+    assert store.find([1, 1, 1]) is None
+    store.close()
+
+    store = CoordinateStore(path, readonly=True)
+    assert len(store) == 3000
+    assert store.find(vectors[1234]) == 1234
+    with pytest.raises(ValueError):
+        store.append([0, 0, 0])
+
+
+def test_index_growth_is_saved(tmpdir):
+    path = str(tmpdir.join('store'))
+    store = CoordinateStore(path, width=2)
+    vectors = [[i, 2*i] for i in range(1500)]
+    store.extend(vectors)
+    # the store is reopened without closing it
+    reopened = CoordinateStore(path, readonly=True)
+    assert len(reopened) >= 1024
+    assert reopened.find(vectors[1000]) == 1000
+    store.close()
+
+
+def test_index_is_rebuilt(tmpdir):
+    path = str(tmpdir.join('store'))
+    store = CoordinateStore(path, width=2)
+    vectors = [[i, 2*i] for i in range(100)]
+    store.extend(vectors)
+    store.close()
+    # an index file left by an interrupted rehash
+    with open(os.path.join(path, 'index.int64'), 'r+b') as f:
+        f.truncate(2 * os.path.getsize(f.name))
+    store = CoordinateStore(path, readonly=True)
+    assert store.find(vectors[42]) == 42
+    store = CoordinateStore(path)
+    assert store.find(vectors[42]) == 42
+    store.close()
+    store = CoordinateStore(path, readonly=True)
+    assert store.find(vectors[99]) == 99
+
+
+def test_duplicates(tmpdir):
+    store = CoordinateStore(str(tmpdir), width=2)
+    store.append([1, 2])
+    store.append([3, 4])
+    store.append([1, 2])
+    assert store.find([1, 2]) == 0
+
+
+def test_overflow(tmpdir):
+    path = str(tmpdir)
+    big = [3**50, OVERFLOW, -3**50, 7]
+    store = CoordinateStore(path, width=4)
+    store.append([1, 2, 3, 4])
+    store.append(big)
+    array = store.load()
+    assert array.dtype == object
+    assert array[1].tolist() == big
+    assert store.load(0, 1).dtype == np.int64
+    store.close()
+
+    store = CoordinateStore(path)
+    assert store[1] == big
+    assert store.find(big) == 1
+
+
+def test_laminations(tmpdir):
+    p = PantsDecomposition.humphries(2)
+    lams = [PantsLamination.random(p) for i in range(50)]
+    store = CoordinateStore(str(tmpdir), width=6)
+    store.extend(lams)
+    chunks = list(store.chunks(16))
+    assert [start for start, array in chunks] == [0, 16, 32, 48]
+    array = np.vstack([array for start, array in chunks])
+    assert array.tolist() == [list(lam.to_vector()) for lam in lams]
+    assert store.find(lams[10]) <= 10
+
+
+def test_width_mismatch(tmpdir):
+    path = str(tmpdir)
+    store = CoordinateStore(path, width=2)
+    with pytest.raises(ValueError):
+        store.append([1, 2, 3])
+    store.close()
+    with pytest.raises(ValueError):
+        CoordinateStore(path, width=3)
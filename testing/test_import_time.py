@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode()
+
+
+def test_import_does_not_load_dependencies():
+    out = run_python("import sys, macaw; "
+                     "print(sorted(m for m in ('numpy', 'networkx') "
+                     "if m in sys.modules))")
+    assert out.strip() == '[]'
+
+
+def test_pants_decomposition_does_not_load_networkx():
+    out = run_python("import sys, macaw; "
+                     "p = macaw.PantsDecomposition([[1, 2, 3], [-3, -2, -1]]); "
+                     "print(' '.join(str(x) for x in [p.is_orientable(), "
+                     "p.is_connected(), 'networkx' in sys.modules]))")
+    assert out.split() == ['True', 'True', 'False']
+
+
+def test_public_names_are_loaded_lazily():
+    import macaw
+    for name in macaw.__all__:
+        assert getattr(macaw, name) is not None
+    assert macaw.humphries_generators is \
+        sys.modules['macaw.generating_sets'].humphries_generators
+
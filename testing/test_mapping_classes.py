@@ -92,3 +92,550 @@ class TestOrders(object):
         assert f.order() == order
 
 
+
+
+from macaw.pants_mapping_class import PantsMappingClass
+from macaw.constants import PSEUDO_ANOSOV, REDUCIBLE, PERIODIC
+
+
+def inverse_twists(f):
+    return [t.inverse() for t in reversed(f._pants_twists)]
+
+
+def penner_map(genus):
+    """Return the product of the A twists and the inverse B twists."""
+    A, B, c = humphries_generators(genus)
+    p = A[0]._pants_decomposition
+    twists = []
+    for i in range(genus):
+        twists += A[i]._pants_twists + inverse_twists(B[i])
+    return PantsMappingClass(p, twists + inverse_twists(c))
+
+
+class TestNielsenThurston(object):
+    def test_pseudo_anosov(self):
+        f = penner_map(2)
+        assert f.nielsen_thurston_type() == PSEUDO_ANOSOV
+        assert f.is_pseudo_anosov()
+
+    def test_stretch_factor(self):
+        f = penner_map(2)
+        sf = f.stretch_factor(exact=True)
+        assert sf.polynomial() == [1, -6, 8, -4, 8, -6, 1]
+        assert abs(float(sf) - 4.25422831506) < 1e-9
+
+    def test_deterministic(self):
+        f = penner_map(2)
+        g = penner_map(2)
+        assert f.invariant_train_track().gluing_list() == \
+            g.invariant_train_track().gluing_list()
+        assert f.invariant_train_track().measure() == \
+            g.invariant_train_track().measure()
+
+    @pytest.mark.slow
+    def test_pseudo_anosov_genus3(self):
+        f = penner_map(3)
+        assert f.nielsen_thurston_type() == PSEUDO_ANOSOV
+        assert abs(f.stretch_factor() - 4.747337102) < 1e-8
+        tt = f.invariant_train_track()
+        assert tt.num_switches() - tt.num_branches() + \
+            tt.num_complementary_regions() == -4
+
+    def test_reducible(self):
+        A, B, c = humphries_generators(2)
+        p = A[0]._pants_decomposition
+        f = PantsMappingClass(p, A[0]._pants_twists + inverse_twists(B[0]))
+        assert f.nielsen_thurston_type() == REDUCIBLE
+        assert not f.is_pseudo_anosov()
+        with pytest.raises(ValueError):
+            f.invariant_train_track()
+
+    def test_periodic(self):
+        assert hyperelliptic_involution(2).nielsen_thurston_type() == PERIODIC
+
+    def test_stretch_factor_of_periodic(self):
+        f = hyperelliptic_involution(2)
+        assert f.stretch_factor() == 1.0
+        with pytest.raises(ValueError):
+            f.stretch_factor(exact=True)
+
+    def test_stretch_factor_without_classification(self):
+        f = penner_map(2)
+        assert f._invariant_lamination_cache is None
+        sf = f.stretch_factor(classify=False)
+        assert f._invariant_lamination_cache is None
+        assert abs(sf - 4.25422831506) < 0.1
+
+    def test_twist_is_undetermined(self):
+        A, B, c = humphries_generators(2)
+        assert c.nielsen_thurston_type() is None
+        with pytest.raises(ValueError):
+            c.is_pseudo_anosov()
+
+
+import random
+from macaw.pants_lamination import PantsLamination
+from macaw.pants_mapping_class import normalize_twists, compile_twists
+
+
+def apply_twists_naively(twists, lam):
+    """Apply a word of twists letter by letter, without normalizing."""
+    lam = lam.copy()
+    for t in reversed(twists):
+        for curve in t.elementary_moves:
+            lam.apply_elementary_move(curve)
+        lam.apply_twist(t.pants_curve, t.power)
+        for curve in reversed(t.elementary_moves):
+            lam.apply_elementary_move(curve, inverse=True)
+    return lam
+
+
+class TestWordNormalization(object):
+    @pytest.mark.parametrize("genus,seed", [(2, 0), (2, 1), (3, 2), (3, 3)])
+    def test_same_action(self, genus, seed):
+        rnd = random.Random(seed)
+        A, B, c = humphries_generators(genus)
+        letters = []
+        for f in A + B + [c]:
+            letters.append(f._pants_twists)
+            letters.append(inverse_twists(f))
+        twists = []
+        for i in range(12):
+            twists += rnd.choice(letters)
+        p = A[0]._pants_decomposition
+        f = PantsMappingClass(p, twists)
+        n = p.num_inner_pants_curves()
+        for k in range(3):
+            coordinates = []
+            for i in range(n):
+                coordinates += [2*rnd.randint(1, 3), rnd.randint(-5, 5)]
+            lam = PantsLamination(p, coordinates)
+            assert f * lam == apply_twists_naively(twists, lam)
+
+    def test_commuting_words_agree(self):
+        A, B, c = humphries_generators(3)
+        w1 = A[0]._pants_twists + A[1]._pants_twists + B[2]._pants_twists
+        w2 = B[2]._pants_twists + A[1]._pants_twists + A[0]._pants_twists
+        p = A[0]._pants_decomposition
+        key = lambda w: [(t.curve_key(), t.power)
+                         for t in normalize_twists(w, p)]
+        assert key(w1) == key(w2)
+
+    def test_cancellation(self):
+        A, B, c = humphries_generators(3)
+        w = B[1]._pants_twists + A[0]._pants_twists + \
+            inverse_twists(B[1]) + inverse_twists(A[0])
+        # B[1] and A[0] are twists about disjoint curves
+        assert normalize_twists(w, A[0]._pants_decomposition) == []
+        w = B[1]._pants_twists + B[1]._pants_twists
+        assert len(normalize_twists(w)) == 1
+        # The elementary moves of the two twists are done only once.
+        assert len(compile_twists(w)) == 5
+
+
+from macaw.generating_sets import humphries_relations, verify_relations, \
+    SubwordEvaluator
+
+
+class TestVerifyRelations(object):
+    @pytest.mark.parametrize("genus", [2, 3])
+    def test_humphries_relations_hold(self, genus):
+        assert verify_relations(humphries_relations(genus), genus) == []
+
+    def test_failing_relations_are_reported(self):
+        relations = humphries_relations(2)
+        wrong = [(['a0', 'b0'], ['b0', 'a0']), (['b1', 'c', 'b1'], ['c'])]
+        assert verify_relations(relations[:3] + wrong, 2) == wrong
+
+    def test_suffixes_are_evaluated_once(self):
+        relations = humphries_relations(2)
+        ev = SubwordEvaluator(2)
+        for lhs, rhs in relations:
+            assert ev.equal(lhs, rhs)
+        suffixes = set()
+        for lhs, rhs in relations:
+            for w in [lhs, rhs]:
+                for i in range(len(w)):
+                    suffixes.add(tuple(w[i:]))
+        # 3 inner pants curves, each with a transversal
+        assert ev.num_letter_applications() == 6 * len(suffixes)
+
+
+from macaw.image_cache import ImageCache
+
+
+class TestImageCache(object):
+    def random_walk(self, genus, seed, length):
+        """Return the words of a random walk, each word extending the
+        previous one on the left."""
+        rnd = random.Random(seed)
+        A, B, c = humphries_generators(genus)
+        letters = [f._pants_twists for f in A + B + [c]]
+        words = [[]]
+        for i in range(length):
+            words.append(rnd.choice(letters) + words[-1])
+        return A[0]._pants_decomposition, words[1:]
+
+    @pytest.mark.parametrize("max_memory", [10**7, 2000])
+    def test_cached_images_are_correct(self, max_memory):
+        p, words = self.random_walk(2, 0, 15)
+        lam = PantsLamination(p, [2, 1, 4, -1, 2, 3])
+        expected = [PantsMappingClass(p, w) * lam for w in words]
+        cache = ImageCache(max_memory)
+        PantsMappingClass.image_cache = cache
+        try:
+            images = [PantsMappingClass(p, w) * lam for w in words]
+        finally:
+            PantsMappingClass.image_cache = None
+        assert images == expected
+        stats = cache.statistics()
+        assert stats['memory'] <= max_memory
+        if max_memory > 2000:
+            # every word after the first extends a cached word
+            assert stats['hits'] == len(words) - 1
+
+    def test_moves_cancel_between_letters(self, monkeypatch):
+        p, words = self.random_walk(2, 1, 15)
+        f = PantsMappingClass(p, words[-1])
+        f._normalize()
+        num_moves = sum(1 for op in f._compiled_twists if op[0] == 'move')
+        calls = []
+        original = PantsLamination.apply_elementary_move
+
+        def counting(lam, *args, **kwargs):
+            calls.append(args)
+            return original(lam, *args, **kwargs)
+
+        monkeypatch.setattr(PantsLamination, 'apply_elementary_move',
+                            counting)
+        lam = PantsLamination(p, [2, 1, 4, -1, 2, 3])
+        PantsMappingClass.image_cache = ImageCache()
+        try:
+            image = f * lam
+        finally:
+            PantsMappingClass.image_cache = None
+        assert len(calls) == num_moves
+        assert image == f * lam
+
+    def test_eviction_removes_trie_nodes(self):
+        cache = ImageCache(max_memory=1)
+        cache.insert('p', ['x', 'y'], (1,), (2,))
+        cache.insert('p', ['z'], (1,), (3,))
+        assert cache.statistics()['entries'] == 1
+        assert list(cache._roots['p'].children) == ['z']
+        assert cache.lookup('p', ['x', 'y'], (1,)) == (0, None)
+
+
+import numpy as np
+from macaw.homology import HomologyAction
+
+
+class TestHomologyAction(object):
+    def dense(self, dim, factors):
+        """Multiply the elementary matrices of the factors with numpy."""
+        mat = np.identity(dim, dtype=object)
+        for row, col, entry in factors:
+            elementary = np.identity(dim, dtype=object)
+            elementary[row, col] = entry
+            mat = mat.dot(elementary)
+        return mat
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_lazy_product_matches_dense_product(self, seed):
+        rnd = random.Random(seed)
+        dim = 6
+        factors = []
+        for i in range(30):
+            row, col = rnd.sample(range(dim), 2)
+            factors.append((row, col, rnd.choice([-2, -1, 1, 2])))
+        action = HomologyAction(dim, factors)
+        expected = self.dense(dim, factors)
+        assert action.matrix().tolist() == expected.tolist()
+        vector = [rnd.randint(-5, 5) for i in range(dim)]
+        assert action.apply(vector) == list(expected.dot(vector))
+        assert (action * action.inverse()).is_identity()
+
+    def test_overflow_falls_back_to_python_integers(self):
+        factors = [(0, 1, 1), (1, 0, 1)]
+        action = HomologyAction(2, factors)**50
+        assert action.matrix().dtype == object
+        assert action.matrix().max() > 2**63
+        assert action.matrix().tolist() == \
+            self.dense(2, factors * 50).tolist()
+        assert action.apply([1, 0]) == list(action.matrix().dot([1, 0]))
+
+    def test_product_of_generators(self):
+        A, B, c = humphries_generators(3, right_most_included=True)
+        gens = [A[0], B[1], c, A[3], B[2]**(-2)]
+        f = gens[0] * gens[1] * gens[2] * gens[3] * gens[4]
+        expected = np.identity(6, dtype=object)
+        for gen in gens:
+            expected = expected.dot(gen.action_on_homology())
+        assert f.action_on_homology().tolist() == expected.tolist()
+        assert f._action_on_homology.num_factors() == 10
+        product = gens[0].action_on_homology() * gens[1].action_on_homology()
+        assert product.tolist() == \
+            (gens[0] * gens[1]).action_on_homology().tolist()
+
+    def test_product_without_action(self):
+        A, B, c = humphries_generators(2)
+        f = PantsMappingClass(A[0]._pants_decomposition,
+                              A[0]._pants_twists)
+        # the action of the whole product is computed automatically
+        g = PantsMappingClass(f._pants_decomposition,
+                              f._pants_twists + A[0]._pants_twists)
+        assert (f * A[0])._action_on_homology is None
+        assert (f * A[0]).action_on_homology().tolist() == \
+            g.action_on_homology().tolist()
+
+
+from macaw.homology import pants_homology
+from macaw.pants_mapping_class import PantsTwist
+from macaw.pants_decomposition import PantsDecomposition
+
+
+class TestAutomaticHomology(object):
+    def random_word(self, rnd, gens, length):
+        word = []
+        for i in range(length):
+            f = rnd.choice(gens)
+            word.append(f if rnd.random() < 0.5 else f.inverse())
+        return word
+
+    def product(self, word):
+        f = word[0]
+        for g in word[1:]:
+            f = f * g
+        return f
+
+    @pytest.mark.parametrize("genus", [2, 3])
+    def test_traces_agree_with_humphries_matrices(self, genus):
+        # The automatic action is in a different basis, so it is conjugate to
+        # the action specified for the Humphries generators.
+        rnd = random.Random(genus)
+        A, B, c = humphries_generators(genus)
+        p = A[0]._pants_decomposition
+        for i in range(10):
+            f = self.product(self.random_word(rnd, A + B + [c], 6))
+            g = PantsMappingClass(p, f._pants_twists)
+            assert np.trace(f.action_on_homology()) == \
+                np.trace(g.action_on_homology())
+
+    @pytest.mark.parametrize("genus", [2, 3])
+    def test_action_on_curves(self, genus):
+        rnd = random.Random(genus)
+        A, B, c = humphries_generators(genus)
+        p = A[0]._pants_decomposition
+        h = pants_homology(p)
+        twists = [PantsMappingClass(p, f._pants_twists) for f in A + B + [c]]
+        for i in range(10):
+            lam = PantsLamination.from_pants_curve(
+                p, rnd.choice(p.inner_pants_curves()))
+            lam = self.product(self.random_word(rnd, twists, 4)) * lam
+            f = self.product(self.random_word(rnd, twists, 3))
+            x = h.curve_class(lam)
+            y = (f.action_on_homology() * np.matrix(x).T).T.tolist()[0]
+            assert h.curve_class(f * lam) in [y, [-a for a in y]]
+
+    def test_twist_actions_are_cached(self):
+        p = PantsDecomposition([[1, 2, 3], [-1, -2, -3]])
+        h = pants_homology(p)
+        assert pants_homology(PantsDecomposition([[1, 2, 3], [-1, -2, -3]])) \
+            is h
+        f = PantsMappingClass(p, [PantsTwist([2, 3], 2), PantsTwist([2], 2, 3),
+                                  PantsTwist([1], 1, -1)])
+        f.action_on_homology()
+        assert ((2,), 2) in h._twist_cache
+        assert ((1,), 1) in h._twist_cache
+
+    def test_torelli_without_specified_action(self):
+        f = hyperelliptic_involution(2)
+        g = PantsMappingClass(f._pants_decomposition, f._pants_twists)
+        assert not g.is_in_torelli()
+        assert (g**2).is_in_torelli()
+
+
+from macaw.homology import ModularHomologyAction, DEFAULT_PRIMES
+
+
+class TestModularHomology(object):
+    @pytest.mark.parametrize("genus", [2, 3])
+    def test_reduction_matches_exact_matrix(self, genus):
+        rnd = random.Random(genus)
+        A, B, c = humphries_generators(genus)
+        p = A[0]._pants_decomposition
+        for i in range(5):
+            f = PantsMappingClass(p, [])
+            for j in range(8):
+                f = f * rnd.choice(A + B + [c])
+            exact = f.action_on_homology()
+            for m in (2, 5) + DEFAULT_PRIMES:
+                assert f._homology_action().matrix_mod(m).tolist() == \
+                    (exact % m).tolist()
+
+    def test_powers_by_squaring(self):
+        action = HomologyAction(2, [(0, 1, 1), (1, 0, 1)])
+        reduced = action.reduce()
+        for k in [0, 1, 5, 37]:
+            exact = (action**k).matrix()
+            assert [mat.tolist() for m, mat in (reduced**k).matrices()] == \
+                [(exact % m).tolist() for m in DEFAULT_PRIMES]
+
+    def test_identity_uses_exact_matrix_for_large_entries(self):
+        # the matrix is congruent to the identity modulo a prime although
+        # it is not the identity
+        m = DEFAULT_PRIMES[0]
+        action = HomologyAction(2, [(0, 1, m)])
+        assert action.reduce([m]).is_identity()
+        assert not action.is_identity()
+        assert action.reduce().matrices()[1][1].tolist() != [[1, 0], [0, 1]]
+        both = HomologyAction(2, [(0, 1, DEFAULT_PRIMES[0] *
+                                   DEFAULT_PRIMES[1])])
+        assert both.reduce().is_identity()
+        assert not both.is_identity()
+
+    def test_level_subgroups(self):
+        A, B, c = humphries_generators(2)
+        for twist in A + B + [c]:
+            assert not twist.is_in_level(2)
+            assert (twist**2).is_in_level(2)
+            assert (twist**6).is_in_level(3)
+            assert not (twist**6).is_in_level(4)
+
+    def test_invalid_modulus(self):
+        with pytest.raises(ValueError):
+            HomologyAction(2, []).reduce([1])
+        with pytest.raises(ValueError):
+            HomologyAction(2, []).reduce([2**32])
+        with pytest.raises(ValueError):
+            ModularHomologyAction([(5, np.identity(2))]) * \
+                ModularHomologyAction([(7, np.identity(2))])
+
+    def test_order_of_finite_order_maps(self):
+        f = hyperelliptic_involution(2)
+        assert f.order() == 2
+
+
+from macaw.examples import compute_charpolies
+from macaw.linear_algebra import matrix_power, cyclotomic_polynomial
+
+
+class TestCharpolyTable(object):
+    def test_generators_are_shared(self):
+        A, B, c = humphries_generators(3)
+        A1, B1, c1 = humphries_generators(3, right_most_included=True)
+        assert len(A) == 3 and len(A1) == 4
+        assert all(f is g for f, g in zip(A + B + [c], A1[:3] + B1 + [c1]))
+        # the returned lists are copies
+        A.append(None)
+        assert len(humphries_generators(3)[0]) == 3
+
+    def test_matrix_power(self):
+        f = finite_order_primitives(2)[0][1]
+        mat = f.action_on_homology()
+        for k in [0, 1, 2, 7]:
+            assert matrix_power(mat.tolist(), k) == \
+                (f**k).action_on_homology().tolist()
+
+    def test_factors_divide_orders(self):
+        data = compute_charpolies([2, 3], processes=1)
+        for genus in [2, 3]:
+            for order, factors, primitive_order in data[genus]:
+                assert sum(e * (len(cyclotomic_polynomial(k)) - 1)
+                           for k, e in factors) == 2 * genus
+                assert all(order % k == 0 for k, e in factors)
+                assert primitive_order % order == 0
+
+    def test_parallel_and_cached_tables_agree(self, tmpdir):
+        cache_file = str(tmpdir.join('sub', 'charpolies.json'))
+        serial = compute_charpolies([2], processes=1)
+        parallel = compute_charpolies([2], processes=2,
+                                      cache_file=cache_file)
+        assert serial == parallel
+        assert compute_charpolies([2], cache_file=cache_file) == serial
+
+
+from macaw.generating_sets import map_from_list
+from macaw.result_cache import ResultCache
+
+
+class TestResultCache(object):
+    def teardown_method(self, method):
+        PantsMappingClass.result_cache = None
+
+    def test_order_is_stored(self, tmpdir):
+        path = str(tmpdir.join('results.sqlite'))
+        PantsMappingClass.result_cache = ResultCache(path)
+        assert map_from_list(2, [1, 2, 3, 4, 4]).order() == 8
+        # a new cache on the same file, as in a new session
+        cache = ResultCache(path)
+        PantsMappingClass.result_cache = cache
+        assert map_from_list(2, [1, 2, 3, 4, 4]).order() == 8
+        assert cache.statistics()['hits'] == 1
+
+    def test_equal_normalized_words_share_results(self):
+        cache = ResultCache(':memory:')
+        PantsMappingClass.result_cache = cache
+        assert map_from_list(2, [1, 3, 2]).order() == 0
+        assert map_from_list(2, [3, 1, 2]).order() == 0
+        assert cache.statistics()['hits'] == 1
+
+    def test_stale_versions_are_recomputed(self):
+        cache = ResultCache(':memory:')
+        PantsMappingClass.result_cache = cache
+        f = map_from_list(2, [1, 2, 3, 4])
+        key = f._result_key()
+        cache.store('order', *(key + (3,)))
+        assert f.order() == 3
+        cache._versions['order'] += 1
+        assert f.order() == 10
+        assert cache.lookup('order', *key) == 10
+
+
+from itertools import islice
+
+
+class TestOrbits(object):
+    def _lamination(self, f):
+        return PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+
+    def test_orbit_matches_powers(self):
+        f = map_from_list(2, [1, -2, 3])
+        lam = self._lamination(f)
+        iterates = [x.copy() for x in islice(f.orbit(lam), 5)]
+        assert iterates == [(f**k) * lam for k in range(1, 6)]
+        # the starting lamination is not changed
+        assert lam == self._lamination(f)
+
+    def test_find_period(self):
+        lam = self._lamination(map_from_list(2, []))
+        assert map_from_list(2, []).find_period(lam) == 1
+        # f^5 of the order 10 map is the hyperelliptic involution, which
+        # fixes the curve
+        for word, period in [([1, 2, 3, 4, 4], 4), ([1, 2, 3, 4], 5),
+                             ([1, 2, 3, 4, 5], 6)]:
+            f = map_from_list(2, word)
+            assert f.find_period(lam, 12) == period
+            assert min(k for k in range(1, 13)
+                       if (f**k) * lam == lam) == period
+            assert f.find_period(lam, period - 1) is None
+        assert map_from_list(2, [1, -2]).find_period(lam, 100) is None
+        assert map_from_list(2, [1, -2]).find_period(lam, 0) is None
+        assert map_from_list(2, []).find_period(lam, -1) is None
+
+    def test_growth_profile(self):
+        f = map_from_list(2, [1, -2, 3, -4, -6])
+        lam = self._lamination(f)
+        sizes = f.growth_profile(lam, 5)
+        assert sizes.tolist() == \
+            [float(sum(abs(x) for x in ((f**k) * lam).to_vector()))
+             for k in range(6)]
+        assert f.growth_profile(lam, 0).tolist() == [9.0]
+
+    def test_orders_agree_with_powers(self):
+        for word, order in [([1, 2, 3, 4], 10), ([1, 2, 3, 4, 4], 8),
+                            ([1, 2], 0), ([], 1)]:
+            f = map_from_list(2, word)
+            assert f.order() == order
+            if order > 0:
+                assert (f**order).is_identity()
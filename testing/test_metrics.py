@@ -0,0 +1,48 @@
+from macaw import metrics
+from macaw.generating_sets import map_from_list
+from macaw.pants_lamination import PantsLamination
+from macaw.train_tracks.train_track import TrainTrack
+from macaw.train_tracks.train_track0 import TrainTrack as TrainTrack0
+
+
+def test_disabled_metrics_leave_methods_alone():
+    peel = TrainTrack.__dict__['peel']
+    with metrics.collect():
+        assert TrainTrack.__dict__['peel'] is not peel
+        assert metrics.is_enabled()
+    assert TrainTrack.__dict__['peel'] is peel
+    assert not metrics.is_enabled()
+
+
+def test_counts_moves_and_twists():
+    f = map_from_list(2, [1, 2, 3, 4])
+    p = f._pants_decomposition
+    lam = PantsLamination(p, [2, 1, 2, 1, 2, 1])
+    with metrics.collect() as m:
+        f * lam
+    # one per twist of the word, not counting the twists of the first moves
+    assert m.counts['twist'] == len(f._compiled_twists) - \
+        sum(1 for op in f._compiled_twists if op[0] == 'move')
+    assert m.counts['twist'] == 4
+    assert m.counts['first_move'] > 0
+    # copying the lamination is not a construction
+    assert m.counts['lamination'] == 0
+
+
+def test_nested_blocks():
+    with metrics.collect() as outer:
+        tt = TrainTrack0([[1], [-2, -3], [2, 3], [-1]], [8, 3, 5])
+        with metrics.collect() as inner:
+            tt._set_measure(1, 2**70)
+        tt._set_measure(2, 2**70)
+    assert inner.counts['bignum'] == 1
+    assert outer.counts['bignum'] == 2
+
+
+def test_reallocations():
+    tt = TrainTrack0([[1], [-2, -3], [2, 3], [-1]], [8, 3, 5])
+    with metrics.collect() as m:
+        tt._allocate_more_branches(2)
+        tt._allocate_more_switches(2)
+    assert m.counts['reallocation'] == 2
+    assert 'reallocation' in m.report()
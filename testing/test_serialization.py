@@ -0,0 +1,87 @@
+import pickle
+
+import pytest
+
+from macaw.generating_sets import map_from_list
+from macaw.pants_decomposition import PantsDecomposition
+from macaw.pants_lamination import PantsLamination
+from macaw.pants_mapping_class import PantsMappingClass, PantsTwist
+from macaw.serialization import from_bytes, read_int, write_int
+from macaw.train_tracks.dehn_thurston.dehn_thurston_tt import DehnThurstonTT
+from macaw.train_tracks.train_track import TrainTrack
+
+
+def test_varints():
+    numbers = [0, 1, -1, 63, -64, 64, 2**63, -2**63 - 1, 3**100]
+    buf = bytearray()
+    for n in numbers:
+        write_int(buf, n)
+    pos = 0
+    decoded = []
+    for n in numbers:
+        m, pos = read_int(buf, pos)
+        decoded.append(m)
+    assert decoded == numbers
+    assert pos == len(buf)
+
+
+def test_lamination_round_trip():
+    p = PantsDecomposition.humphries(3)
+    for i in range(10):
+        lam = PantsLamination.random(p)
+        lam2 = PantsLamination.from_bytes(lam.to_bytes())
+        assert lam2 == lam
+        assert lam2._tt.gluing_list() == lam._tt.gluing_list()
+        assert lam2._tt._pants_branches == lam._tt._pants_branches
+
+
+def test_lamination_after_moves():
+    f = map_from_list(2, [1, 2, 3, 4, 5, -1])
+    lam = PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+    image = f * lam
+    copy = pickle.loads(pickle.dumps(image))
+    assert copy == image
+    # the decoded train track can be used for further computations
+    assert f * copy == f * image
+
+
+def test_bignum_measures():
+    tt = TrainTrack([[1], [-2, -3], [2, 3], [-1]],
+                    [3**80 + 5**40, 3**80, 5**40])
+    tt2 = TrainTrack.from_bytes(tt.to_bytes())
+    assert tt2.measure() == tt.measure()
+
+
+def test_unmeasured_train_track():
+    tt = DehnThurstonTT([[1, -3], [-1, 3], [2], [-2]],
+                        pants_branches=[1, 2])
+    tt2 = from_bytes(tt.to_bytes())
+    assert isinstance(tt2, DehnThurstonTT)
+    assert not tt2.is_measured()
+    assert tt2.gluing_list() == tt.gluing_list()
+
+
+def test_mapping_class_round_trip():
+    p = PantsDecomposition([[1, 2, 3], [-1, -2, -3]])
+    f = PantsMappingClass(p, [PantsTwist([], 2), PantsTwist([2], 2, -3)])
+    g = pickle.loads(pickle.dumps(f))
+    assert g._action_on_homology is None
+    assert g.to_bytes() == f.to_bytes()
+    assert (g.action_on_homology() == f.action_on_homology()).all()
+
+    h = map_from_list(3, [1, 2, 3, -4, 7, 8])
+    assert PantsMappingClass.from_bytes(h.to_bytes()).is_identity() == \
+        h.is_identity()
+
+
+def test_invalid_data():
+    p = PantsDecomposition.humphries(2)
+    data = p.to_bytes()
+    with pytest.raises(ValueError):
+        PantsLamination.from_bytes(data)
+    with pytest.raises(ValueError):
+        PantsDecomposition.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        PantsDecomposition.from_bytes(data + b'\x00')
+    with pytest.raises(ValueError):
+        from_bytes(b'')
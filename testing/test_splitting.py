@@ -0,0 +1,152 @@
+import random
+import numpy as np
+import pytest
+from macaw.train_tracks.train_track import TrainTrack
+from macaw.train_tracks.splitting import maximal_split, \
+    find_periodic_splitting_sequence, positive_subtrack
+
+
+def relabelled(tt, seed):
+    """Return an isomorphic copy of a train track with the switches and
+    branches renumbered and reoriented."""
+    rnd = random.Random(seed)
+    branches = tt.branches()
+    perm = list(branches)
+    rnd.shuffle(perm)
+    signs = [rnd.choice([1, -1]) for b in branches]
+    new_label = {}
+    for b, nb, s in zip(branches, perm, signs):
+        new_label[b] = s*nb
+        new_label[-b] = -s*nb
+    switches = tt.switches()
+    rnd.shuffle(switches)
+    gluing_list = []
+    for sw in switches:
+        gluing_list.append([new_label[b] for b in tt.outgoing_branches(sw)])
+        gluing_list.append([new_label[b] for b in tt.outgoing_branches(-sw)])
+    if not tt.is_measured():
+        return TrainTrack(gluing_list)
+    measure = [0]*len(branches)
+    for b in branches:
+        measure[abs(new_label[b]) - 1] = tt.branch_measure(b)
+    return TrainTrack(gluing_list, measure)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_canonical_form_is_invariant(seed):
+    tt = TrainTrack([[1], [-2, -3], [2, 4], [-5], [5], [-4, -6], [6, 3],
+                     [-1]])
+    assert tt.canonical_form()[0] == relabelled(tt, seed).canonical_form()[0]
+
+
+def test_canonical_form_distinguishes():
+    tt1 = TrainTrack([[1, 2], [-1, -3], [3], [-2]])
+    tt2 = TrainTrack([[1, 2], [-2, -3], [3], [-1]])
+    assert tt1.canonical_form()[0] != tt2.canonical_form()[0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_canonical_hash_with_measure_is_invariant(seed):
+    tt = TrainTrack([[1], [-2, -3], [2, 4], [-5], [5], [-4, -6], [6, 3],
+                     [-1]], [8, 3, 5, 2, 5, 3])
+    other = relabelled(tt, seed)
+    assert tt.canonical_hash(measure=True) == \
+        other.canonical_hash(measure=True)
+    scaled = TrainTrack(other.gluing_list(),
+                        [7 * x for x in other.measure()])
+    assert tt.is_isomorphic(scaled, measure=True)
+
+
+def test_canonical_hash_distinguishes_measures():
+    tt1 = TrainTrack([[1], [-2, -3], [2, 3], [-1]], [8, 3, 5])
+    tt2 = TrainTrack([[1], [-2, -3], [2, 3], [-1]], [8, 5, 3])
+    tt3 = TrainTrack([[1], [-2, -3], [2, 3], [-1]], [8, 4, 4])
+    assert tt1.canonical_hash() == tt3.canonical_hash()
+    assert tt1.canonical_hash(measure=True) != \
+        tt3.canonical_hash(measure=True)
+    # the left and right branches cannot be interchanged
+    assert tt1.canonical_hash(measure=True) != \
+        tt2.canonical_hash(measure=True)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_canonical_hash_with_zero_measures(seed):
+    tt = TrainTrack([[1], [-2, -3], [2, 4], [-5], [5], [-4, -6], [6, 3],
+                     [-1]], [3, 0, 3, 3, 3, 0])
+    other = relabelled(tt, seed)
+    assert tt.canonical_hash(measure=True) == \
+        other.canonical_hash(measure=True)
+    scaled = TrainTrack(other.gluing_list(),
+                        [2 * x for x in other.measure()])
+    assert tt.is_isomorphic(scaled, measure=True)
+    zero = TrainTrack(tt.gluing_list(), [0] * 6)
+    assert zero.canonical_bytes(measure=True).endswith(':0,0,0,0,0,0')
+
+
+def test_canonical_hash_as_dict_key():
+    tracks = [relabelled(TrainTrack([[1, 2], [-1, -3], [3], [-2]]), seed)
+              for seed in range(10)]
+    tracks += [relabelled(TrainTrack([[1, 2], [-2, -3], [3], [-1]]), seed)
+               for seed in range(10)]
+    classes = {}
+    for tt in tracks:
+        classes.setdefault(tt.canonical_hash(), []).append(tt)
+    assert sorted(len(v) for v in classes.values()) == [10, 10]
+
+
+def check_carrying(tt, num_steps):
+    """The measures before and after maximal splits are related by the
+    returned matrices."""
+    for i in range(num_steps):
+        old = tt.measure()
+        tt, m = maximal_split(tt)
+        new = tt.measure()
+        expected = [sum(m[a, b] * new[b] for b in range(len(new)))
+                    for a in range(len(old))]
+        assert expected == old
+        assert tt.is_trivalent()
+
+
+def test_maximal_split_carrying():
+    check_carrying(TrainTrack([[1, 2], [-3], [3], [-1, -2]], [31, 17, 48]),
+                   4)
+
+
+def test_central_split_carrying():
+    tt = TrainTrack([[1], [-2, -3], [2, 3], [-4, -5], [4, 5], [-1]],
+                    [8, 3, 5, 5, 3])
+    old = tt.measure()
+    new_tt, m = maximal_split(tt)
+    new = new_tt.measure()
+    assert new_tt.num_branches() == 2
+    assert [sum(m[a, b] * new[b] for b in range(2))
+            for a in range(5)] == old
+
+
+def test_transition_matrix_eigenvector():
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]],
+                    [10**15, 1618033988749895, 2618033988749895])
+    seq = find_periodic_splitting_sequence(tt)
+    m = seq.transition_matrix()
+    v = np.array(seq.train_track().measure(), dtype=object)
+    ratios = [float(x)/y for x, y in zip(m.dot(v), v)]
+    assert max(ratios) - min(ratios) < 1e-9
+    assert abs(ratios[0] - float(seq.growth())) < 1e-9
+
+
+def test_period_is_found_from_relabelled_track():
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]],
+                    [10**15, 1618033988749895, 2618033988749895])
+    seq1 = find_periodic_splitting_sequence(tt)
+    seq2 = find_periodic_splitting_sequence(relabelled(tt, 1))
+    assert seq1.period() == seq2.period()
+    assert seq1.growth().polynomial() == seq2.growth().polynomial()
+
+
+def test_positive_subtrack():
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [3, 5, 8])
+    assert positive_subtrack(tt).gluing_list() == tt.gluing_list()
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [0, 5, 5])
+    sub = positive_subtrack(tt)
+    assert sub.num_branches() == 1
+    assert sub.measure() == [5]
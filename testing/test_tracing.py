@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from macaw import tracing
+from macaw.generating_sets import map_from_list
+from macaw.pants_lamination import PantsLamination
+from macaw.tracing import Tracer
+from macaw.train_tracks.train_track import TrainTrack
+
+
+def _apply_word(word):
+    f = map_from_list(2, word)
+    lam = PantsLamination(f._pants_decomposition, [2, 1, 2, 1, 2, 1])
+    return f * lam
+
+
+def test_inactive_by_default():
+    assert tracing.active is None
+    with tracing.trace() as tracer:
+        assert tracing.active is tracer
+    assert tracing.active is None
+
+
+def test_events_of_mapping_class():
+    with tracing.trace() as tracer:
+        image = _apply_word([1, 2, 3, 4])
+    events = tracer.events()
+    last = events[-1]
+    assert last['name'] == 'apply_mapping_class'
+    assert last['depth'] == 0
+    assert list(last['args']['coordinates_after']) == list(image.to_vector())
+    twists = [e for e in events if e['name'] == 'twist']
+    assert len(twists) == 4
+    assert all(e['depth'] == 1 for e in twists)
+    # the twists of the train track are nested in the twists applied to
+    # the lamination and in the elementary moves, except for the twists of
+    # the inverse first elementary moves
+    general_twists = [e for e in events if e['name'] == 'general_twist']
+    assert len(general_twists) > len(twists)
+    assert set(e['depth'] for e in general_twists) == set([1, 2])
+    moves = [e for e in events if e['name'] == 'first_move']
+    assert moves and all(e['depth'] == 1 for e in moves)
+    assert all(e['dur'] >= 0 for e in events)
+
+
+def test_tracing_does_not_change_results():
+    with tracing.trace():
+        traced = _apply_word([1, 2, 3, 4, -5])
+    assert list(traced.to_vector()) == \
+        list(_apply_word([1, 2, 3, 4, -5]).to_vector())
+
+
+def test_spans_are_closed_on_exceptions(monkeypatch):
+    def failing_peel(*args, **kwargs):
+        raise RuntimeError
+    monkeypatch.setattr(TrainTrack, 'peel', failing_peel)
+    with tracing.trace() as tracer:
+        with pytest.raises(RuntimeError):
+            _apply_word([1, 2])
+        assert tracer._stack == []
+    names = [e['name'] for e in tracer.events()]
+    assert names[-1] == 'apply_mapping_class'
+    assert 'first_move' in names
+
+
+def test_ring_buffer():
+    tracer = Tracer(capacity=3)
+    for i in range(5):
+        tracer.instant('peel', switch=i)
+    assert [e['args']['switch'] for e in tracer.events()] == [2, 3, 4]
+    assert tracer.num_dropped() == 2
+    tracer.clear()
+    assert tracer.events() == []
+    assert tracer.num_dropped() == 0
+
+
+def test_sampling_keeps_nested_events():
+    tracer = Tracer(sample_rate=0.5, seed=1)
+    for i in range(100):
+        tracer.begin('outer', i=i)
+        tracer.instant('inner', i=i)
+        tracer.end()
+    outer = [e['args']['i'] for e in tracer.events() if e['name'] == 'outer']
+    inner = [e['args']['i'] for e in tracer.events() if e['name'] == 'inner']
+    assert 0 < len(outer) < 100
+    assert outer == inner
+
+
+def test_sample_rate_zero():
+    with tracing.trace(sample_rate=0) as tracer:
+        _apply_word([1, 2])
+    assert tracer.events() == []
+
+
+def test_export(tmpdir):
+    with tracing.trace() as tracer:
+        _apply_word([1, 2])
+    path = str(tmpdir.join('trace.jsonl'))
+    with open(path, 'w') as f:
+        tracer.write_json_lines(f)
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['name'] for r in records] == \
+        [e['name'] for e in tracer.events()]
+
+    path = str(tmpdir.join('trace.json'))
+    with open(path, 'w') as f:
+        tracer.write_chrome_trace(f)
+    with open(path) as f:
+        data = json.load(f)
+    assert len(data['traceEvents']) == len(records)
+    assert set(e['ph'] for e in data['traceEvents']) <= set(['X', 'i'])
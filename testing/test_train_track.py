@@ -0,0 +1,124 @@
+import random
+import numpy as np
+import pytest
+from macaw.train_tracks.train_track import TrainTrack
+
+
+def internal_state(tt):
+    return [np.copy(tt._outgoing_branches), np.copy(tt._num_outgoing_branches),
+            np.copy(tt._branch_endpoint), np.copy(tt._measure),
+            tt._num_switches, tt._num_branches]
+
+
+def assert_same_state(state1, state2):
+    for x, y in zip(state1, state2):
+        if isinstance(x, np.ndarray):
+            assert x.shape == y.shape
+            assert (x == y).all()
+        else:
+            assert x == y
+
+
+def random_moves(tt, rnd, num_moves):
+    for i in range(num_moves):
+        move = rnd.choice(['split', 'orientation', 'swap', 'add_switch'])
+        if move == 'split':
+            large = [b for b in tt.branches() if tt.is_branch_large(b)]
+            if large and tt.is_trivalent():
+                b = rnd.choice(large)
+                top = -tt.branch_endpoint(b)
+                bottom = -tt.branch_endpoint(-b)
+                if tt.branch_measure(tt.outgoing_branch(top, 0)) != \
+                   tt.branch_measure(tt.outgoing_branch(bottom, 1)):
+                    tt.split(b)
+        elif move == 'orientation':
+            tt.change_switch_orientation(rnd.choice(tt.switches()))
+        elif move == 'swap':
+            b1, b2 = rnd.sample(tt.branches(), 2)
+            tt.swap_branch_numbers(b1, b2)
+        else:
+            tt.add_switch_on_branch(rnd.choice(tt.branches()))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rollback_restores_state(seed):
+    rnd = random.Random(seed)
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [31, 17, 48])
+    tt.make_trivalent()
+    before = internal_state(tt)
+    tt.checkpoint()
+    random_moves(tt, rnd, 10)
+    tt.rollback()
+    assert_same_state(internal_state(tt), before)
+    assert tt._journal is None
+
+
+def test_nested_rollback():
+    rnd = random.Random(1)
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [31, 17, 48])
+    before = internal_state(tt)
+    tt.checkpoint()
+    random_moves(tt, rnd, 5)
+    middle = internal_state(tt)
+    tt.checkpoint()
+    random_moves(tt, rnd, 5)
+    tt.rollback()
+    assert_same_state(internal_state(tt), middle)
+    tt.checkpoint()
+    random_moves(tt, rnd, 5)
+    tt.commit()
+    tt.rollback()
+    assert_same_state(internal_state(tt), before)
+
+
+def test_journal_size_is_proportional_to_changes():
+    tt = TrainTrack([[1, 2], [-3], [3], [-1, -2]], [31, 17, 48])
+    tt.checkpoint()
+    tt.split(3)
+    assert len(tt._journal) < 30
+    tt.commit()
+    assert tt._journal is None
+
+
+from macaw.pants_decomposition import PantsDecomposition
+from macaw.pants_lamination import PantsLamination
+from macaw.train_tracks.dehn_thurston.dehn_thurston_tt import DehnThurstonTT
+
+
+def dehn_thurston_state(tt):
+    return [tt.gluing_list(), tt.measure(), list(tt._pants_branches)]
+
+
+def test_rollback_of_second_move():
+    tt = DehnThurstonTT([[1, 6, 5], [-1, 4, -6], [-5, -4, 2], [-8, -7, -2],
+                         [7, 9, 3], [-9, 8, -3]],
+                        [100, 20, 30, 7, 7, 4, 7, 7, 1])
+    before = dehn_thurston_state(tt)
+    tt.checkpoint()
+    tt.unzip_fold_second_move(2)
+    assert dehn_thurston_state(tt) != before
+    tt.rollback()
+    assert dehn_thurston_state(tt) == before
+
+
+def test_rollback_of_elementary_moves():
+    p = PantsDecomposition.humphries(2)
+    lam = PantsLamination(p, [2, 1, 2, 1, 2, 1])
+    tt = lam._tt
+    before = dehn_thurston_state(tt)
+    tt.checkpoint()
+    lam.apply_elementary_move(1)
+    lam.apply_elementary_move(2)
+    lam.apply_elementary_move(3, inverse=True)
+    lam.apply_twist(2, -3)
+    after = dehn_thurston_state(tt)
+    tt.rollback()
+    assert dehn_thurston_state(tt) == before
+    assert tt._journal is None
+
+    # the moves give the same result after the rollback
+    lam.apply_elementary_move(1)
+    lam.apply_elementary_move(2)
+    lam.apply_elementary_move(3, inverse=True)
+    lam.apply_twist(2, -3)
+    assert dehn_thurston_state(tt) == after